@@ -0,0 +1,220 @@
+'''
+This file define the artifact writer of evolution runs: program files, phenotype tree PNGs and per-generation score plots.
+
+Artifacts are never rendered by the evolution driver or by the evaluation workers: evolve() only queues
+compact chromosomes (see Chromosome.to_compact) to a separate, low-priority process that writes them asynchronously,
+and score plots are rendered on demand from the data stored in the run History (see Generation_History.py),
+either at the end of a run or later on, from the command line.
+
+Artifact levels:
+- none: nothing is written
+- best: program and tree of the best individual of each generation
+- all:  programs and trees of all the chromosomes of each generation
+
+Files are written in <output_dir>/GEN-<generation>/ as <cid>-<slot>.py, <cid>-<slot>.png and plot.png
+
+usage (render the artifacts of a terminated run):
+    python Artifact_Writer.py --history ./outputs/history --output ./outputs --level best --plots --env CartPole-v0
+'''
+
+
+import numpy as np
+import multiprocessing
+import argparse
+import os
+
+
+LEVELS = ('none', 'best', 'all')
+
+
+#-----------RENDERING-----------#
+def generation_dir(output_dir, generation):
+    path = os.path.join(output_dir, 'GEN-{}'.format(generation))
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def write_program(path, solution):
+    with open(path, 'w') as f:
+        f.write(solution)
+
+
+def write_tree_png(path, compact, events=()):
+    '''
+    Render the phenotype tree of a compact chromosome with graphviz, colored by the variation events of its lineage
+    (see Provenance.node_colors).
+    '''
+    from anytree.exporter import DotExporter
+    from Chromosome import Chromosome
+    from Provenance import dot_attributes
+    chromosome = Chromosome.from_compact(compact)
+    nodeattrfunc, edgeattrfunc = dot_attributes(chromosome.phenotype, events)
+    DotExporter(chromosome.phenotype, nodeattrfunc=nodeattrfunc, edgeattrfunc=edgeattrfunc).to_picture(path)
+
+
+def write_chromosomes(output_dir, generation, compacts, slots, events=None):
+    directory = generation_dir(output_dir, generation)
+    names = [os.path.join(directory, '{}-{}'.format(compact[0], slot)) for compact, slot in zip(compacts, slots)]
+    events = events if events!=None else [()]*len(compacts)
+    for compact, name in zip(compacts, names):     # programs first: they do not depend on graphviz
+        write_program(name+'.py', compact[3])
+    for compact, name, lineage in zip(compacts, names, events):
+        write_tree_png(name+'.png', compact, lineage)
+
+
+def plot_generation(path, scores, fitness, title):
+    '''
+    3D plot of the episodes scores of the chromosomes around the best one of a generation.
+
+    Args:
+        scores (np.array(float)): (n_chromosomes x n_episodes) scores, padded with NaN (see Score_Store.ScoreMatrix)
+        fitness (np.array(float))
+    '''
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    from mpl_toolkits.mplot3d import Axes3D
+
+    ep_len = scores.shape[1]
+    z_axys = np.arange(ep_len)
+    plt.rc('xtick', labelsize=20)
+    plt.rc('ytick', labelsize=20)
+    ax= plt.figure(figsize=(20, 19)).add_subplot(111, projection='3d')
+    best_idx = np.argmax(fitness)
+    if len(scores)>12:
+        low =  0 if best_idx-5<0 else best_idx-10 if best_idx+5>=len(scores) else best_idx-5
+        high = len(scores) if best_idx+5>=len(scores)-1 else best_idx+5
+        scores = scores[low:high]
+    ax.set_xticks( np.arange(len(scores)))
+
+    for j,score in enumerate(scores):
+        ax.plot(np.full(ep_len, j, int)  , z_axys, score, zorder=j)
+
+    ax.set_zlabel("Rewards", fontsize=27, labelpad=20)
+    ax.set_ylabel("Episode", fontsize=27, labelpad=20)
+    ax.set_xlabel("Chromosome", fontsize=27, labelpad=20)
+    plt.title(title, fontsize=30)
+    plt.savefig(path, bbox_inches='tight')
+    plt.close()
+
+
+def render_history(history_dir, output_dir, level='best', plots=True, env_id='', abs_time=None):
+    '''
+    Render the artifacts of all generations of a run from its History files.
+
+    Args:
+        history_dir (str): directory of the run History
+        output_dir (str): directory of the GEN-* artifact directories
+        level (str): artifact level of programs and trees (see LEVELS)
+        plots (bool): render the score plot of each generation
+        env_id (str): environment id, shown in plot titles
+        abs_time (float): duration (seconds) of the run, shown in plot titles
+    '''
+    from Generation_History import History
+    all_populations = History.load(history_dir)
+    last = len(all_populations)-1
+    for generation, population in enumerate(all_populations):
+        try:
+            if level == 'all':
+                write_chromosomes(output_dir, generation, [c.to_compact() for c in population.chromosomes], range(population.n_chromosomes))
+            elif level == 'best' and population.n_chromosomes>0:
+                best = int(np.argmax(population.chromosomes_fitness))
+                write_chromosomes(output_dir, generation, [population.best_individual.to_compact()], [best])
+        except OSError as e:        # e.g. graphviz is not installed: still render the plots
+            print('Generation', generation, 'trees not rendered:', repr(e))
+        if plots and population.n_chromosomes>0:
+            title=  env_id+" solved in {} generations\n".format(last)
+            if abs_time!=None:
+                title += "time elapsed = {} min\n".format(abs_time/60)
+            title += "GENERATION [ {} / {} ]".format(generation, last)
+            plot_generation(os.path.join(generation_dir(output_dir, generation), 'plot.png'),
+                            np.asarray(population.chromosomes_scores.scores), np.asarray(population.chromosomes_fitness), title)
+
+
+#-----------BACKGROUND PROCESS-----------#
+def artifact_process(requests, output_dir, niceness):
+    '''
+    Process target: render the requests of an ArtifactWriter until a None request is received.
+    '''
+    if hasattr(os, 'nice'):
+        os.nice(niceness)
+    while True:
+        request = requests.get()
+        if request == None:
+            return
+        kind, args = request
+        try:
+            if kind == 'chromosomes':
+                write_chromosomes(output_dir, *args)
+            elif kind == 'history':
+                render_history(args[0], output_dir, *args[1:])
+        except Exception as e:      # a missing graphviz or a bad tree must not stop the other artifacts
+            print('Artifact writer:', kind, 'failed:', repr(e))
+
+
+
+class ArtifactWriter():
+    '''
+    Queue artifact requests to a background low-priority process.
+    The process is started with the first request, so with level 'none' no process is ever started.
+
+    Args:
+        level (str): artifact level (see LEVELS)
+        output_dir (str): directory of the GEN-* artifact directories
+        niceness (int): increment of the niceness of the writer process
+    '''
+    def __init__(self, level='best', output_dir='./outputs', niceness=10):
+        if level not in LEVELS:
+            raise ValueError('Unknown artifact level '+str(level))
+        self.level = level
+        self.output_dir = output_dir
+        self.niceness = niceness
+        self.requests = None
+        self.process = None
+
+    def _put(self, kind, args):
+        if self.process == None:
+            self.requests = multiprocessing.Queue()
+            self.process = multiprocessing.Process(target=artifact_process, args=(self.requests, self.output_dir, self.niceness), daemon=True)
+            self.process.start()
+        self.requests.put((kind, args))
+
+    def generation(self, generation, population, genealogy=None):
+        '''
+        Queue the programs and trees of an evaluated population, according to the artifact level.
+        Only compact chromosomes are sent, so the cost for the driver is a pickle of a few arrays.
+        With a genealogy (see Provenance.py), the lineage events that color the trees are sent with them.
+        '''
+        if self.level == 'all':
+            chromosomes, slots = list(population.chromosomes), list(range(len(population.chromosomes)))
+        elif self.level == 'best' and len(population.chromosomes)>0:
+            best = int(np.argmax(population.chromosomes_fitness))
+            chromosomes, slots = [population.chromosomes[best]], [best]
+        else:
+            return
+        events = [genealogy.events_of(c) for c in chromosomes] if genealogy!=None else None
+        self._put('chromosomes', (generation, [c.to_compact() for c in chromosomes], slots, events))
+
+    def history(self, history_dir, plots=True, env_id='', abs_time=None, level=None):
+        '''
+        Queue the rendering of a run History (see render_history); by default programs and trees are not rendered again.
+        '''
+        self._put('history', (history_dir, level if level!=None else 'none', plots, env_id, abs_time))
+
+    def close(self):
+        ''' Wait until all queued artifacts are written. '''
+        if self.process != None:
+            self.requests.put(None)
+            self.process.join()
+            self.process = None
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Render the artifacts of a G4P run from its history')
+    parser.add_argument('--history', required=True, help='directory of the run History')
+    parser.add_argument('--output', default='./outputs', help='directory of the GEN-* artifact directories')
+    parser.add_argument('--level', default='best', choices=LEVELS, help='programs and trees to render')
+    parser.add_argument('--plots', action='store_true', help='render the score plot of each generation')
+    parser.add_argument('--env', default='', help='environment id, shown in plot titles')
+    args = parser.parse_args()
+    render_history(args.history, args.output, args.level, args.plots, args.env)
@@ -0,0 +1,159 @@
+'''
+This file define the bloat control used by the variation operators of Genetic_Gym.Population and by evolve() of g4p_solver.py.
+
+Programs tend to grow along the generations (subtree mutation re-derives subtrees with a depth that increases with
+the generation), and larger programs cost more per step, and more to copy, pickle and compare. BloatControl limits it with:
+- size/depth limits per operator: an offspring of crossover whose tree exceeds the crossover limits is replaced by
+  (a copy of) its parent, a subtree mutation that exceeds the mutation limits is undone; the depth added by subtree mutation
+  (the add argument of Population.mutate) is capped by max_add
+- lexicographic parsimony pressure: chromosomes with the same fitness are ranked by size (the smaller is better),
+  in tournament, rank and truncation parent selection and in the elites' truncation of Population.do_natural_selection
+- an optional penalty on the measured execution cost of the policy: parent selection uses the fitness
+  fitness - cost_penalty * (microseconds of policy execution per step), where the cost is measured by
+  Environment.evaluate_chromosome and stored in chromosome.step_cost by Population.remove_dead.
+  The cost is wall-clock time, so selection then depends on the speed and load of the machine: a run with a
+  cost_penalty is not reproducible from its seed
+Tree size and cost statistics of each generation are reported by evolve() in the run metrics (see stats).
+
+Size is the number of nodes of the phenotype tree, depth is the number of levels of the tree that contain
+expr or cond nodes (as counted by Population.mutate).
+'''
+
+
+import numpy as np
+import copy
+from anytree import PreOrderIter, LevelOrderGroupIter
+
+
+def tree_size(chromosome):
+    ''' Returns: number of nodes of the chromosome phenotype '''
+    return sum(1 for _ in PreOrderIter(chromosome.phenotype))
+
+
+def tree_depth(chromosome):
+    ''' Returns: number of levels of the chromosome phenotype that contain expr or cond nodes '''
+    depth = 0
+    for level, children in enumerate(LevelOrderGroupIter(chromosome.phenotype)):
+        if any(node.label=='expr' or node.label=='cond' for node in children):
+            depth = level+1
+    return depth
+
+
+def within(chromosome, limits):
+    '''
+    Args:
+        limits (tuple(int, int)): (max_size, max_depth), None for no limit
+    Returns:
+        True if the chromosome phenotype respects the limits
+    '''
+    max_size, max_depth = limits
+    if max_size!=None and tree_size(chromosome) > max_size:
+        return False
+    if max_depth!=None and tree_depth(chromosome) > max_depth:
+        return False
+    return True
+
+
+def step_costs(chromosomes):
+    ''' Returns: step_costs (np.array(float)): measured seconds of policy execution per step of each chromosome (0 if unknown) '''
+    return np.array([getattr(c, 'step_cost', 0.) for c in chromosomes], dtype=float)
+
+
+def lexicographic_rank(fitness, sizes):
+    '''
+    Returns:
+        ranks (np.array(float)): rank of each chromosome (the worst has rank 1), by fitness and, for equal fitness, by smaller size
+    '''
+    order = np.lexsort((-np.asarray(sizes, dtype=float), np.asarray(fitness, dtype=float)))
+    ranks = np.empty(len(order))
+    ranks[order] = np.arange(1, len(order)+1)
+    return ranks
+
+
+
+class BloatControl():
+    '''
+    Args:
+        crossover_limits (tuple(int, int)): (max_size, max_depth) of the offsprings of crossover (None for no limit)
+        mutation_limits (tuple(int, int)): (max_size, max_depth) of the mutated chromosomes (None for no limit)
+        max_add (int): maximum depth added by subtree mutation (None for no limit)
+        parsimony (bool): lexicographic parsimony pressure in selection
+        cost_penalty (float): fitness penalty for each microsecond of policy execution per step (0: no penalty).
+            Warning: the execution time is measured on the workers, so with a penalty parent selection depends on
+            the speed and load of the machine, and the run is not reproducible from its seed
+
+    Attributes:
+        rejected (dict): number of offsprings rejected by each operator since the last stats()
+    '''
+    def __init__(self, crossover_limits=(None, None), mutation_limits=(None, None), max_add=None, parsimony=True, cost_penalty=0.):
+        self.crossover_limits = crossover_limits
+        self.mutation_limits = mutation_limits
+        self.max_add = max_add
+        self.parsimony = parsimony
+        self.cost_penalty = cost_penalty
+        self.rejected = {'crossover': 0, 'mutation': 0}
+
+    def accepts(self, chromosome, operator):
+        '''
+        Args:
+            operator (str): 'crossover' or 'mutation'
+        Returns:
+            True if the chromosome respects the limits of the operator
+        '''
+        return within(chromosome, self.crossover_limits if operator=='crossover' else self.mutation_limits)
+
+    def limit(self, children, parents):
+        '''
+        Replace the offsprings of a crossover that exceed the crossover limits with (a copy of) their parent.
+
+        Args:
+            children (tuple(Chromosome)): offsprings returned by Population.crossover (child of parents[0], child of parents[1], None, None)
+            parents (list(Chromosome)): the two parents
+        Returns:
+            children (list(Chromosome))
+        '''
+        children = list(children)
+        for i, parent in enumerate(parents):
+            if children[i]!=None and not self.accepts(children[i], 'crossover'):
+                children[i] = copy.deepcopy(parent)
+                self.rejected['crossover'] += 1
+        return children
+
+    def add(self, add):
+        ''' Returns: the depth added by subtree mutation, capped by max_add '''
+        return add if self.max_add==None else min(add, self.max_add)
+
+    def sizes(self, chromosomes):
+        ''' Returns: sizes (np.array(int)) used by lexicographic parsimony, None if it is disabled '''
+        return np.array([tree_size(c) for c in chromosomes]) if self.parsimony else None
+
+    def penalize(self, fitness, chromosomes):
+        '''
+        Args:
+            fitness (np.array(float)): fitness of each chromosome
+            chromosomes (list(Chromosome)): evaluated chromosomes (with their step_cost)
+        Returns:
+            fitness (np.array(float)): selection fitness, penalized by the execution cost
+        '''
+        fitness = np.asarray(fitness, dtype=float)
+        if self.cost_penalty == 0:
+            return fitness
+        return fitness - self.cost_penalty*step_costs(chromosomes)*1e6
+
+    def stats(self, chromosomes):
+        '''
+        Returns:
+            stats (dict): mean and max tree size and depth, mean program lines, mean and max policy cost (us/step)
+                of the chromosomes, and the offsprings rejected by each operator since the last call
+        '''
+        sizes = [tree_size(c) for c in chromosomes]
+        depths = [tree_depth(c) for c in chromosomes]
+        lines = [c.solution.count('\n')+1 for c in chromosomes if c.solution!=None]
+        step_cost = step_costs(chromosomes)*1e6
+        stats = {'tree_size_mean': float(np.mean(sizes)), 'tree_size_max': int(np.max(sizes)),
+                 'tree_depth_mean': float(np.mean(depths)), 'tree_depth_max': int(np.max(depths)),
+                 'program_lines_mean': float(np.mean(lines)) if lines else float('nan'),
+                 'step_cost_us_mean': float(np.mean(step_cost)), 'step_cost_us_max': float(np.max(step_cost)),
+                 'rejected_crossover': self.rejected['crossover'], 'rejected_mutation': self.rejected['mutation']}
+        self.rejected = {'crossover': 0, 'mutation': 0}
+        return stats
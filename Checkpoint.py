@@ -0,0 +1,68 @@
+'''
+This file define the checkpoints of evolution runs, used by evolve() of g4p_solver.py to resume a run.
+
+A checkpoint is written after each generation and contains everything needed to continue the run bit-for-bit:
+the chromosomes of the next generation (in compact form, see Chromosome.to_compact), the state of the run History
+(whose files are truncated back to it on resume, see Generation_History.py), NumPy RNG state, environment seed,
+mutation/crossover probabilities and the stagnation counters of evolve().
+
+File format: MAGIC header followed by a zlib compressed pickle of the state dict.
+The state is pickled by the driver, while compression and writing are done by a background thread;
+files are written to a temporary file and then atomically renamed, so a checkpoint is never half written.
+'''
+
+
+import threading
+import pickle
+import zlib
+import os
+
+
+MAGIC = b'G4PCKPT1'
+
+
+class Checkpointer():
+    '''
+    Write checkpoints of an evolution run in background.
+
+    Args:
+        path (str): checkpoint file
+    '''
+    def __init__(self, path):
+        self.path = path
+        self.thread = None
+
+    def save(self, state):
+        '''
+        Pickle state (dict) and write it in background (waiting for the previous write, if it is still running).
+        '''
+        payload = pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL)
+        self.wait()
+        self.thread = threading.Thread(target=self._write, args=(payload,))
+        self.thread.start()
+
+    def wait(self):
+        if self.thread!=None:
+            self.thread.join()
+            self.thread = None
+
+    def _write(self, payload):
+        tmp = self.path + '.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(MAGIC)
+            f.write(zlib.compress(payload, 1))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+
+
+def load_checkpoint(path):
+    '''
+    Returns:
+        state (dict): the state saved by Checkpointer.save
+    '''
+    with open(path, 'rb') as f:
+        data = f.read()
+    if data[:len(MAGIC)] != MAGIC:
+        raise ValueError(path+' is not a G4P checkpoint')
+    return pickle.loads(zlib.decompress(data[len(MAGIC):]))
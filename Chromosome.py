@@ -12,8 +12,6 @@ and defines the corresponding functions to generate them.
 
 
 from anytree import Node, RenderTree
-from anytree.exporter import DotExporter
-from anytree.dotexport import RenderTreeGraph
 from anytree import PreOrderIter
 import numpy as np
 import os
@@ -21,6 +19,9 @@ import os
 from Grammatical_Evolution_mapper import Parser
 
 
+policy_cache = {'hits': 0, 'misses': 0}     # compiled policies counters of this process (see Chromosome.execute_solution)
+
+
 class Chromosome():
     ''' 
     Chromosome defines the representations of a single individuals as:
@@ -33,6 +34,7 @@ class Chromosome():
         genotype (list(int)): the set of genes of the genotype
         phenotype (AnyTree.Node): derivation tree rappresentation of the chromosome, that corresponds to the set of genes (nodes) encoded by the genotype
         solution (str): python code rappresentation of the chromosome, that corresponds to the set of genes (line of codes) translated by the phenotype
+        provenance (tuple): optional lineage record (uid, parents, events), see Provenance.py
     '''
     def __init__(self, i, GENOTYPE_LEN):
         self.genotype = [np.random.randint(1,3)]+list(np.random.randint(0,1000,size=GENOTYPE_LEN-1)) # ensure that it starts with rule 1 or 2
@@ -40,6 +42,63 @@ class Chromosome():
         self.solution = None
         self.cid = i
         self.fit=None
+        self.provenance = None
+
+    @classmethod
+    def from_solution(cls, solution, i=0):
+        '''
+        Create a chromosome that only carries an already generated solution (e.g. to execute it on a remote worker).
+        '''
+        chromosome = cls.__new__(cls)
+        chromosome.genotype = None
+        chromosome.phenotype = None
+        chromosome.solution = solution
+        chromosome.cid = i
+        chromosome.fit = None
+        chromosome.provenance = None
+        return chromosome
+
+    def to_compact(self):
+        '''
+        Compact representation of the chromosome: genotype, the pre-order list of its phenotype nodes
+        (name, label, code, indent, number of children), its provenance record and the mean fitness of its parents,
+        used to save chromosomes on disk.
+        '''
+        nodes = [(node.name, node.label, node.code, getattr(node, 'indent', None), len(node.children))
+                    for node in PreOrderIter(self.phenotype)] if self.phenotype!=None else None
+        genotype = np.array(self.genotype, dtype=np.int32) if self.genotype!=None else None
+        return (self.cid, genotype, nodes, self.solution, getattr(self, 'provenance', None), getattr(self, 'parent_fitness', None))
+
+    @classmethod
+    def from_compact(cls, compact):
+        '''
+        Rebuild a chromosome from its compact representation (see to_compact).
+        Compact chromosomes saved before provenance tracking (with node colors and without record) or without
+        parent fitness are also accepted.
+        '''
+        cid, genotype, nodes, solution = compact[:4]
+        chromosome = cls.from_solution(solution, cid)
+        chromosome.genotype = [int(g) for g in genotype] if genotype is not None else None
+        if len(compact) > 4:
+            chromosome.provenance = compact[4]
+        if len(compact) > 5 and compact[5]!=None:
+            chromosome.parent_fitness = compact[5]
+        if nodes!=None:
+            stack = []                                  # (node, number of children still to attach)
+            for node_data in nodes:
+                name, label, code, indent, n_children = node_data[:4]+node_data[-1:]
+                node = Node(name, label=label, code=code)
+                if indent!=None:
+                    node.indent = indent
+                if stack:
+                    node.parent = stack[-1][0]
+                    stack[-1][1] -= 1
+                else:
+                    chromosome.phenotype = node
+                stack.append([node, n_children])
+                while stack and stack[-1][1]==0:
+                    stack.pop()
+        return chromosome
 
     def generate_phenotype(self, environment, method, MAX_DEPTH, MAX_WRAP, to_png=False, to_shell=False):
         '''
@@ -53,7 +112,7 @@ class Chromosome():
             MAX_WRAP  (int): maximum number of time that wrapping operator is applied to genotype
             to_png (boolean): export tree on png file
         '''
-        root = Node('('+str(0)+')expr-start', label='expr', code='', color='/greys9/1', border='/greys9/9')                     # root of derivation tree
+        root = Node('('+str(0)+')expr-start', label='expr', code='')                     # root of derivation tree
         parser = Parser(self.genotype, root, environment, method, MAX_DEPTH, MAX_WRAP)
         
         self.phenotype = parser.start_derivating('expr')
@@ -89,7 +148,9 @@ class Chromosome():
 
     def execute_solution(self, observation, all_obs):
         '''
-        Execute self.solution as python program
+        Execute self.solution as python program.
+        The get_action function is compiled only once for each solution, and cached in the chromosome
+        (the cache is not pickled, see __getstate__).
         
         Args:
             observation (list(float)): list of all_obs of the environment
@@ -97,32 +158,56 @@ class Chromosome():
         
         Returns: an action
         '''
+        if self.__dict__.get('_policy_source') is self.solution:
+            policy_cache['hits'] += 1
+        else:
+            self._policy = self.compile_solution()
+            self._policy_source = self.solution
+            policy_cache['misses'] += 1
+        try:
+            action=self._policy(observation, all_obs)
+        except UnboundLocalError:   #observation did not pass through any if else
+            # print('Assign low fitness')
+            action= 0
+            # action = None
+        
+        return action
+
+    def compile_solution(self):
+        '''
+        Returns:
+            get_action (function): the function defined by self.solution
+        '''
         loc={}
         try:
             exec(self.solution, {}, loc)
         except SyntaxError as e:
             import sys
             print(e.msg)
-            self.tree_to_png(0)
-            self.generate_solution(0, True)
+            print(self.solution)                                                        # nothing is rendered inside workers
             for pre, _, node in RenderTree(self.phenotype):                                # print tree on terminal
                 print("{}{}".format(pre, node.name)) 
 
             sys.exc_info()
             sys.exit()
-        try:
-            action=loc['get_action'](observation, all_obs)
-        except UnboundLocalError:   #observation did not pass through any if else
-            # print('Assign low fitness')
-            action= 0
-            # action = None
-        
-        return action
+        return loc['get_action']
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.pop('_policy', None)          # compiled functions are not picklable: workers compile their own
+        state.pop('_policy_source', None)
+        return state
     
-    def tree_to_png(self, generation):
+    def tree_to_png(self, generation, events=()):
+        '''
+        Args:
+            events (list((str, str))): variation events of the lineage of the chromosome, that color the tree
+                (see Provenance.Genealogy.lineage; by default the tree is grey)
+        '''
+        from anytree.exporter import DotExporter    # graphviz export is loaded only when a tree is actually rendered
+        from Provenance import dot_attributes
         if not os.path.exists('./outputs/GEN-{}'.format(generation)):
             os.mkdir('./outputs//GEN-{}'.format(generation))
-        DotExporter(self.phenotype, 
-            nodeattrfunc=lambda node: 'label="{}", style=filled, color="{}", fillcolor="{}"'.format(node.label, node.border, node.color),
-            edgeattrfunc=lambda node,child: 'color="{}"'.format(node.border)
+        nodeattrfunc, edgeattrfunc = dot_attributes(self.phenotype, events)
+        DotExporter(self.phenotype, nodeattrfunc=nodeattrfunc, edgeattrfunc=edgeattrfunc
             ).to_picture("./outputs/GEN-{}/{}-{}.png".format(generation, self.cid, str(self).rsplit('<Chromosome.Chromosome object at ')[1][:-1]))
\ No newline at end of file
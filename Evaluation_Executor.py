@@ -0,0 +1,449 @@
+'''
+This file define the executors used by Genetic_Gym.Environment to evaluate chromosomes in parallel.
+
+An executor exposes:
+    - submit(environment, chromosome, i, to_file, prnt, callback, error_callback, profile): submit the evaluation of a chromosome
+      (whose solution has already been generated) and return a job with a .get(timeout) and a .ready() method;
+      profile is the profiling mode of the evaluation (see Profiling.py)
+    - terminate(): drop all the evaluations that are not completed yet
+    - close(): release the executor resources
+    - stats(): per worker throughput statistics
+
+In particular it defines:
+- PoolExecutor: evaluates chromosomes with a local multiprocessing.Pool
+- TCPExecutor: evaluates chromosomes on remote worker daemons (g4p_worker.py) connected over TCP.
+    Remote workers only receive compact tasks (program code, environment id, bins, split points and seed, see evaluation_task)
+    and send back the evaluation results, with heartbeats sent while evaluating. Tasks of lost workers are re-queued.
+- EvaluationBroker and SharedPoolExecutor: several runs, each one in its own driver process, share a single local pool
+    (see g4p_sweep.py). Drivers send compact tasks to the broker, that dispatches them to the pool giving the same share
+    of the pool slots to every run with pending tasks.
+'''
+
+
+import multiprocessing
+from multiprocessing.connection import Listener
+import collections
+import threading
+import queue
+import time
+import os
+
+from Chromosome import Chromosome
+
+
+def evaluation_task(environment, chromosome, i, profile=None):
+    '''
+    Compact representation of a chromosome evaluation, that can be run by evaluate_task on any machine.
+
+    Args:
+        environment (Environment)
+        chromosome (Chromosome): chromosome with an already generated solution
+        i (int): index of the chromosome in its population
+        profile (str): profiling mode of the evaluation (see Environment.evaluate_chromosome)
+    Returns:
+        task (dict)
+    '''
+    return {
+        'env_id'    : environment.env.spec.id,
+        'n_episodes': environment.n_episodes,
+        'bins'      : tuple(environment.bins),
+        'all_obs'   : environment.all_obs,
+        'seed'      : environment.seed,
+        'solution'  : chromosome.solution,
+        'cid'       : chromosome.cid,
+        'i'         : i,
+        'profile'   : profile,
+    }
+
+
+_environments = {}      # (env_id, n_episodes, bins) -> Environment, cached by each worker process
+
+def evaluate_task(task):
+    '''
+    Run a task built by evaluation_task, exactly as Environment.evaluate_chromosome would do on the driver machine.
+
+    Returns:
+        result (dict): scores, lengths and wall_time of the episodes (see Environment.evaluate_chromosome)
+    '''
+    from Genetic_Gym import Environment
+    key = (task['env_id'], task['n_episodes'], task['bins'])
+    if key not in _environments:
+        _environments[key] = Environment(task['env_id'], task['n_episodes'], task['bins'])
+    environment = _environments[key]
+    environment.all_obs = task['all_obs']
+    environment.seed = task['seed']
+    chromosome = Chromosome.from_solution(task['solution'], task['cid'])
+    return environment.evaluate_chromosome(task['env_id'], chromosome, task['i'], False, profile=task.get('profile'))
+
+
+
+class PoolExecutor():
+    '''
+    Executor that evaluates chromosomes with a local multiprocessing.Pool.
+
+    Args:
+        pool (multiprocessing.Pool): pool used to run Environment.evaluate_chromosome
+    '''
+    def __init__(self, pool):
+        self.pool = pool
+        self.n_jobs = 0
+        self.start_time = time.time()
+
+    def submit(self, environment, chromosome, i, to_file=False, prnt=False, callback=None, error_callback=None, profile=None):
+        self.n_jobs += 1
+        return self.pool.apply_async(environment.evaluate_chromosome, [environment.env.spec.id, chromosome, i, to_file, prnt, False, profile],
+                                    callback=callback, error_callback=error_callback)
+
+    def terminate(self):
+        self.pool.terminate()
+
+    def close(self):
+        self.pool.close()
+
+    def stats(self):
+        elapsed = time.time() - self.start_time
+        return {'pool': {'tasks': self.n_jobs, 'evals_per_sec': self.n_jobs/elapsed if elapsed>0 else 0.}}
+
+
+
+class TaskJob():
+    '''
+    Result of a task submitted to a TCPExecutor (same interface of multiprocessing.pool.AsyncResult).
+    '''
+    def __init__(self, callback=None, error_callback=None):
+        self._event = threading.Event()
+        self._value = None
+        self._error = None
+        self._callback = callback
+        self._error_callback = error_callback
+
+    def ready(self):
+        return self._event.is_set()
+
+    def get(self, timeout=None):
+        if not self._event.wait(timeout):
+            raise multiprocessing.TimeoutError
+        if self._error != None:
+            raise RuntimeError(self._error)
+        return self._value
+
+    def _set(self, value, error=None):
+        if self._event.is_set():
+            return
+        self._value, self._error = value, error
+        self._event.set()
+        if error == None and self._callback != None:
+            self._callback(value)
+        if error != None and self._error_callback != None:
+            self._error_callback(RuntimeError(error))
+
+
+
+class TCPExecutor():
+    '''
+    Executor that evaluates chromosomes on remote worker daemons (see g4p_worker.py).
+    Every worker process connects to the executor, registers itself and then receives one task at a time.
+    While a worker is evaluating it must send a heartbeat every few seconds: if no message arrives
+    within heartbeat_timeout seconds (or its connection is lost) the worker is dropped and its task is re-queued.
+
+    Tasks and results are pickled and workers execute the programs they receive: only trusted workers must be able
+    to connect. The executor listens only on the local interface by default (pass address=('0.0.0.0', port) to accept
+    remote workers), and the shared secret has no default: use a long random key (e.g. secrets.token_hex()).
+
+    Args:
+        address (tuple): (host, port) on which the executor listens for workers
+        authkey (bytes): shared secret used to authenticate workers (required)
+        heartbeat_timeout (float): seconds without messages after which a busy worker is considered lost
+        max_attempts (int): maximum number of times a task is sent to a worker before failing
+    '''
+    def __init__(self, address=('127.0.0.1', 6000), *, authkey, heartbeat_timeout=30., max_attempts=3):
+        if not authkey:
+            raise ValueError('TCPExecutor needs a non empty authkey')
+        self.heartbeat_timeout = heartbeat_timeout
+        self.max_attempts = max_attempts
+        self.tasks = queue.Queue()                  # (task id, task, job, attempts) waiting for a worker
+        self.workers = {}                           # worker name -> throughput statistics
+        self.lock = threading.Lock()
+        self.n_tasks = 0
+        self.closed = False
+        self.listener = Listener(address, authkey=authkey)
+        self.address = self.listener.address
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def submit(self, environment, chromosome, i, to_file=False, prnt=False, callback=None, error_callback=None, profile=None):
+        job = TaskJob(callback, error_callback)
+        with self.lock:
+            self.n_tasks += 1
+            tid = self.n_tasks
+        self.tasks.put((tid, evaluation_task(environment, chromosome, i, profile), job, 0))
+        return job
+
+    def terminate(self):
+        ''' Drop all queued tasks (running tasks results will be ignored). '''
+        while True:
+            try:
+                _,_,job,_ = self.tasks.get_nowait()
+            except queue.Empty:
+                break
+            job._set(None, 'terminated')
+
+    def close(self):
+        self.terminate()
+        self.closed = True
+        self.listener.close()
+
+    def stats(self):
+        with self.lock:
+            stats = {}
+            for name, w in self.workers.items():
+                stats[name] = dict(w, evals_per_sec=w['tasks']/w['busy_time'] if w['busy_time']>0 else 0.)
+            return stats
+
+    def print_stats(self):
+        for name, w in self.stats().items():
+            print(name, ': tasks =', w['tasks'], ' evals/sec =', round(w['evals_per_sec'], 3), ' busy =', round(w['busy_time'], 1), 's',
+                  ' lost =', w['lost'], ' connected =', w['connected'])
+
+    #--------------------------------------#
+    def _accept(self):
+        while not self.closed:
+            try:
+                conn = self.listener.accept()
+            except Exception:        # closed listener or failed authentication
+                if self.closed:
+                    return
+                continue
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def _serve(self, conn):
+        try:
+            kind, name = conn.recv()
+            assert kind == 'register'
+        except Exception:
+            conn.close()
+            return
+        with self.lock:
+            worker = self.workers.setdefault(name, {'tasks': 0, 'busy_time': 0., 'lost': 0, 'errors': 0, 'connected': True})
+            worker['connected'] = True
+        print('Worker', name, 'registered')
+        while not self.closed:
+            try:
+                item = self.tasks.get(timeout=1)
+            except queue.Empty:
+                continue
+            tid, task, job, attempts = item
+            start = time.time()
+            try:
+                conn.send(('task', tid, task))
+                while True:
+                    if not conn.poll(self.heartbeat_timeout):
+                        raise EOFError('heartbeat timeout')
+                    msg = conn.recv()
+                    if msg[0] == 'heartbeat':
+                        continue
+                    if msg[1] == tid:
+                        break
+            except (EOFError, OSError) as e:
+                print('Worker', name, 'lost (', e, '): re-queueing task', tid)
+                with self.lock:
+                    worker['lost'] += 1
+                    worker['connected'] = False
+                if attempts+1 < self.max_attempts:
+                    self.tasks.put((tid, task, job, attempts+1))
+                else:
+                    job._set(None, 'task '+str(tid)+' failed on '+str(attempts+1)+' workers')
+                conn.close()
+                return
+            with self.lock:
+                worker['tasks'] += 1
+                worker['busy_time'] += time.time() - start
+                if msg[0] == 'error':
+                    worker['errors'] += 1
+            if msg[0] == 'result':
+                job._set(msg[2])
+            else:
+                job._set(None, msg[2])
+        conn.close()
+
+
+
+class EvaluationBroker():
+    '''
+    Dispatch the evaluation tasks of several runs (SharedPoolExecutor) to a single multiprocessing.Pool, with fair sharing:
+    at most `capacity` tasks are in the pool, and the next free slot always goes to the run with pending tasks
+    that has the fewest tasks in the pool (ties are broken round-robin).
+
+    Args:
+        pool (multiprocessing.Pool): the shared pool
+        capacity (int): maximum number of tasks in the pool (default 2 tasks per core)
+
+    Attributes:
+        requests (multiprocessing.Queue): ('submit', run, tid, task), ('terminate', run) and ('done', run) requests of the runs
+    '''
+    def __init__(self, pool, capacity=None):
+        self.pool = pool
+        self.capacity = capacity if capacity!=None else 2*multiprocessing.cpu_count()
+        self.requests = multiprocessing.Queue()
+        self.results = {}                   # run -> multiprocessing.Queue of (tid, result, error)
+        self.pending = {}                   # run -> deque of (tid, task) waiting for a pool slot
+        self.in_flight = {}                 # run -> number of tasks in the pool
+        self.n_tasks = {}                   # run -> number of completed tasks
+        self.lock = threading.Lock()
+        self.next_run = 0
+        self.closed = False
+        self.thread = None
+
+    def register(self, run):
+        '''
+        Returns:
+            executor (SharedPoolExecutor): executor of run, to be passed to its driver process
+        '''
+        self.results[run] = multiprocessing.Queue()
+        self.pending[run] = collections.deque()
+        self.in_flight[run] = 0
+        self.n_tasks[run] = 0
+        return SharedPoolExecutor(run, self.requests, self.results[run])
+
+    def start(self):
+        self.thread = threading.Thread(target=self._serve, daemon=True)
+        self.thread.start()
+        return self
+
+    def close(self):
+        self.closed = True
+        if self.thread!=None:
+            self.thread.join()
+
+    def stats(self):
+        with self.lock:
+            return dict((run, {'tasks': self.n_tasks[run], 'in_flight': self.in_flight[run], 'pending': len(self.pending[run])})
+                        for run in self.pending)
+
+    #--------------------------------------#
+    def _serve(self):
+        while not self.closed:
+            try:
+                request = self.requests.get(timeout=0.05)
+            except queue.Empty:
+                request = None
+            while request != None:
+                self._handle(request)
+                try:
+                    request = self.requests.get_nowait()
+                except queue.Empty:
+                    request = None
+            self._dispatch()
+
+    def _handle(self, request):
+        kind, run = request[0], request[1]
+        with self.lock:
+            if kind == 'submit':
+                self.pending[run].append((request[2], request[3]))
+            else:                           # terminate or done: queued tasks are dropped, running tasks results are ignored
+                for tid, _ in self.pending[run]:
+                    self.results[run].put((tid, None, 'terminated'))
+                self.pending[run].clear()
+
+    def _dispatch(self):
+        runs = list(self.pending)
+        while True:
+            with self.lock:
+                if sum(self.in_flight.values()) >= self.capacity:
+                    return
+                waiting = [runs[(self.next_run+k) % len(runs)] for k in range(len(runs)) if self.pending[runs[(self.next_run+k) % len(runs)]]]
+                if not waiting:
+                    return
+                run = min(waiting, key=lambda r: self.in_flight[r])
+                self.next_run = (runs.index(run)+1) % len(runs)
+                tid, task = self.pending[run].popleft()
+                self.in_flight[run] += 1
+            self.pool.apply_async(evaluate_task, (task,),
+                                  callback=lambda result, run=run, tid=tid: self._completed(run, tid, result, None),
+                                  error_callback=lambda e, run=run, tid=tid: self._completed(run, tid, None, repr(e)))
+
+    def _completed(self, run, tid, result, error):
+        with self.lock:
+            self.in_flight[run] -= 1
+            self.n_tasks[run] += 1
+        self.results[run].put((tid, result, error))
+        self._dispatch()                    # fill the freed slot straightaway
+
+
+
+class SharedPoolExecutor():
+    '''
+    Executor of a run whose evaluations are dispatched by an EvaluationBroker (see EvaluationBroker.register).
+    It is created by the broker process and used by the driver process of the run: tasks are sent to the broker queue,
+    and a thread of the driver process receives the results.
+
+    Args:
+        run (int): run identifier
+        requests (multiprocessing.Queue): request queue of the broker
+        results (multiprocessing.Queue): result queue of the run
+    '''
+    def __init__(self, run, requests, results):
+        self.run = run
+        self.requests = requests
+        self.results = results
+        self.jobs = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['jobs'] = None
+        return state
+
+    def _start(self):
+        self.jobs = {}                      # tid -> TaskJob
+        self.session = os.getpid()          # results of the tasks of a previous driver process of the run are ignored
+        self.lock = threading.Lock()
+        self.n_tasks = 0
+        self.start_time = time.time()
+        self.receiver = threading.Thread(target=self._receive, daemon=True)
+        self.receiver.start()
+
+    def submit(self, environment, chromosome, i, to_file=False, prnt=False, callback=None, error_callback=None, profile=None):
+        if self.jobs == None:
+            self._start()
+        job = TaskJob(callback, error_callback)
+        with self.lock:
+            self.n_tasks += 1
+            tid = (self.session, self.n_tasks)
+            self.jobs[tid] = job
+        self.requests.put(('submit', self.run, tid, evaluation_task(environment, chromosome, i, profile)))
+        return job
+
+    def terminate(self):
+        ''' Drop all queued tasks (running tasks results will be ignored). '''
+        self.requests.put(('terminate', self.run))
+        if self.jobs != None:
+            with self.lock:
+                jobs, self.jobs = list(self.jobs.values()), {}
+            for job in jobs:
+                job._set(None, 'terminated')
+
+    def close(self):
+        '''
+        Release the run: the receiver thread is stopped before the driver process exits, otherwise the lock of the
+        result queue, that it holds while waiting, would stay acquired for the next driver process of the run.
+        '''
+        self.terminate()
+        self.requests.put(('done', self.run))
+        if self.jobs != None:
+            self.results.put(None)
+            self.receiver.join()
+
+    def stats(self):
+        elapsed = time.time() - self.start_time if self.jobs != None else 0.
+        n_tasks = self.n_tasks if self.jobs != None else 0
+        return {'shared': {'tasks': n_tasks, 'evals_per_sec': n_tasks/elapsed if elapsed>0 else 0.}}
+
+    def _receive(self):
+        while True:
+            item = self.results.get()
+            if item == None:
+                return
+            tid, result, error = item
+            with self.lock:
+                job = self.jobs.pop(tid, None)
+            if job != None:
+                job._set(result, error)
@@ -0,0 +1,205 @@
+'''
+This file define the History of an evolution run, returned by evolve() of g4p_solver.py.
+
+Only a small summary of each generation (best individual, max and mean fitness, number of chromosomes) is kept in memory,
+while the full generation data is spilled to append-only files of the history directory:
+- scores.f64:      float64 ScoreMatrix.scores (n_chromosomes x max_episodes) of each generation, padded with NaN
+- fitness.f64:     float64 fitness of each chromosome of each generation
+- chromosomes.bin: pickled compact chromosomes of each generation (see Chromosome.to_compact)
+- index.pkl:       summaries and files offsets of all generations
+
+Scores and fitness are read lazily as memory-mapped arrays, so resident memory does not depend on the number of generations.
+A History created without a directory spills to a new temporary directory that it owns: the directory is deleted by
+close() (or at the end of a with block), or at the latest when the History is garbage collected or the interpreter exits.
+'''
+
+
+import numpy as np
+import tempfile
+import weakref
+import shutil
+import pickle
+import os
+
+from Chromosome import Chromosome
+from Score_Store import ScoreMatrix
+
+
+class GenerationRecord():
+    '''
+    Summary of an evaluated generation. It exposes the same attributes of a Population used by plotting and exporting code,
+    but chromosomes_scores, chromosomes_fitness and chromosomes are loaded from disk only when accessed.
+
+    Attributes:
+        generation (int)
+        best_individual (Chromosome())
+        max_fitness (float)
+        mean_fitness (float)
+        n_chromosomes (int): number of evaluated (alive) chromosomes
+        n_died (int): number of chromosomes died during evaluation
+    '''
+    def __init__(self, history, entry, best_individual=None):
+        self.history = history
+        self.generation = entry['generation']
+        self.max_fitness = entry['max_fitness']
+        self.mean_fitness = entry['mean_fitness']
+        self.n_chromosomes = entry['rows']
+        self.n_died = entry['n_died']
+        self.best_individual = best_individual if best_individual!=None else Chromosome.from_compact(entry['best'])
+
+    @property
+    def chromosomes_scores(self):
+        return ScoreMatrix.from_padded(self.history.scores(self.generation))
+
+    @property
+    def chromosomes_fitness(self):
+        return self.history.fitness(self.generation)
+
+    @property
+    def chromosomes(self):
+        return self.history.chromosomes(self.generation)
+
+
+
+class History():
+    '''
+    Memory-bounded history of all generations of a run (see file description).
+
+    Args:
+        directory (str): directory of the history files (default a new temporary directory, owned by the History).
+            Existing history files of the directory are overwritten.
+    '''
+    def __init__(self, directory=None):
+        self.directory = directory if directory!=None else tempfile.mkdtemp(prefix='g4p-history-')
+        self._cleanup = weakref.finalize(self, shutil.rmtree, self.directory, ignore_errors=True) if directory==None else None
+        os.makedirs(self.directory, exist_ok=True)
+        self.index = []
+        self.records = []
+        for name in ('scores.f64', 'fitness.f64', 'chromosomes.bin'):
+            open(self._path(name), 'wb').close()
+        self._save_index()
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def close(self):
+        ''' Delete the temporary directory of the history, if the History created it (its data is no more readable). '''
+        if self._cleanup!=None:
+            self._cleanup()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def append(self, population, n_died=0):
+        '''
+        Spill the evaluated population (Population, with a Score_Store.ScoreMatrix of scores) to disk and keep its summary in memory.
+        '''
+        scores = np.ascontiguousarray(population.chromosomes_scores.scores, dtype=np.float64)
+        rows, cols = scores.shape
+        fitness = np.asarray(population.chromosomes_fitness, dtype=np.float64)
+        chromosomes = pickle.dumps([c.to_compact() for c in population.chromosomes], protocol=pickle.HIGHEST_PROTOCOL)
+
+        entry = {
+            'generation'        : len(self.index),
+            'rows'              : rows,
+            'cols'              : cols,
+            'scores_offset'     : os.path.getsize(self._path('scores.f64')),
+            'fitness_offset'    : os.path.getsize(self._path('fitness.f64')),
+            'chromosomes_offset': os.path.getsize(self._path('chromosomes.bin')),
+            'chromosomes_length': len(chromosomes),
+            'max_fitness'       : float(np.max(fitness)) if rows>0 else np.nan,
+            'mean_fitness'      : float(np.mean(fitness)) if rows>0 else np.nan,
+            'n_died'            : n_died,
+            'best'              : population.best_individual.to_compact(),
+        }
+        with open(self._path('scores.f64'), 'ab') as f:
+            f.write(scores.tobytes())
+        with open(self._path('fitness.f64'), 'ab') as f:
+            f.write(fitness.tobytes())
+        with open(self._path('chromosomes.bin'), 'ab') as f:
+            f.write(chromosomes)
+        self.index.append(entry)
+        self.records.append(GenerationRecord(self, entry, population.best_individual))
+        self._save_index()
+
+    def _save_index(self):
+        tmp = self._path('index.pkl.tmp')
+        with open(tmp, 'wb') as f:
+            pickle.dump(self.index, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, self._path('index.pkl'))
+
+    #-----------LAZY ACCESS-----------#
+    def scores(self, generation):
+        ''' Returns: read-only memory-mapped (n_chromosomes x n_episodes) scores of a generation (NaN when not played) '''
+        e = self.index[generation]
+        if e['rows']*e['cols']==0:
+            return np.empty((e['rows'], e['cols']))
+        return np.memmap(self._path('scores.f64'), dtype=np.float64, mode='r', offset=e['scores_offset'], shape=(e['rows'], e['cols']))
+
+    def fitness(self, generation):
+        e = self.index[generation]
+        if e['rows']==0:
+            return np.empty(0)
+        return np.memmap(self._path('fitness.f64'), dtype=np.float64, mode='r', offset=e['fitness_offset'], shape=(e['rows'],))
+
+    def chromosomes(self, generation):
+        e = self.index[generation]
+        with open(self._path('chromosomes.bin'), 'rb') as f:
+            f.seek(e['chromosomes_offset'])
+            return [Chromosome.from_compact(c) for c in pickle.loads(f.read(e['chromosomes_length']))]
+
+    #-----------SEQUENCE OF GENERATION RECORDS-----------#
+    def __len__(self):
+        return len(self.records)
+
+    def __getitem__(self, generation):
+        return self.records[generation]
+
+    def __iter__(self):
+        return iter(self.records)
+
+    #-----------PERSISTENCE-----------#
+    def state(self):
+        ''' Small picklable state of the history, used by checkpoints (see restore). '''
+        return {'directory': self.directory, 'index': list(self.index)}
+
+    @classmethod
+    def restore(cls, state):
+        '''
+        Reopen the history of state, discarding the data of the generations appended after state was taken.
+        '''
+        history = cls.__new__(cls)
+        history.directory = state['directory']
+        history._cleanup = None
+        history.index = list(state['index'])
+        history.records = [GenerationRecord(history, e) for e in history.index]
+        last = history.index[-1] if history.index else None
+        sizes = {
+            'scores.f64'     : last['scores_offset'] + 8*last['rows']*last['cols'] if last else 0,
+            'fitness.f64'    : last['fitness_offset'] + 8*last['rows'] if last else 0,
+            'chromosomes.bin': last['chromosomes_offset'] + last['chromosomes_length'] if last else 0,
+        }
+        for name, size in sizes.items():
+            with open(history._path(name), 'ab') as f:
+                f.truncate(size)
+        history._save_index()
+        return history
+
+    @classmethod
+    def load(cls, directory):
+        ''' Open the history saved in directory (e.g. to plot or export a run after it is terminated). '''
+        with open(os.path.join(directory, 'index.pkl'), 'rb') as f:
+            index = pickle.load(f)
+        return cls.restore({'directory': directory, 'index': index})
+
+    def __getstate__(self):
+        return self.state()
+
+    def __setstate__(self, state):
+        self.directory = state['directory']
+        self._cleanup = None        # only the History that created a temporary directory deletes it
+        self.index = state['index']
+        self.records = [GenerationRecord(self, e) for e in self.index]
@@ -19,22 +19,25 @@ import gym
 
 import time
 import multiprocessing
+import socket
+import os
 
 from anytree import Node, PreOrderIter, RenderTree, LevelOrderGroupIter
-from anytree.dotexport import RenderTreeGraph
-from anytree.exporter import DotExporter
 from anytree.search import find
 
 
 from collections import deque
-import matplotlib.pyplot as plt         
-from mpl_toolkits.mplot3d import Axes3D
 from multiprocessing import Pool
 import multiprocessing
 import copy
 
-from Chromosome import Chromosome
+from Chromosome import Chromosome, policy_cache
 from Grammatical_Evolution_mapper import Parser
+from Score_Store import ScoreMatrix
+from Selection import roulette_probabilities
+from Metrics import Metrics
+from Profiling import profiled_call
+import Provenance
 
 
 
@@ -48,10 +51,12 @@ class Population():
 
     Attributes:
         chromosomes (list(Chromosomes())): list of all chromosomes in that population
-        chromosomes_scores (list(list(int))): list of all gym episodes rewards for each chromosomes
-        chromosomes_fitness (list(float)): mean of chromosome_scores for each chromosomes scores
+        chromosomes_scores (Score_Store.ScoreMatrix): all gym episodes rewards for each chromosomes (one row for each chromosome)
+        chromosomes_fitness (np.array(float)): mean of chromosome_scores for each chromosomes scores
         survival_threashold (float): threashold that determine if a chromosome will survive or not (mean of all fitness values)
         best_indiviual (Chromosome()): best individual of that population (the one with highest fitness)
+        bloat (Bloat_Control.BloatControl): optional size/depth limits of mutation and parsimony pressure of natural selection
+        provenance (bool): attach a provenance record to the offsprings of crossover and mutation (see Provenance.py)
     '''
     def __init__(self, mutation_prob, crossover_prob, max_elite, environment):
         # Inizialization parameters
@@ -65,6 +70,8 @@ class Population():
         self.survival_threashold = None
         self.best_individual     = None
         self.environment = environment
+        self.bloat = None
+        self.provenance = False
     
     def initialize_chromosomes(self, n_chromosomes, genotype_len, MAX_DEPTH, MAX_WRAP=5, to_png=False):
         '''
@@ -93,6 +100,20 @@ class Population():
                 chromosome.generate_phenotype(self.environment, 'full', MAX_DEPTH, MAX_WRAP, to_png=to_png)
         self.chromosomes = population
 
+    def remove_dead(self):
+        '''
+        Remove from the population the chromosomes that died during evaluation (not valid in chromosomes_scores)
+        and set the fitness, the measured policy cost per step (chromosome.step_cost) and the behavior statistics of
+        the episodes (chromosome.behavior, see Environment.evaluate_chromosome) of the alive ones.
+        '''
+        alive = np.flatnonzero(self.chromosomes_scores.valid)
+        self.chromosomes = [self.chromosomes[i] for i in alive]
+        self.chromosomes_scores = self.chromosomes_scores.subset(alive)
+        self.chromosomes_fitness = self.chromosomes_scores.fitness()
+        for chromosome, step_cost, behavior in zip(self.chromosomes, self.chromosomes_scores.step_cost, self.chromosomes_scores.behavior):
+            chromosome.step_cost = step_cost
+            chromosome.behavior = behavior
+
 
     def fitness_share(self):
         from difflib import SequenceMatcher
@@ -120,11 +141,10 @@ class Population():
         and remove non-selected chromosomes from the population.
         '''
         if fittest==True:
-            elites = [e for i, e in enumerate(self.chromosomes)                     # survive only those fitness 
-                    if self.chromosomes_fitness[i] >= self.survival_threashold]     # is greater then  mean of all fitness
-            elite_scores = [e for i, e in enumerate(self.chromosomes_scores) 
-                    if self.chromosomes_fitness[i] >= self.survival_threashold]
-            elite_fitness = list(np.mean(elite_scores, axis=1))
+            survived = np.flatnonzero(np.asarray(self.chromosomes_fitness) >= self.survival_threashold)   # survive only those fitness 
+            elites = [self.chromosomes[i] for i in survived]                                            # is greater then  mean of all fitness
+            elite_scores = self.chromosomes_scores.subset(survived)
+            elite_fitness = elite_scores.fitness()
             # if len(elites) > self.max_elite:
             #     while len(elites)>self.max_elite:
             #         rm= np.argmin(elite_fitness)
@@ -171,6 +191,11 @@ class Population():
             #     if len(v)>self.max_elite//n_group:
             #         groups[k] = groups[k][:self.max_elite//n_group]
 
+            if self.bloat!=None and self.bloat.parsimony:
+                # lexicographic parsimony: the smallest chromosomes of equal fitness are the last ones, that survive
+                sizes = self.bloat.sizes(self.chromosomes)
+                for k in groups:
+                    groups[k] = sorted(groups[k], key=lambda i: (self.chromosomes_fitness[i], -sizes[i]))
             groups=np.hstack(list(groups.values()))
             groups= [int(i) for i in groups]
             
@@ -178,7 +203,7 @@ class Population():
                 groups= groups[-self.max_elite:]
             
             elites = np.array(self.chromosomes)[groups]
-            elite_scores = np.array(self.chromosomes_scores)[groups]
+            elite_scores = self.chromosomes_scores.subset(groups)
             elite_fitness = np.array(self.chromosomes_fitness)[groups]
             # print(elite_fitness)
 
@@ -208,6 +233,53 @@ class Population():
                 best_idx = idx
         return candidate1, candidate2
 
+    def selection_probabilities(self, x=3):
+        '''
+        Fitness proportional selection probabilities, with fitnesses raised to the x-th power.
+        Negative fitnesses are shifted to be positive before being raised.
+
+        Args:
+            x (int): selection pressure exponent
+        Returns:
+            select_probs (np.array(float)): one probability for each chromosome
+        '''
+        return roulette_probabilities(self.chromosomes_fitness, x)
+
+    def steady_state_insert(self, chromosome, result, max_size, replacement='worst', k=3):
+        '''
+        Insert an evaluated chromosome into a bounded population (steady-state evolution).
+        Scores are stored in a ScoreMatrix preallocated with max_size slots: while the population is not full
+        the chromosome takes the next free slot, otherwise it replaces the worst chromosome of the population ('worst')
+        or the worst of k random chromosomes ('tournament'), but only if its fitness is greater.
+
+        Args:
+            chromosome (Chromosome)
+            result (dict): evaluation result of the chromosome (see Environment.evaluate_chromosome)
+            max_size (int): maximum number of chromosomes in the population
+            replacement (str): replacement strategy ('worst' or 'tournament')
+            k (int): tournament size
+        Returns:
+            True if the chromosome has been inserted
+        '''
+        if not isinstance(self.chromosomes_scores, ScoreMatrix):
+            self.chromosomes_scores = ScoreMatrix(max_size, self.environment.n_episodes)
+        fitness = np.mean(result['scores'])
+        if len(self.chromosomes) < max_size:
+            slot = len(self.chromosomes)
+            self.chromosomes.append(chromosome)
+        else:
+            if replacement == 'tournament':
+                candidates = np.random.choice(len(self.chromosomes), min(k, len(self.chromosomes)), replace=False)
+                slot = candidates[np.argmin(self.chromosomes_fitness[candidates])]
+            else:
+                slot = int(np.argmin(self.chromosomes_fitness))
+            if fitness <= self.chromosomes_fitness[slot]:
+                return False
+            self.chromosomes[slot] = chromosome
+        self.chromosomes_scores.set(slot, result)
+        self.chromosomes_fitness = self.chromosomes_scores.fitness()[:len(self.chromosomes)]
+        return True
+
     def crossover(self, parent_A, parent_B, seed):
         '''  
         Produce offsprings switching two random subgraph selected in the two parents trees and 
@@ -244,9 +316,9 @@ class Population():
             # if both first nodes tree have the same label (both are or cond or expr)
             # choose random node from first expr or second
             if tree_a.children[0].label == 'cond':
-                name = np.random.choice(['expr_i', 'expr_e'])
+                name = rng.choice(['expr_i', 'expr_e'])
             else:
-                name = np.random.choice(['expr_a', 'expr_b'])
+                name = rng.choice(['expr_a', 'expr_b'])
             selected_node_A = [child for child in tree_a.children if child.name.rsplit(')')[1].rsplit('_id')[0] == name][0]
             selected_node_B = [child for child in tree_b.children if child.name.rsplit(')')[1].rsplit('_id')[0] == name][0]
             # selected_node_A1 = [child for child in tree_a1.children if child.name.rsplit(')')[1].rsplit('_id')[0] == name[1]][0]
@@ -287,13 +359,6 @@ class Population():
                     self.fix_indents(selected_node_B, selected_node_A)
             else:
                 return parent_A, parent_B, None, None
-        #---------------------------------------#
-        self.colorize(selected_node_A)
-        self.colorize(selected_node_B)
-        # if tree_a.children[0].label == tree_b.children[0].label:
-        #     self.colorize(selected_node_A1)
-        #     self.colorize(selected_node_B1)
-        #-----------------------------------------#
         #print('Crossingover... NODE', selected_node_A.name, selected_node_B.name)
         tmp_B = copy.deepcopy(selected_node_B)
         tmp_B.parent=None
@@ -311,6 +376,11 @@ class Population():
         tmp_A.parent = selected_node_B.parent
         selected_node_B.parent.children = tuple(siblings_B)
         child_B.phenotype = tree_b
+        if self.provenance:
+            Provenance.offspring(child_A, [parent_A, parent_B])
+            Provenance.add_event(child_A, 'crossover', tmp_B)
+            Provenance.offspring(child_B, [parent_B, parent_A])
+            Provenance.add_event(child_B, 'crossover', tmp_A)
         ###################################à
         # if tree_a.children[0].label == tree_b.children[0].label:
         #     tmp_B1 = copy.deepcopy(selected_node_B1)
@@ -360,23 +430,16 @@ class Population():
                             choice = str(np.random.choice(self.environment.actions))
                             leaf.code = choice+"\n"
                             leaf.label = choice
-                        color = '/oranges9/2'
-                        if leaf.color.rsplit('/',1)[0]=='/blues9':
-                            border = '/blues9/9'
-                        else: 
-                            border = '/oranges9/9'
-                            if int(leaf.color.rsplit('/',1)[1])<9:
-                                color = '/oranges9/'+str(int(leaf.color.rsplit('/',1)[1])+1)
-                            else:
-                                color = '/oranges9/2'
-                        leaf.color=color
-                        leaf.border=border
+                        if self.provenance:
+                            Provenance.add_event(chromosome, 'leaf', leaf)
             return chromosome
 
 
 
         if np.random.uniform() > self.mutation_prob:
             return chromosome
+        if self.bloat!=None:
+            add = self.bloat.add(add)
         root = chromosome.phenotype
         # Iterate over tree using level-order strategy returning lists of nodes for every level (e.g. levels[level][node])
         levels = [[node for node in children if node.label=='expr'or node.label=='cond'] 
@@ -393,23 +456,13 @@ class Population():
         selected_node = np.random.choice(level)
         level_number=len(level)
         mut_node_id = int(''.join(filter(str.isdigit, selected_node.name.rsplit('_id')[0])))
-        # set colors
-        color = '/oranges9/2'
-        if selected_node.color.rsplit('/',1)[0]=='/blues9':
-            border = '/blues9/9'
-        else: 
-            border = '/oranges9/9'
-            if int(selected_node.color.rsplit('/',1)[1])<9:
-                color = '/oranges9/'+str(int(selected_node.color.rsplit('/',1)[1])+1)
-            else:
-                color = '/oranges9/2'
         
         #print("Mutating... NODE ",selected_node.name)
         if selected_node.label == 'expr':
             # create new rando genotype of i_gen + n_descendents lenght
             mut_genotype = [np.random.randint(1,3)]+list(np.random.randint(0,1000,size=mut_node_id + len(selected_node.descendants)))
             # create new mutated node (root)
-            mutated = Node(selected_node.name, label='expr', code=selected_node.code, indent=selected_node.indent, color=color, border=border)
+            mutated = Node(selected_node.name, label='expr', code=selected_node.code, indent=selected_node.indent)
             # instantiate a new parser and set parser parameters back to those of the selected_node
             parser = Parser(mut_genotype, mutated, self.environment, 'full', MAX_DEPTH=add+max_depth+2-level_number, MAX_WRAP=10*max_depth)
             parser.i_gene = mut_node_id+1
@@ -417,16 +470,23 @@ class Population():
             mutated = parser.start_derivating('expr', tree_depth=level_number, indent=selected_node.indent)
         elif selected_node.label == 'cond':
             mut_genotype = list(np.random.randint(0,1000,size=mut_node_id + len(selected_node.descendants)))
-            mutated = Node(selected_node.name, label='cond', code=selected_node.code, color=color, border=border)
+            mutated = Node(selected_node.name, label='cond', code=selected_node.code)
             parser = Parser(mut_genotype, mutated, self.environment, 'full', MAX_DEPTH=add+max_depth, MAX_WRAP=max_depth)
             parser.i_gene = mut_node_id+1
             mutated = parser.start_derivating('cond', tree_depth=level_number)
 
+        parent = selected_node.parent
+        old_children = parent.children
         new_children = list(selected_node.parent.children)      # modify the list of parents' selected_node childrens
         new_children[selected_node.parent.children.index(       # sobstituting it with mutated one
             selected_node)] = mutated
         selected_node.parent.children = tuple(new_children)     # and reassigning it
         chromosome.phenotype = root                             # set mutated chromosomes' phenotype as mutated root
+        if self.bloat!=None and not self.bloat.accepts(chromosome, 'mutation'):
+            parent.children = old_children                      # undo the mutation (the mutated subtree is too large)
+            self.bloat.rejected['mutation'] += 1
+        elif self.provenance:
+            Provenance.add_event(chromosome, 'mutation', mutated)
         return chromosome
 
     def fix_indents(self, selected_node_A, selected_node_B):
@@ -471,27 +531,6 @@ class Population():
             #         node.code+='\t'        
 
 
-    def colorize(self, node):
-        color = '/blues9/2'
-        if node.color.rsplit('/',1)[0]=='/oranges9': # orange
-            border = '/oranges9/9'
-            for child in PreOrderIter(node):         # coloring all its childs the same
-                child.color=color
-                child.border=border
-        else:                                        # gray or blue
-            for child in PreOrderIter(node):
-                if child.color.rsplit('/',1)[0]=='/oranges9':
-                    border = '/oranges9/9'
-                    color = '/blues9/2'
-                else:
-                    border = '/blues9/9'
-                    if int(child.color.rsplit('/',1)[1])<9:
-                        color = '/blues9/'+str(int(child.color.rsplit('/',1)[1])+1)
-                    else:
-                        color = '/blues9/2'
-                child.color=color
-                child.border=border
-
 class Environment():
     '''
     This class contains all gyms' specific functions in relation with the chromosome representation .
@@ -499,8 +538,10 @@ class Environment():
         env_id (str): gym environment name
         n_episodes (int): number of episodes for each chromosome evaluation
         bins (list(int)): list that divide each observation of all possible all_obs in discrete intervalls
+        split_points (Split_Points.QuantileSplitPoints): optional data-driven split points, at the quantiles of the
+            states visited by a set of rollouts (default uniform over the observation space bounds)
     '''
-    def __init__(self, env_id, n_episodes, bins):
+    def __init__(self, env_id, n_episodes, bins, split_points=None):
         self.env = gym.make(env_id)
         self.n_episodes = n_episodes
         if self.env.spec.reward_threshold==None:
@@ -508,6 +549,8 @@ class Environment():
 
         self.bins = bins
         self.all_obs =  self.subdivide_all_obs(self.bins)
+        if split_points!=None:
+            self.all_obs = split_points.split_points(self)
         self.actions = np.arange(self.env.action_space.n)
         self.n_obs = np.arange(len(self.env.observation_space.low))
 
@@ -547,105 +590,191 @@ class Environment():
         print(all_obs)
         return all_obs
     
-    def run_one_episode(self, process_env, chromosome, episode, prnt=False, render=False):
+    def run_one_episode(self, process_env, chromosome, episode, prnt=False, render=False, behavior=None):
         '''
         Run a single gym episode (composed by n timesteps), until that episode reach a terminal state (done = True).
 
         Args:
             chromosome (Chromosome()): actual chromosome that it's going to be evaluated
             episode (int): actual episode
+            behavior (dict): optional accumulator of the 'action_counts' and of the 'observation_sum' of the timesteps
         
         Returns:
+            chk (int): number of timesteps in which the chromosome did not return any action
             episode_reward (int): sum of all episode rewards (earned on each timesteps)
+            steps (int): number of timesteps of the episode
+            policy_time (float): seconds spent executing the chromosome solution
         '''
         episode_reward = 0
         done = False
         obs = process_env.reset()
         chk=0
+        steps=0
+        policy_time=0.
         while not done:
             if render: process_env.render()
+            start = time.perf_counter()
             action = chromosome.execute_solution(obs, self.all_obs)
+            policy_time += time.perf_counter()-start
             if action == None:
                 chk +=1
                 action=1
+            if behavior!=None:
+                behavior['action_counts'][action] += 1
+                behavior['observation_sum'] += obs
             obs, reward, done, _ = process_env.step(action)
             episode_reward += reward
+            steps += 1
         if prnt: print('V' if episode_reward >= self.env.spec.reward_threshold else 'X'," Ep. ",episode," terminated (", episode_reward, "rewards )")
-        return chk, episode_reward
+        return chk, episode_reward, steps, policy_time
     
-    def evaluate_chromosome(self, envid, chromosome, i, to_file, prnt=False, render=False):
+    def evaluate_chromosome(self, envid, chromosome, i, to_file, prnt=False, render=False, profile=None):
         '''
         Run self.n_episodes gym episodes with actual chromosome.
         
         Args: 
             chromosome (Chromosome())
+            profile (str): None, 'cpu' (run under cProfile) or 'memory' (cProfile and tracemalloc), see Profiling.py
         
         Returns:
-            chromosome_scores (list(int)): list of all scores of the chromosome, of all episodes
+            result (dict): 'scores' (list of all scores of the chromosome, of all episodes), 
+                'lengths' (list of all episodes timesteps), 'wall_time' (seconds spent in the evaluation),
+                'cache_hits' (executions of the cached compiled policy), 'policy_time' (seconds spent executing the policy),
+                'behavior' ('action_frequency' and 'mean_observation' over all timesteps, and mean 'episode_length')
+                and 'worker' (host-pid of the evaluating process)
         '''
+        if profile != None:
+            return profiled_call(self.evaluate_chromosome, (envid, chromosome, i, to_file, prnt, render), memory=profile=='memory')
+        start_time = time.time()
+        start_hits = policy_cache['hits']
         process_env = gym.make(envid)
         process_env.seed(self.seed)
         chromosome_scores = deque(maxlen = process_env.spec.trials)
+        episode_lengths = deque(maxlen = process_env.spec.trials)
+        policy_time = 0.
+        behavior = {'action_counts': np.zeros(len(self.actions)), 'observation_sum': np.zeros(len(self.n_obs))}
         # set chromosome solutions' code
         
         # run solution code
         for episode in range(self.n_episodes):
-            chk, reward = self.run_one_episode(process_env, chromosome, episode, False, render)
+            chk, reward, steps, episode_policy_time = self.run_one_episode(process_env, chromosome, episode, False, render, behavior)
+            policy_time += episode_policy_time
             if chk!=0:
                 reward -= chk#*100//abs(reward)
             chromosome_scores.append(reward)
+            episode_lengths.append(steps)
             if process_env.spec.reward_threshold==None:
                 process_env.spec.reward_threshold = np.mean(chromosome_scores)
             if np.mean(chromosome_scores) >= process_env.spec.reward_threshold and episode>=process_env.spec.trials: #getting reward of 195.0 over 100 consecutive trials
                 break 
         if prnt: print("(",chromosome.cid,") Chromosome ",i,"fitness = ",np.mean(chromosome_scores))
         process_env.close()
-        return list(chromosome_scores)
+        total_steps = max(1, behavior['action_counts'].sum())
+        behavior = {'action_frequency': [float(f) for f in behavior['action_counts']/total_steps],
+                    'mean_observation': [float(o) for o in behavior['observation_sum']/total_steps],
+                    'episode_length': float(np.mean(episode_lengths))}
+        return {'scores': list(chromosome_scores), 'lengths': list(episode_lengths), 'wall_time': time.time()-start_time,
+                'cache_hits': policy_cache['hits']-start_hits, 'policy_time': policy_time, 'behavior': behavior,
+                'worker': '{}-{}'.format(socket.gethostname(), os.getpid())}
     
-    def parallel_evaluate_population(self, population, pool, to_file=False, prnt=False):
+    def submit_evaluation(self, chromosome, i, executor, to_file=False, prnt=False, callback=None, error_callback=None, metrics=None, profiler=None, generate=True):
         '''
-        Evaluate all chromosomes of the population (in parallel - using multiprocessing)
+        Generate the solution of a chromosome and submit its evaluation to the executor, without waiting for it.
+
+        Args:
+            chromosome (Chromosome())
+            i (int): index of the chromosome in its population
+            executor (Evaluation_Executor.PoolExecutor or TCPExecutor)
+            callback (function): optional function called with the chromosome scores when its evaluation is completed
+            error_callback (function): optional function called with the exception if the evaluation fails
+            metrics (Metrics.Metrics): optional run metrics (code_generation and dispatch phases)
+            profiler (Profiling.Profiler): optional profiler, that decides if the evaluation is profiled
+            generate (bool): generate the solution (False if it is already current, e.g. generated for the surrogate)
+        Returns:
+            job (object with a .get(timeout) method)
+        '''
+        if metrics == None:
+            metrics = Metrics()
+        if generate:
+            with metrics.phase('code_generation'):
+                chromosome.generate_solution(to_file)
+        profile = profiler.evaluation_mode() if profiler!=None else None
+        metrics.submitted()
+        with metrics.phase('dispatch'):
+            return executor.submit(self, chromosome, i, to_file, prnt, callback, error_callback, profile=profile)
+
+    def parallel_evaluate_population(self, population, executor, to_file=False, prnt=False, metrics=None, profiler=None):
+        '''
+        Evaluate all chromosomes of the population (in parallel - using an executor)
 
         Args:   
             population (list(Chromosome()))
-            pool (multiprocessing.Pool)
+            executor (Evaluation_Executor.PoolExecutor or TCPExecutor)
             to_file (bool)
+            metrics (Metrics.Metrics): optional run metrics
+            profiler (Profiling.Profiler): optional profiler of a sample of the evaluations
         
         Returns:
-            population_scores (list(list(int))): list of all chromosomes list of rewards
+            population_scores (Score_Store.ScoreMatrix): rewards of all chromosomes (one row for each chromosome)
         '''
-        population_scores = [] 
-        jobs=[]
-        ctr=0
-        for chromosome in population.chromosomes:
-            chromosome.generate_solution(to_file)
-        for i,chromosome in enumerate(population.chromosomes):                                       
-            jobs.append(pool.apply_async(self.evaluate_chromosome, [self.env.spec.id, chromosome, i, to_file, prnt]))
-        for j in jobs:
-            if not self.converged:
-                # if not j.ready():
-                #     j.wait()    # ensure order
-                try:
-                    score=j.get(120)
-                except multiprocessing.TimeoutError:
-                    score=None
-                    print(j,' not survived')
-                if score == None:
-                    population_scores.append(score)
-                else:
-                    population_scores.append(score)
-                    if np.mean(score)>=self.env.spec.reward_threshold:
-                        self.converged = True
-            else:
-                ctr+=1
-                if ctr==10:   # wait to terminate the pool also if the result is converged
-                    pool.terminate()
-                    break
-                else:
+        jobs = [self.submit_evaluation(chromosome, i, executor, to_file, prnt, metrics=metrics, profiler=profiler) for i,chromosome in enumerate(population.chromosomes)]
+        return self.collect_evaluations(jobs, executor, metrics, profiler)
+
+    def collect_evaluations(self, jobs, executor, metrics=None, profiler=None):
+        '''
+        Wait for the evaluation jobs submitted with submit_evaluation (in submission order).
+
+        Args:
+            jobs (list(job))
+            executor (Evaluation_Executor.PoolExecutor or TCPExecutor)
+            metrics (Metrics.Metrics): optional run metrics (evaluation phase and counters)
+            profiler (Profiling.Profiler): optional profiler, that merges the statistics of the profiled evaluations
+
+        Returns:
+            population_scores (Score_Store.ScoreMatrix): rewards of all chromosomes (rows of dead chromosomes are not valid)
+        '''
+        if metrics == None:
+            metrics = Metrics()
+        population_scores = ScoreMatrix(len(jobs), self.n_episodes)
+        with metrics.phase('evaluation'):
+            ctr=0
+            for i,j in enumerate(jobs):
+                if not self.converged:
+                    # if not j.ready():
+                    #     j.wait()    # ensure order
                     try:
-                        score=j.get(60)
+                        result=j.get(120)
                     except multiprocessing.TimeoutError:
-                        score=None
+                        result=None
+                        metrics.timeout()
+                        print(j,' not survived')
+                    except RuntimeError:
+                        result=None
                         print(j,' not survived')
-                    population_scores.append(score)
+                    if profiler!=None:
+                        profiler.add(result)
+                    population_scores.set(i, result)
+                    metrics.evaluation(result)
+                    if result != None and np.mean(result['scores'])>=self.env.spec.reward_threshold:
+                        self.converged = True
+                else:
+                    ctr+=1
+                    if ctr==10:   # wait to terminate the pool also if the result is converged
+                        executor.terminate()
+                        metrics.in_flight = max(0, metrics.in_flight-(len(jobs)-i))
+                        break
+                    else:
+                        try:
+                            result=j.get(60)
+                        except multiprocessing.TimeoutError:
+                            result=None
+                            metrics.timeout()
+                            print(j,' not survived')
+                        except RuntimeError:
+                            result=None
+                            print(j,' not survived')
+                        if profiler!=None:
+                            profiler.add(result)
+                        population_scores.set(i, result)
+                        metrics.evaluation(result)
         return population_scores
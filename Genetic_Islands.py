@@ -0,0 +1,203 @@
+'''
+This file define the island model of evolution, using evolve() of g4p_solver.py
+
+Several sub-populations (islands) evolve independently, each one in its own process and with its own group of
+pool workers, and every few generations they exchange their best chromosomes over a migration topology.
+Islands are independent between two migrations, so the model scales with the number of cores
+without growing a single population (and the cost of its selection steps).
+
+In particular it defines:
+- Migration: callable passed to evolve() by each island, that sends emigrants and receives immigrants
+- evolve_islands(): function that runs all islands and merges their results into a single report
+'''
+
+
+import numpy as np
+import multiprocessing
+import traceback
+import tempfile
+import shutil
+import queue
+import copy
+import os
+
+from Genetic_Gym import Population
+from Generation_History import History
+from Score_Store import ScoreMatrix
+from g4p_solver import evolve
+
+
+def migration_targets(topology, n_islands):
+    '''
+    Args:
+        topology (str or dict): 'ring' (island i sends to island i+1), 'all' (every island sends to every other one)
+            or a dict {island: [target islands]}
+        n_islands (int)
+    Returns:
+        targets (dict): {island: [target islands]}
+    '''
+    if isinstance(topology, dict):
+        return dict((i, list(topology.get(i, []))) for i in range(n_islands))
+    if topology == 'ring':
+        return dict((i, [(i+1) % n_islands] if n_islands>1 else []) for i in range(n_islands))
+    if topology == 'all':
+        return dict((i, [j for j in range(n_islands) if j!=i]) for i in range(n_islands))
+    raise ValueError('Unknown migration topology '+str(topology))
+
+
+class Migration():
+    '''
+    Migration step of an island. Every `every` generations it sends a copy of its best k chromosomes to its
+    target islands, and waits for the emigrants of its source islands.
+
+    Args:
+        island (int): index of this island
+        inboxes (list(multiprocessing.Queue)): one inbox for each island
+        targets (dict): {island: [target islands]} (see migration_targets)
+        k (int): number of emigrants
+        every (int): number of generations between two migrations
+        stop (multiprocessing.Event): set by the first converged island, to stop all the others
+        timeout (int): seconds to wait for the emigrants of a source island
+    '''
+    def __init__(self, island, inboxes, targets, k, every, stop, timeout=600):
+        self.island = island
+        self.inboxes = inboxes
+        self.targets = targets[island]
+        self.sources = [i for i, t in targets.items() if island in t]
+        self.k = k
+        self.every = every
+        self.stop = stop
+        self.timeout = timeout
+        self.finished = set()       # source islands that have already terminated their evolution
+        self.received = {}          # (source, generation) -> emigrants, received before being needed
+
+    def __call__(self, generation, population):
+        if population.environment.converged or self.stop.is_set():
+            population.environment.converged = True     # another island converged: stop at next generation
+            return []
+        if (generation+1) % self.every != 0:
+            return []
+        best = np.argsort(population.chromosomes_fitness)[::-1][:self.k]
+        emigrants = [(copy.deepcopy(population.chromosomes[i]), population.chromosomes_fitness[i]) for i in best]
+        for target in self.targets:
+            self.inboxes[target].put((self.island, generation, emigrants))
+
+        immigrants = []
+        for source in self.sources:
+            while (source, generation) not in self.received and source not in self.finished:
+                try:
+                    src, gen, migrants = self.inboxes[self.island].get(timeout=self.timeout)
+                except queue.Empty:
+                    print('Island', self.island, ': no migrants from island', source)
+                    break
+                if gen == None:
+                    self.finished.add(src)
+                else:
+                    self.received[(src, gen)] = migrants
+            immigrants += self.received.pop((source, generation), [])
+        return immigrants
+
+    def close(self):
+        ''' Tell target islands that this island will not send any more emigrants. '''
+        for target in self.targets:
+            self.inboxes[target].put((self.island, None, None))
+
+
+def run_island(island, population, environment, evolve_args, migration, results):
+    '''
+    Process target: run evolve() on a single island and send back its populations,
+    or (island, None, traceback) if it fails.
+    '''
+    try:
+        all_populations = evolve(population, environment, migration=migration, **evolve_args)
+        if environment.converged:
+            migration.stop.set()
+    except BaseException:
+        results.put((island, None, traceback.format_exc()))
+        raise
+    finally:
+        migration.close()
+    results.put((island, all_populations, None))
+
+
+def evolve_islands(population, environment, initial_n_chr, n_generations, genotype_len, seed, MAX_DEPTH, MAX_WRAP=2,
+                   n_islands=4, migration_k=2, migration_every=3, topology='ring', n_workers=None, migration_timeout=600, history_dir=None):
+    '''
+    Evolve n_islands sub-populations of initial_n_chr chromosomes in parallel processes, with periodic migrations.
+    Each island runs evolve() with its own seed (seed+island) and n_workers evaluation processes
+    (default multiprocessing.cpu_count()//n_islands).
+
+    Args:
+        population (Population): prototype population (mutation_prob, crossover_prob, max_elite) of all islands
+        environment (Environment)
+        n_islands (int): number of islands
+        migration_k (int): number of best chromosomes sent by an island on each migration
+        migration_every (int): number of generations between two migrations
+        topology (str or dict): migration topology (see migration_targets)
+        n_workers (int): number of evaluation processes of each island
+        history_dir (str): directory of the merged history (default a temporary directory deleted by all_populations.close());
+            the histories of the islands are spilled to a temporary directory deleted once they are merged
+    Returns:
+        all_populations (Generation_History.History): for each generation, the union of all islands' populations
+    Raises:
+        RuntimeError: if an island fails or terminates without sending its populations (the other islands are terminated)
+    '''
+    if n_workers is None:
+        n_workers = max(1, multiprocessing.cpu_count()//n_islands)
+    targets = migration_targets(topology, n_islands)
+    inboxes = [multiprocessing.Queue() for _ in range(n_islands)]
+    results = multiprocessing.Queue()
+    stop = multiprocessing.Event()
+
+    islands_dir = tempfile.mkdtemp(prefix='g4p-islands-')     # read by this process after the islands terminated
+    islands = []
+    for island in range(n_islands):
+        evolve_args = dict(initial_n_chr=initial_n_chr, n_generations=n_generations, genotype_len=genotype_len,
+                        seed=(seed+island) % (2**32 - 1), MAX_DEPTH=MAX_DEPTH, MAX_WRAP=MAX_WRAP, n_workers=n_workers,
+                        history_dir=os.path.join(islands_dir, 'island-{}'.format(island)))
+        migration = Migration(island, inboxes, targets, migration_k, migration_every, stop, migration_timeout)
+        process = multiprocessing.Process(target=run_island, args=(island, population, environment, evolve_args, migration, results))
+        process.start()
+        islands.append(process)
+
+    island_populations = [None]*n_islands
+    error = None
+    while error==None and any(p==None for p in island_populations):
+        try:
+            island, all_populations, error = results.get(timeout=5)
+            island_populations[island] = all_populations
+        except queue.Empty:     # an island killed (e.g. out of memory) never sends its result
+            for island, process in enumerate(islands):
+                if island_populations[island]==None and not process.is_alive() and results.empty():
+                    error = 'process terminated with exit code {}'.format(process.exitcode)
+                    break
+    if error!=None:
+        stop.set()
+        for process in islands:
+            process.terminate()
+            process.join()
+        shutil.rmtree(islands_dir, ignore_errors=True)
+        raise RuntimeError('Island {} failed: {}'.format(island, error))
+    for process in islands:
+        process.join()
+
+    #-----------MERGED REPORT-----------#
+    merged_populations = History(history_dir)
+    for generation in range(max(len(p) for p in island_populations)):
+        merged = Population(population.mutation_prob, population.crossover_prob, population.max_elite, environment)
+        merged.chromosomes_scores = ScoreMatrix(0, environment.n_episodes)
+        merged.chromosomes_fitness = []
+        bests = []
+        for all_populations in island_populations:
+            island_pop = all_populations[min(generation, len(all_populations)-1)]    # converged islands keep their last population
+            merged.chromosomes += list(island_pop.chromosomes)
+            merged.chromosomes_scores = merged.chromosomes_scores.concatenate(island_pop.chromosomes_scores)
+            merged.chromosomes_fitness += list(island_pop.chromosomes_fitness)
+            bests.append(max(island_pop.chromosomes_fitness))
+        merged.chromosomes_fitness = np.array(merged.chromosomes_fitness)
+        merged.best_individual = merged.chromosomes[np.argmax(merged.chromosomes_fitness)]
+        merged_populations.append(merged)
+        print('Generation', generation+1, ' islands max scores = ', bests, ' max score = ', max(bests))
+    shutil.rmtree(islands_dir, ignore_errors=True)
+    environment.converged = stop.is_set()
+    return merged_populations
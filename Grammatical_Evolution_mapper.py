@@ -27,16 +27,13 @@ class Parser():
 
     Args:
         initial_gene_seq (list(int)): the set of genes (integers) of the genotype
-        root (AnyTree.Node): starting node of the derivation tre, color=self.color, border=self.bordere
+        root (AnyTree.Node): starting node of the derivation tre
 
         environment (environment)
 
         method (str): method used for generate the tree (full or grow)
         MAX_DEPTH (int): maximum depth of the generated phenotypes' derivation trees
         MAX_WRAP  (int): maximum number of time that wrapping operator is applied to genotype
-
-        color (str)
-        colorscheme (str)
     '''
     def __init__(self, initial_gene_seq, root, environment, method, MAX_DEPTH, MAX_WRAP):
         self.wrap_ctr = 0                           # global counter that count number of time that wrap func is applied
@@ -51,8 +48,6 @@ class Parser():
         self.MAX_WRAP = MAX_WRAP                    # max number of time that wrap func is applied to the sequence of genes
         self.MAX_DEPTH = MAX_DEPTH -2               # max depth of the tree
 
-        self.color=''
-        self.border=''
         self.extra_id=''
         
         
@@ -60,8 +55,6 @@ class Parser():
     def start_derivating(self, node_type, tree_depth=0, indent=1, extra_id=''): 
         ''' Starting derivation rule. '''
         self.extra_id = extra_id
-        self.color = self.root.color
-        self.border = self.root.border
         if node_type=='expr':
             self.expr(self.initial_gene_seq, tree_depth, self.root, indent)
         if node_type=='cond':
@@ -112,32 +105,32 @@ class Parser():
 
             i_gene = self.i_gene
             if idx == 0:                                                                            # 0
-                child1 = Node('('+str(i_gene)+')cond'+'_id_'+str(id(node)), parent=node, label='cond', code="if ", color=self.color, border=self.border)
+                child1 = Node('('+str(i_gene)+')cond'+'_id_'+str(id(node)), parent=node, label='cond', code="if ")
                 self.cond(gene_seq, child1)
                 
-                child2 = Node('('+str(i_gene)+')expr_i'+'_id_'+str(id(node)), parent=node, label='expr', code=":\n{tab1}".format(tab1='\t'*(indent+1)), indent=indent+1, color=self.color, border=self.border)
+                child2 = Node('('+str(i_gene)+')expr_i'+'_id_'+str(id(node)), parent=node, label='expr', code=":\n{tab1}".format(tab1='\t'*(indent+1)), indent=indent+1)
                 self.expr(gene_seq, tree_depth+1, child2, indent+1)
 
             if idx == 1:                                                                            # 1
-                child1 = Node('('+str(i_gene)+')cond'+'_id_'+str(id(node)), parent=node, label='cond', code="if ", color=self.color, border=self.border)
+                child1 = Node('('+str(i_gene)+')cond'+'_id_'+str(id(node)), parent=node, label='cond', code="if ")
                 self.cond(gene_seq, child1)
                 
-                child2 = Node('('+str(i_gene)+')expr_i'+'_id_'+str(id(node)), parent=node, label='expr', code=":\n{tab1}".format(tab1='\t'*(indent+1)), indent=indent+1, color=self.color, border=self.border)
+                child2 = Node('('+str(i_gene)+')expr_i'+'_id_'+str(id(node)), parent=node, label='expr', code=":\n{tab1}".format(tab1='\t'*(indent+1)), indent=indent+1)
                 self.expr(gene_seq, tree_depth+1, child2, indent+1)
 
-                child3 = Node('('+str(i_gene)+')expr_e'+'_id_'+str(id(node)), parent=node, label='expr', code="\n{tab2}else:\n{tab3}".format(tab2='\t'*(indent), tab3='\t'*(indent+1)), indent=indent+1, color=self.color, border=self.border)
+                child3 = Node('('+str(i_gene)+')expr_e'+'_id_'+str(id(node)), parent=node, label='expr', code="\n{tab2}else:\n{tab3}".format(tab2='\t'*(indent), tab3='\t'*(indent+1)), indent=indent+1)
                 self.expr(gene_seq, tree_depth+1, child3, indent+1)
             if idx == 2:                                                                            # 2
-                child1 = Node('('+str(i_gene)+')expr_a'+'_id_'+str(id(node)), parent=node, label='expr', code="", indent=indent, color=self.color, border=self.border)
+                child1 = Node('('+str(i_gene)+')expr_a'+'_id_'+str(id(node)), parent=node, label='expr', code="", indent=indent)
                 self.expr(gene_seq, tree_depth+1, child1, indent)
 
-                child2 = Node('('+str(i_gene)+')expr_b'+'_id_'+str(id(node)), parent=node, label='expr', code="\n{tab1}".format(tab1='\t'*(indent)), indent=indent, color=self.color, border=self.border)
+                child2 = Node('('+str(i_gene)+')expr_b'+'_id_'+str(id(node)), parent=node, label='expr', code="\n{tab1}".format(tab1='\t'*(indent)), indent=indent)
                 self.expr(gene_seq, tree_depth+1, child2, indent)
             if idx == 3:                                                                             # 3
-                child = Node('('+str(i_gene)+')ACTION'+'_id_'+str(id(node)), parent=node, label='ACT', code="action = ", color=self.color, border=self.border)
+                child = Node('('+str(i_gene)+')ACTION'+'_id_'+str(id(node)), parent=node, label='ACT', code="action = ")
                 self.ACTION(gene_seq, child)
         else:
-            child = Node('('+str(self.i_gene)+')ACTION'+'_id_'+str(id(node)), parent=node, label='ACT', code="action = ", color=self.color, border=self.border)
+            child = Node('('+str(self.i_gene)+')ACTION'+'_id_'+str(id(node)), parent=node, label='ACT', code="action = ")
             self.ACTION(gene_seq, child)
 
 
@@ -148,16 +141,16 @@ class Parser():
         if self.i_gene >= len(gene_seq):
             gene_seq = self.wrap(gene_seq, True)
         i_gene=self.i_gene
-        child1 = Node('('+str(i_gene)+')N_OBS_obser'+'_id_'+str(id(node)), parent=node, label='N_OBS', code="observation[", color=self.color, border=self.border)
+        child1 = Node('('+str(i_gene)+')N_OBS_obser'+'_id_'+str(id(node)), parent=node, label='N_OBS', code="observation[")
         self.N_OBS(gene_seq, child1, True, '_obser')
             
-        child2 = Node('('+str(i_gene)+')COMP'+'_id_'+str(id(node)), parent=node, label='COMP', code='] ', color=self.color, border=self.border)
+        child2 = Node('('+str(i_gene)+')COMP'+'_id_'+str(id(node)), parent=node, label='COMP', code='] ')
         self.COMP(gene_seq, child2)
 
-        child3 = Node('('+str(i_gene)+')N_OBS_state'+'_id_'+str(id(node)), parent=node, label='N_OBS', code=' all_obs[', color=self.color, border=self.border)
+        child3 = Node('('+str(i_gene)+')N_OBS_state'+'_id_'+str(id(node)), parent=node, label='N_OBS', code=' all_obs[')
         n_obs = self.N_OBS(gene_seq, child3, False, '_state')
         
-        child4 = Node('('+str(i_gene)+')SPT_PT'+'_id_'+str(id(node)), parent=node, label='SPLT_PT', code='][', color=self.color, border=self.border)
+        child4 = Node('('+str(i_gene)+')SPT_PT'+'_id_'+str(id(node)), parent=node, label='SPLT_PT', code='][')
         self.SPLT_PT(gene_seq, child4, n_obs)       
 
 
@@ -172,9 +165,9 @@ class Parser():
         
         idx = gene_seq[self.i_gene] % 2
         if idx == 0:
-            Node('('+str(self.i_gene)+')less'+'_id_'+str(id(node)), parent=node, label='<= ', code="<=", color=self.color, border=self.border)
+            Node('('+str(self.i_gene)+')less'+'_id_'+str(id(node)), parent=node, label='<= ', code="<=")
         if idx == 1:
-            Node('('+str(self.i_gene)+')great'+'_id_'+str(id(node)), parent=node, label='> ', code=">", color=self.color, border=self.border)
+            Node('('+str(self.i_gene)+')great'+'_id_'+str(id(node)), parent=node, label='> ', code=">")
 
 
     def N_OBS(self, gene_seq, node, incr, arr):
@@ -196,7 +189,7 @@ class Parser():
         
         for obs in range(len(self.environment.all_obs)):
             if idx == obs:
-                Node('('+str(self.i_gene)+')idx'+'_id_'+str(id(node)), parent=node, label=str(idx), code=str(idx), color=self.color, border=self.border)
+                Node('('+str(self.i_gene)+')idx'+'_id_'+str(id(node)), parent=node, label=str(idx), code=str(idx))
         return idx
 
 
@@ -211,7 +204,7 @@ class Parser():
         idx = gene_seq[self.i_gene] % self.environment.bins[n_obs]
         for n_of_splt in range(self.environment.bins[n_obs]):
             if idx == n_of_splt:
-                Node('('+str(self.i_gene)+')splt'+'_id_'+str(id(node)), parent=node, label=str(idx), code=str(idx)+"]", color=self.color, border=self.border)
+                Node('('+str(self.i_gene)+')splt'+'_id_'+str(id(node)), parent=node, label=str(idx), code=str(idx)+"]")
 
 
     def ACTION(self, gene_seq, node):
@@ -225,4 +218,4 @@ class Parser():
         idx = gene_seq[self.i_gene] % len(self.environment.actions)
         for action in self.environment.actions:
             if idx == action:
-                Node('('+str(self.i_gene)+')act'+'_id_'+str(id(node)), parent=node, label=str(idx), code=str(idx)+"\n", color=self.color, border=self.border)
+                Node('('+str(self.i_gene)+')act'+'_id_'+str(id(node)), parent=node, label=str(idx), code=str(idx)+"\n")
@@ -0,0 +1,162 @@
+'''
+This file define the memetic local search used by evolve() of g4p_solver.py to improve the terminals of the elites.
+
+Once the structure of the programs stabilizes, the fitness of an elite often depends only on its terminals: the split
+point index and the comparator of each condition and the actions. The leaves only mutation of Population.mutate
+changes them at random, with a full evaluation of the whole population for each try. LocalSearch instead hill-climbs
+the terminals of the top_k elites: the neighborhood of an elite is the set of its single terminal changes (every
+other split point of a condition, the other comparator, every other action), visited in random order.
+Each round takes batch_size untried neighbors of every elite and evaluates all of them at once on the executor (the
+evaluation pool), with the same episode seeds as the elites (Environment.seed), so that fitness is compared on the
+same episodes. The best neighbor that improves an elite replaces it, and the search goes on from its neighborhood.
+The search stops when the neighborhoods are exhausted or when max_evaluations candidates have been evaluated in the
+generation: the budget counts evaluations, so a run is reproducible whatever the speed and the load of the workers.
+An opt-in cpu_budget also stops it when the evaluation time of the candidates (the CPU time spent by the workers)
+reaches cpu_budget seconds; since that time depends on the machine, a run with a cpu_budget is not reproducible.
+
+Improved elites replace the originals as parents of the generation, and are carried over to the next generation.
+'''
+
+
+import numpy as np
+import multiprocessing
+import copy
+from anytree import PreOrderIter
+
+from Score_Store import ScoreMatrix
+import Provenance
+
+
+def terminal_moves(chromosome, environment):
+    '''
+    Returns:
+        moves (list((int, str, str))): (pre-order index of the leaf, new label, new code) of each single terminal change
+    '''
+    moves = []
+    for i, leaf in enumerate(PreOrderIter(chromosome.phenotype)):
+        if not leaf.is_leaf or leaf.parent==None:
+            continue
+        if leaf.parent.label=='SPLT_PT':
+            n_obs = int(leaf.parent.parent.children[0].children[0].label)
+            moves += [(i, str(j), str(j)+"]") for j in range(environment.bins[n_obs]) if str(j)!=leaf.label]
+        elif leaf.parent.label=='COMP':
+            moves.append((i, '> ', '>') if leaf.code=='<=' else (i, '<= ', '<='))
+        elif leaf.parent.label=='ACT':
+            moves += [(i, str(a), str(a)+"\n") for a in environment.actions if str(a)!=leaf.label]
+    return moves
+
+
+def apply_move(chromosome, move, provenance=False):
+    '''
+    Returns:
+        candidate (Chromosome): copy of chromosome with the terminal change move (see terminal_moves)
+    '''
+    i, label, code = move
+    candidate = copy.deepcopy(chromosome)
+    for j, leaf in enumerate(PreOrderIter(candidate.phenotype)):
+        if j == i:
+            leaf.label = label
+            leaf.code = code
+            if provenance:
+                Provenance.add_event(candidate, 'leaf', leaf)
+            break
+    candidate.generate_solution()
+    return candidate
+
+
+
+class LocalSearch():
+    '''
+    Args:
+        top_k (int): number of elites (with distinct solutions) improved each generation
+        max_evaluations (int): candidates evaluated in a generation
+        batch_size (int): candidates of each elite evaluated at each round
+        only_stagnating (bool): search only in the generations where the max fitness has not improved
+        cpu_budget (float): optional evaluation time (CPU seconds of the workers) of the candidates of a generation.
+            Warning: the number of evaluations then depends on the speed and load of the workers, and the run is
+            not reproducible (None, the default, uses only max_evaluations)
+
+    Attributes:
+        stats (dict): 'evaluations', 'improved' and 'cpu_time' of the last search
+    '''
+    def __init__(self, top_k=3, max_evaluations=64, batch_size=8, only_stagnating=True, cpu_budget=None):
+        self.top_k = top_k
+        self.max_evaluations = max_evaluations
+        self.cpu_budget = cpu_budget
+        self.batch_size = batch_size
+        self.only_stagnating = only_stagnating
+        self.stats = {'evaluations': 0, 'improved': 0, 'cpu_time': 0.}
+
+    def neighbors(self, chromosome, environment, rng):
+        ''' Returns: terminal_moves of chromosome, in random order '''
+        moves = terminal_moves(chromosome, environment)
+        return [moves[k] for k in rng.permutation(len(moves))]
+
+    def evaluate(self, candidates, environment, executor, metrics=None, profiler=None):
+        '''
+        Evaluate a batch of candidates. Unlike Environment.collect_evaluations, a candidate that reaches the reward
+        threshold does not stop the run here: it is detected when the improved elite is evaluated again.
+
+        Returns:
+            scores (Score_Store.ScoreMatrix)
+        '''
+        jobs = [environment.submit_evaluation(c, i, executor, metrics=metrics, profiler=profiler) for i, c in enumerate(candidates)]
+        scores = ScoreMatrix(len(jobs), environment.n_episodes)
+        for i, job in enumerate(jobs):
+            try:
+                result = job.get(120)
+            except (multiprocessing.TimeoutError, RuntimeError):
+                result = None
+            if profiler!=None:
+                profiler.add(result)
+            scores.set(i, result)
+            if metrics!=None:
+                metrics.evaluation(result)
+        return scores
+
+    def improve(self, population, environment, executor, rng, metrics=None, profiler=None):
+        '''
+        Hill-climb the terminals of the top_k elites of the population, and replace the improved ones (and their fitness).
+
+        Args:
+            population (Genetic_Gym.Population): population after natural selection
+            rng (np.random.RandomState): random generator of the neighbors order
+        Returns:
+            improved (list(int)): indexes of the improved elites in population.chromosomes
+        '''
+        fitness = np.array(population.chromosomes_fitness, dtype=float)
+        elites, solutions = [], set()
+        for i in np.argsort(-fitness, kind='stable'):
+            if len(elites) < self.top_k and population.chromosomes[i].solution not in solutions:
+                solutions.add(population.chromosomes[i].solution)
+                elites.append(i)
+        current = dict((i, (population.chromosomes[i], fitness[i])) for i in elites)
+        moves = dict((i, self.neighbors(population.chromosomes[i], environment, rng)) for i in elites)
+        self.stats = {'evaluations': 0, 'improved': 0, 'cpu_time': 0.}
+        while self.stats['evaluations'] < self.max_evaluations and any(moves.values()):
+            if self.cpu_budget!=None and self.stats['cpu_time'] >= self.cpu_budget:
+                break
+            batch = []
+            for i in elites:
+                for _ in range(min(self.batch_size, len(moves[i]), self.max_evaluations-self.stats['evaluations']-len(batch))):
+                    batch.append((i, apply_move(current[i][0], moves[i].pop(), population.provenance)))
+            scores = self.evaluate([c for _, c in batch], environment, executor, metrics, profiler)
+            batch_fitness = scores.fitness()
+            self.stats['evaluations'] += len(batch)
+            self.stats['cpu_time'] += float(np.sum(scores.wall_time))
+            for i in elites:
+                candidates = [k for k, (e, _) in enumerate(batch) if e==i and scores.valid[k]]
+                if not candidates:
+                    continue
+                best = max(candidates, key=lambda k: batch_fitness[k])
+                if batch_fitness[best] > current[i][1]:
+                    batch[best][1].step_cost = scores.step_cost[best]
+                    current[i] = (batch[best][1], batch_fitness[best])
+                    moves[i] = self.neighbors(current[i][0], environment, rng)
+        improved = [i for i in elites if current[i][0] is not population.chromosomes[i]]
+        population.chromosomes = list(population.chromosomes)
+        for i in improved:
+            population.chromosomes[i], fitness[i] = current[i]
+        population.chromosomes_fitness = fitness
+        self.stats['improved'] = len(improved)
+        return improved
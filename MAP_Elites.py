@@ -0,0 +1,166 @@
+'''
+This file define the MAP-Elites archive of the quality diversity mode of evolve() of g4p_solver.py.
+
+The archive is a grid over user-chosen behavior descriptors, computed from the behavior statistics of the episodes
+of each evaluated chromosome (chromosome.behavior, see Environment.evaluate_chromosome and Population.remove_dead):
+- ('action_frequency', a, low, high, n_cells): frequency of action a over all the timesteps
+- ('mean_observation', i, low, high, n_cells): mean of observation i over all the timesteps
+- ('episode_length', None, low, high, n_cells): mean number of timesteps of the episodes
+Each descriptor range [low, high] is divided in n_cells equal cells (values outside it fall in the border cells).
+The grid is kept in NumPy arrays (the fitness and the elite chromosome of each cell) together with the list of the
+occupied cells, so a chromosome is inserted in O(1): it takes the cell of its descriptors if the cell is empty or
+if it has a better fitness than the elite of the cell.
+
+In quality diversity mode every evaluated chromosome is offered to the archive, and the parents of each generation
+are sampled, all at once, uniformly among the occupied cells: natural selection, fitness sharing and the removal
+of the chromosomes at the max fitness of the stagnation phases are not used, no evaluated elite is thrown away.
+Offsprings are produced by the usual crossover and mutation, and evaluated in parallel as in evolve().
+'''
+
+
+import numpy as np
+import json
+
+from Chromosome import Chromosome
+
+
+FEATURES = ('action_frequency', 'mean_observation', 'episode_length')
+
+
+def descriptor_values(behavior, descriptors):
+    '''
+    Args:
+        behavior (dict): behavior statistics of a chromosome (see Environment.evaluate_chromosome)
+        descriptors (list(tuple)): (feature, index, low, high, n_cells) of each descriptor
+    Returns:
+        values (np.array(float)): value of each descriptor
+    '''
+    return np.array([behavior[feature] if feature=='episode_length' else behavior[feature][index]
+                     for feature, index, _, _, _ in descriptors], dtype=float)
+
+
+
+class MAPElites():
+    '''
+    Args:
+        descriptors (list(tuple)): (feature, index, low, high, n_cells) of each dimension of the grid (see the module docstring)
+
+    Attributes:
+        fitness (np.array(float)): fitness of the elite of each cell (-inf for the empty cells)
+        elites (np.array(object)): elite Chromosome of each cell (None for the empty cells)
+        occupied (list(int)): flat indexes of the occupied cells
+        inserted (int): chromosomes that took a cell since the last stats
+    '''
+    def __init__(self, descriptors):
+        for feature, index, low, high, n_cells in descriptors:
+            if feature not in FEATURES:
+                raise ValueError('Unknown behavior descriptor '+str(feature))
+            if not high > low or n_cells < 1:
+                raise ValueError('Empty range of the behavior descriptor '+str(feature))
+        self.descriptors = [tuple(d) for d in descriptors]
+        self.shape = tuple(int(d[4]) for d in self.descriptors)
+        self.low = np.array([d[2] for d in self.descriptors], dtype=float)
+        self.high = np.array([d[3] for d in self.descriptors], dtype=float)
+        self.fitness = np.full(self.shape, -np.inf)
+        self.elites = np.full(self.shape, None, dtype=object)
+        self.occupied = []
+        self.inserted = 0
+
+    def cell(self, values):
+        ''' Returns: flat index of the cell of the descriptor values '''
+        idx = ((values-self.low)/(self.high-self.low)*self.shape).astype(int)
+        return int(np.ravel_multi_index(tuple(np.clip(idx, 0, np.array(self.shape)-1)), self.shape))
+
+    def __len__(self):
+        return len(self.occupied)
+
+    #--------------------------------------#
+    def insert(self, chromosomes, fitness):
+        '''
+        Offer evaluated chromosomes to the archive (chromosomes without behavior statistics are ignored).
+
+        Returns:
+            n_inserted (int): number of chromosomes that took a cell
+        '''
+        n_inserted = 0
+        for chromosome, f in zip(chromosomes, fitness):
+            behavior = getattr(chromosome, 'behavior', None)
+            if behavior==None or np.isnan(f):
+                continue
+            c = self.cell(descriptor_values(behavior, self.descriptors))
+            if f > self.fitness.flat[c]:
+                if self.elites.flat[c] is None:
+                    self.occupied.append(c)
+                self.fitness.flat[c] = f
+                self.elites.flat[c] = chromosome
+                n_inserted += 1
+        self.inserted += n_inserted
+        return n_inserted
+
+    def sample(self, n_pairs, rng):
+        '''
+        Sample the parents of a generation uniformly among the occupied cells.
+
+        Args:
+            rng (np.random.Generator)
+        Returns:
+            chromosomes (np.array(object)): sampled elites (each one once)
+            fitness (np.array(float)): their fitness
+            pairs (np.array(int)): (n_pairs x 2) parents, as indexes of chromosomes
+        '''
+        cells = np.asarray(self.occupied)[rng.integers(len(self.occupied), size=2*n_pairs)]
+        unique, pairs = np.unique(cells, return_inverse=True)
+        return self.elites.flat[unique], self.fitness.flat[unique], pairs.reshape(n_pairs, 2)
+
+    def best(self):
+        ''' Returns: elite with the best fitness (None if the archive is empty) '''
+        return self.elites.flat[max(self.occupied, key=lambda c: self.fitness.flat[c])] if self.occupied else None
+
+    def stats(self):
+        '''
+        Returns:
+            stats (dict): 'archive_size', 'archive_coverage' (fraction of occupied cells), 'archive_max_fitness',
+                'archive_mean_fitness' and 'archive_inserted' (chromosomes that took a cell since the last stats)
+        '''
+        fitness = self.fitness.flat[self.occupied] if self.occupied else np.array([np.nan])
+        stats = {'archive_size': len(self.occupied), 'archive_coverage': len(self.occupied)/self.fitness.size,
+                 'archive_max_fitness': float(np.max(fitness)), 'archive_mean_fitness': float(np.mean(fitness)),
+                 'archive_inserted': self.inserted}
+        self.inserted = 0
+        return stats
+
+    #--------------------------------------#
+    def state(self):
+        ''' Returns: compact state of the archive, saved in the checkpoints of evolve() '''
+        elites = [self.elites.flat[c] for c in self.occupied]
+        return {'descriptors': self.descriptors, 'cells': list(self.occupied),
+                'fitness': [float(self.fitness.flat[c]) for c in self.occupied],
+                'elites': [elite.to_compact() for elite in elites],
+                'behaviors': [getattr(elite, 'behavior', None) for elite in elites],
+                'step_costs': [getattr(elite, 'step_cost', None) for elite in elites]}
+
+    def restore(self, state):
+        ''' Restore the archive from a checkpoint state (see state), with the behavior statistics of the elites. '''
+        self.__init__(state['descriptors'])
+        n = len(state['cells'])
+        behaviors, step_costs = state.get('behaviors', [None]*n), state.get('step_costs', [None]*n)
+        for c, f, compact, behavior, step_cost in zip(state['cells'], state['fitness'], state['elites'], behaviors, step_costs):
+            self.fitness.flat[c] = f
+            self.elites.flat[c] = Chromosome.from_compact(compact)
+            if behavior!=None:
+                self.elites.flat[c].behavior = behavior
+            if step_cost!=None:
+                self.elites.flat[c].step_cost = step_cost
+            self.occupied.append(c)
+
+    def write(self, path):
+        ''' Write the archive to a JSON file (cell, descriptor values and fitness of each elite, best first). '''
+        cells = []
+        for c in sorted(self.occupied, key=lambda c: -self.fitness.flat[c]):
+            elite = self.elites.flat[c]
+            cells.append({'cell': [int(i) for i in np.unravel_index(c, self.shape)], 'fitness': float(self.fitness.flat[c]),
+                          'descriptors': list(descriptor_values(elite.behavior, self.descriptors)) if getattr(elite, 'behavior', None)!=None else None,
+                          'solution': elite.solution})
+        with open(path, 'w') as f:
+            json.dump({'descriptors': self.descriptors, 'cells': cells}, f, indent=2)
+        print('MAP-Elites archive of', len(cells), 'elites written to', path)
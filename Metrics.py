@@ -0,0 +1,118 @@
+'''
+This file define the run metrics of evolve() of g4p_solver.py: phase timers and evaluation counters,
+emitted as one structured JSON record (one line of a JSONL file) per generation.
+
+Phases (seconds spent by the driver in each phase of the generation):
+- initialization:  generation of the random chromosomes (genotype to phenotype mapping)
+- code_generation: generation of the python programs of the chromosomes (Chromosome.generate_solution)
+- dispatch:        submission of the evaluations to the executor
+- evaluation:      waiting for the evaluation results
+- selection:       removal of dead chromosomes, natural selection and parent selection
+- fitness_sharing: Population.fitness_share
+- crossover:       waiting for the crossover jobs
+- mutation:        Population.mutate
+- artifacts:       history spilling and artifact requests
+- checkpoint:      checkpoint pickling
+- surrogate:       training of the surrogate fitness model and screening of the offsprings (see Surrogate.py)
+Phases overlap with the evaluations running on the workers, so their sum is not the wall time of the generation.
+
+Counters: evaluations, dead chromosomes, timeouts, episodes, environment steps and compiled policy cache hits
+(see Chromosome.execute_solution), plus evaluations, steps, busy time and steps/sec of each worker.
+Run totals of the counters, the number of evaluations in flight and the last record are also kept,
+to be exposed while the run is going on (see Metrics_Server.py).
+'''
+
+
+import contextlib
+import json
+import time
+
+
+PHASES = ('initialization', 'code_generation', 'dispatch', 'evaluation', 'selection', 'fitness_sharing',
+          'crossover', 'mutation', 'artifacts', 'checkpoint', 'surrogate')
+
+
+class Metrics():
+    '''
+    Args:
+        path (str): JSONL file of the generation records (None: records are only kept in memory)
+
+    Attributes:
+        records (list(dict)): the emitted generation records
+        totals (dict): counters of the whole run
+        in_flight (int): evaluations submitted and not collected yet
+        generation (int): generation of the last emitted record
+    '''
+    def __init__(self, path=None):
+        self.path = path
+        self.records = []
+        self.totals = {'evaluations': 0, 'dead': 0, 'timeouts': 0, 'episodes': 0, 'steps': 0, 'cache_hits': 0}
+        self.in_flight = 0
+        self.generation = None
+        if path!=None:
+            open(path, 'w').close()
+        self.reset()
+
+    def reset(self):
+        self.start = time.perf_counter()
+        self.phases = dict((phase, 0.) for phase in PHASES)
+        self.counters = {'evaluations': 0, 'dead': 0, 'timeouts': 0, 'episodes': 0, 'steps': 0, 'cache_hits': 0}
+        self.workers = {}
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        ''' Add the time spent in the with block to the phase name. '''
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.) + time.perf_counter() - start
+
+    def count(self, name, n=1):
+        self.counters[name] += n
+        self.totals[name] += n
+
+    def submitted(self):
+        self.in_flight += 1
+
+    def timeout(self):
+        self.count('timeouts')
+
+    def evaluation(self, result):
+        '''
+        Count an evaluation result (see Genetic_Gym.Environment.evaluate_chromosome), None if the chromosome died.
+        '''
+        self.in_flight = max(0, self.in_flight-1)
+        self.count('evaluations')
+        if result == None:
+            self.count('dead')
+            return
+        steps = int(sum(result['lengths']))
+        self.count('episodes', len(result['scores']))
+        self.count('steps', steps)
+        self.count('cache_hits', result.get('cache_hits', 0))
+        worker = self.workers.setdefault(str(result.get('worker')), {'evaluations': 0, 'steps': 0, 'busy_time': 0.})
+        worker['evaluations'] += 1
+        worker['steps'] += steps
+        worker['busy_time'] += result['wall_time']
+
+    def emit(self, generation, **fields):
+        '''
+        Write the record of a generation (with extra fields, e.g. fitness statistics) and reset timers and counters.
+
+        Returns:
+            record (dict)
+        '''
+        workers = {}
+        for name, w in self.workers.items():
+            workers[name] = dict(w, steps_per_sec=w['steps']/w['busy_time'] if w['busy_time']>0 else 0.)
+        record = {'generation': generation, 'time': time.time(), 'wall_time': time.perf_counter()-self.start}
+        record.update(fields)
+        record.update({'phases': dict(self.phases), 'counters': dict(self.counters), 'workers': workers})
+        self.records.append(record)
+        self.generation = generation
+        if self.path!=None:
+            with open(self.path, 'a') as f:
+                f.write(json.dumps(record)+'\n')
+        self.reset()
+        return record
@@ -0,0 +1,160 @@
+'''
+This file define the live metrics endpoint of a running evolution: a small HTTP server (standard library only)
+that runs in a daemon thread of the driver and exposes its Metrics.Metrics (see Metrics.py).
+
+Endpoints:
+- /metrics       Prometheus text format
+- /metrics.json  the same values as JSON
+
+The server only reads values that the driver loop already updates (counters, in-flight evaluations and
+the last generation record), so it never blocks evolution; evaluation workers are never contacted,
+so it works with any executor (local pool, remote TCP workers, ...).
+Memory usage is the resident memory of the driver and of its child processes (e.g. the pool workers).
+
+usage:
+    metrics = Metrics('./outputs/metrics.jsonl')
+    server = MetricsServer(metrics, port=9100).start()
+    evolve(..., metrics=metrics)
+    server.close()
+'''
+
+
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from socketserver import ThreadingMixIn
+import multiprocessing
+import threading
+import json
+import time
+
+
+def resident_memory(pid='self'):
+    '''
+    Returns:
+        rss (int): resident memory (bytes) of process pid, 0 if it can not be read
+    '''
+    try:
+        with open('/proc/{}/status'.format(pid)) as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1])*1024
+    except (OSError, ValueError, IndexError):
+        pass
+    if pid == 'self':
+        try:
+            import resource
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss*1024     # peak, on systems without /proc
+        except ImportError:
+            pass
+    return 0
+
+
+def snapshot(metrics, start_time):
+    '''
+    Returns:
+        values (dict): the current values exposed by the endpoint
+    '''
+    last = metrics.records[-1] if metrics.records else {}
+    wall_time = last.get('wall_time', 0.)
+    counters = last.get('counters', {'evaluations': 0, 'steps': 0})
+    workers = {}
+    for name, w in last.get('workers', {}).items():
+        workers[name] = {'steps_per_sec': w['steps_per_sec'], 'utilization': w['busy_time']/wall_time if wall_time>0 else 0.}
+    return {
+        'generation'           : metrics.generation,
+        'best_fitness'         : last.get('max_fitness'),
+        'mean_fitness'         : last.get('mean_fitness'),
+        'evaluations_per_sec'  : counters['evaluations']/wall_time if wall_time>0 else 0.,
+        'steps_per_sec'        : counters['steps']/wall_time if wall_time>0 else 0.,
+        'in_flight'            : metrics.in_flight,
+        'totals'               : dict(metrics.totals),
+        'workers'              : workers,
+        'driver_rss_bytes'     : resident_memory(),
+        'children_rss_bytes'   : sum(resident_memory(p.pid) for p in multiprocessing.active_children()),
+        'uptime_seconds'       : time.time()-start_time,
+    }
+
+
+def prometheus(values):
+    '''
+    Returns:
+        text (str): values in Prometheus text exposition format
+    '''
+    lines = []
+    def metric(name, kind, help, value, labels=''):
+        if value == None:
+            return
+        if not any(l.startswith('# TYPE g4p_'+name+' ') for l in lines):
+            lines.append('# HELP g4p_{} {}'.format(name, help))
+            lines.append('# TYPE g4p_{} {}'.format(name, kind))
+        lines.append('g4p_{}{} {}'.format(name, labels, float(value)))
+
+    metric('generation', 'gauge', 'Last completed generation.', values['generation'])
+    metric('best_fitness', 'gauge', 'Best fitness of the last generation.', values['best_fitness'])
+    metric('mean_fitness', 'gauge', 'Mean fitness of the last generation.', values['mean_fitness'])
+    metric('evaluations_per_second', 'gauge', 'Evaluations per second of the last generation.', values['evaluations_per_sec'])
+    metric('steps_per_second', 'gauge', 'Environment steps per second of the last generation.', values['steps_per_sec'])
+    metric('evaluations_in_flight', 'gauge', 'Evaluations submitted and not collected yet.', values['in_flight'])
+    for name, value in sorted(values['totals'].items()):
+        metric(name+'_total', 'counter', 'Run total of '+name.replace('_', ' ')+'.', value)
+    for worker, w in sorted(values['workers'].items()):
+        metric('worker_utilization', 'gauge', 'Busy time of the worker over the last generation wall time.', w['utilization'], '{{worker="{}"}}'.format(worker))
+    for worker, w in sorted(values['workers'].items()):
+        metric('worker_steps_per_second', 'gauge', 'Environment steps per second of the worker while busy.', w['steps_per_sec'], '{{worker="{}"}}'.format(worker))
+    metric('driver_resident_memory_bytes', 'gauge', 'Resident memory of the driver.', values['driver_rss_bytes'])
+    metric('children_resident_memory_bytes', 'gauge', 'Resident memory of the local child processes.', values['children_rss_bytes'])
+    metric('uptime_seconds', 'gauge', 'Seconds since the endpoint started.', values['uptime_seconds'])
+    return '\n'.join(lines)+'\n'
+
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+
+class MetricsServer():
+    '''
+    Args:
+        metrics (Metrics.Metrics): metrics of the run (the same object passed to evolve)
+        port (int)
+        host (str): listening address (default local connections only)
+    '''
+    def __init__(self, metrics, port=9100, host='127.0.0.1'):
+        self.metrics = metrics
+        self.address = (host, port)
+        self.start_time = time.time()
+        self.server = None
+        self.thread = None
+
+    def start(self):
+        server = self
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                path = self.path.split('?')[0]
+                if path == '/metrics':
+                    body, content_type = prometheus(snapshot(server.metrics, server.start_time)), 'text/plain; version=0.0.4'
+                elif path == '/metrics.json':
+                    body, content_type = json.dumps(snapshot(server.metrics, server.start_time)), 'application/json'
+                else:
+                    self.send_error(404)
+                    return
+                body = body.encode()
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):    # do not mix access logs with evolution prints
+                pass
+
+        self.server = ThreadingHTTPServer(self.address, Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        print('Live metrics on http://{}:{}/metrics'.format(*self.server.server_address[:2]))
+        return self
+
+    def close(self):
+        if self.server!=None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
@@ -0,0 +1,238 @@
+'''
+This file define the NSGA-II multi-objective selection used by evolve() of g4p_solver.py.
+
+Each evaluated chromosome gets three objectives, all minimized:
+- the opposite of its mean episode reward
+- the variance of its episode rewards
+- the execution cost of its policy: 'conditions' (number of conditions of the program, i.e. the comparisons of the
+  longest path of a step) or 'measured' (nanoseconds of policy execution per step, see Bloat_Control.py).
+  The measured cost is wall-clock time, so selection then depends on the speed and load of the machine: a run with
+  cost='measured' is not reproducible from its seed
+Natural selection keeps max_elite chromosomes by non-dominated front and, in the last front that fits only in part,
+by crowding distance (instead of the survival threshold and the string similarity grouping of
+Population.do_natural_selection); parents are drawn by binary tournament on the crowded comparison (front, then
+crowding distance). Fitness sharing and the removal of the chromosomes at the max fitness of the stagnation phases
+are not used, crowding distance keeps the diversity.
+
+The non-dominated sort peels the fronts one at a time and stops as soon as enough chromosomes are ranked. Chromosomes
+are visited in lexicographic order of their objectives (only the preceding ones can dominate them), a chunk at a time:
+each chunk is compared, with numpy broadcasting, with itself and with the front found so far, so each front costs
+O(n x (front size + chunk_size)) comparisons instead of O(n^2).
+All the non-dominated chromosomes evaluated during the run are kept in a Pareto front archive, that can be written
+to a JSON file and queried for the cheapest policy that reaches the reward threshold; it is saved in the checkpoints
+of evolve() (see state), so that a resumed run keeps the policies found before the interruption.
+'''
+
+
+import numpy as np
+import json
+
+from Selection import Selector
+
+
+COSTS = ('conditions', 'measured')
+
+
+def dominated(F, candidates, chunk_size=128):
+    '''
+    Args:
+        F (np.array(float)): (n x m) objectives (minimized)
+        candidates (np.array(float)): (k x m) objectives
+        chunk_size (int): number of candidates compared at a time
+    Returns:
+        dominated (np.array(bool)): True for each candidate dominated by a row of F
+    '''
+    result = np.zeros(len(candidates), dtype=bool)
+    step = max(1, min(chunk_size, (1<<22)//max(1, len(F)*F.shape[1])))
+    for start in range(0, len(candidates), step):
+        C = candidates[None, start:start+step, :]
+        better_eq = np.all(F[:, None, :] <= C, axis=2)
+        better = np.any(F[:, None, :] < C, axis=2)
+        result[start:start+step] = np.any(better_eq & better, axis=0)
+    return result
+
+
+def first_front(F, idx, chunk_size=128):
+    '''
+    Args:
+        F (np.array(float)): (n x m) objectives (minimized)
+        idx (np.array(int)): rows of F, in lexicographic order of their objectives
+    Returns:
+        in_front (np.array(bool)): True for the rows of idx that are not dominated by another row of idx
+    '''
+    # a row can only be dominated by the rows that precede it in lexicographic order, and domination is transitive:
+    # each chunk is compared with the front found so far and with itself
+    in_front = np.zeros(len(idx), dtype=bool)
+    members = np.zeros((0, F.shape[1]))
+    for start in range(0, len(idx), chunk_size):
+        C = F[idx[start:start+chunk_size]]
+        non_dominated = ~(dominated(members, C, chunk_size) | dominated(C, C, chunk_size))
+        in_front[start:start+chunk_size] = non_dominated
+        members = np.concatenate([members, C[non_dominated]])
+    return in_front
+
+
+def non_dominated_sort(F, n_required=None, chunk_size=128):
+    '''
+    Args:
+        F (np.array(float)): (n x m) objectives (minimized)
+        n_required (int): stop once at least n_required rows are ranked (default all)
+    Returns:
+        fronts (np.array(int)): front of each row (0 is the non-dominated front, -1 for rows not ranked)
+    '''
+    F = np.asarray(F, dtype=float)
+    fronts = np.full(len(F), -1)
+    remaining = np.lexsort(F.T[::-1]) if len(F) else np.arange(0)
+    n_required = len(F) if n_required==None else n_required
+    front = 0
+    while len(remaining) > 0 and len(F)-len(remaining) < n_required:
+        in_front = first_front(F, remaining, chunk_size)
+        fronts[remaining[in_front]] = front
+        remaining = remaining[~in_front]
+        front += 1
+    return fronts
+
+
+def crowding_distance(F):
+    '''
+    Args:
+        F (np.array(float)): (n x m) objectives of the rows of a front
+    Returns:
+        distance (np.array(float)): crowding distance of each row (inf for the boundary rows of each objective)
+    '''
+    F = np.asarray(F, dtype=float)
+    n = len(F)
+    distance = np.zeros(n)
+    if n <= 2:
+        return np.full(n, np.inf)
+    for m in range(F.shape[1]):
+        order = np.argsort(F[:, m], kind='stable')
+        values = F[order, m]
+        distance[order[0]] = distance[order[-1]] = np.inf
+        span = values[-1]-values[0]
+        if span > 0:
+            distance[order[1:-1]] += (values[2:]-values[:-2])/span
+    return distance
+
+
+def nsga2_survivors(F, n, chunk_size=128):
+    '''
+    Returns:
+        survivors (np.array(int)): indexes of the n best rows, by front and then by crowding distance
+    '''
+    fronts = non_dominated_sort(F, n, chunk_size)
+    survivors = []
+    for front in range(fronts.max()+1):
+        members = np.flatnonzero(fronts==front)
+        if len(survivors)+len(members) <= n:
+            survivors.extend(members)
+        else:
+            distance = crowding_distance(F[members])
+            survivors.extend(members[np.argsort(-distance, kind='stable')[:n-len(survivors)]])
+            break
+    return np.array(survivors, dtype=int)
+
+
+
+class NSGA2():
+    '''
+    Args:
+        cost (str): execution cost objective, 'conditions' or 'measured' (see the module docstring).
+            Warning: 'measured' is the execution time measured on the workers, so selection depends on the speed and
+            load of the machine, and the run is not reproducible from its seed ('conditions' is deterministic)
+        chunk_size (int): candidates compared at a time by the non-dominated sort
+
+    Attributes:
+        front (list(dict)): Pareto front of all the chromosomes evaluated during the run
+            ({'solution', 'mean_reward', 'reward_variance', 'cost', 'generation'} for each one)
+    '''
+    def __init__(self, cost='conditions', chunk_size=128):
+        if cost not in COSTS:
+            raise ValueError('Unknown cost objective '+str(cost))
+        self.cost = cost
+        self.chunk_size = chunk_size
+        self.selector = Selector('tournament', k=2)
+        self.front = []
+
+    def policy_cost(self, chromosome):
+        if self.cost == 'conditions':
+            return float(chromosome.solution.count('if '))
+        return float(getattr(chromosome, 'step_cost', 0.))*1e9
+
+    def objectives(self, chromosomes):
+        ''' Returns: F (np.array(float)): (n x 3) objectives of the evaluated chromosomes (see evaluate) '''
+        return np.array([c.objectives for c in chromosomes], dtype=float).reshape(-1, 3)
+
+    #--------------------------------------#
+    def evaluate(self, population, generation):
+        '''
+        Set the objectives of the evaluated chromosomes (chromosome.objectives) and update the Pareto front archive.
+        Must be called after Population.remove_dead, when the scores are aligned with the chromosomes.
+
+        Returns:
+            n_front (int): number of chromosomes of the population on its non-dominated front
+        '''
+        scores = population.chromosomes_scores
+        variance = np.nanvar(scores.scores, axis=1) if len(scores) else np.zeros(0)
+        for chromosome, fitness, var in zip(population.chromosomes, population.chromosomes_fitness, variance):
+            chromosome.objectives = (-float(fitness), float(var), self.policy_cost(chromosome))
+        F = self.objectives(population.chromosomes)
+        current = np.flatnonzero(non_dominated_sort(F, 1, self.chunk_size)==0)
+        candidates = self.front + [{'solution': population.chromosomes[i].solution, 'mean_reward': -F[i, 0],
+                                    'reward_variance': F[i, 1], 'cost': F[i, 2], 'generation': generation} for i in current]
+        archive = np.array([(-c['mean_reward'], c['reward_variance'], c['cost']) for c in candidates]).reshape(-1, 3)
+        keep, solutions = [], set()
+        for i in np.flatnonzero(non_dominated_sort(archive, 1, self.chunk_size)==0):
+            if candidates[i]['solution'] not in solutions:      # the same program evaluated in several generations
+                solutions.add(candidates[i]['solution'])
+                keep.append(candidates[i])
+        self.front = keep
+        return len(current)
+
+    def select(self, population):
+        '''
+        Natural selection: keep the max_elite best chromosomes of the population, by front and crowding distance.
+        '''
+        survivors = nsga2_survivors(self.objectives(population.chromosomes), population.max_elite, self.chunk_size)
+        print("Survived [ ",len(survivors)," / ",len(population.chromosomes)," ] chromosomes (NSGA-II)")
+        population.chromosomes = [population.chromosomes[i] for i in survivors]
+        population.chromosomes_scores = population.chromosomes_scores.subset(survivors)
+        population.chromosomes_fitness = np.asarray(population.chromosomes_fitness)[survivors]
+
+    def pairs(self, chromosomes, n_pairs, rng):
+        '''
+        Returns:
+            pairs (np.array(int)): (n_pairs x 2) parents drawn by binary tournament on the crowded comparison
+        '''
+        F = self.objectives(chromosomes)
+        fronts = non_dominated_sort(F, chunk_size=self.chunk_size)
+        distance = np.zeros(len(F))
+        for front in range(fronts.max()+1):
+            members = np.flatnonzero(fronts==front)
+            distance[members] = crowding_distance(F[members])
+        # lexicographic comparison: lower front first, then larger crowding distance
+        return self.selector.pairs(-fronts, n_pairs, rng, sizes=-distance)
+
+    #--------------------------------------#
+    def state(self):
+        ''' Returns: state of the Pareto front archive, saved in the checkpoints of evolve() '''
+        return {'cost': self.cost, 'front': [dict(m) for m in self.front]}
+
+    def restore(self, state):
+        ''' Restore the Pareto front archive from a checkpoint state (see state). '''
+        self.__init__(state['cost'], self.chunk_size)
+        self.front = [dict(m) for m in state['front']]
+
+    def cheapest(self, reward_threshold):
+        '''
+        Returns:
+            member (dict): cheapest policy of the Pareto front whose mean reward reaches reward_threshold (None if no one does)
+        '''
+        reaching = [m for m in self.front if m['mean_reward'] >= reward_threshold]
+        return min(reaching, key=lambda m: (m['cost'], -m['mean_reward'])) if reaching else None
+
+    def write(self, path):
+        ''' Write the Pareto front archive to a JSON file (members sorted by cost). '''
+        with open(path, 'w') as f:
+            json.dump(sorted(self.front, key=lambda m: (m['cost'], -m['mean_reward'])), f, indent=2)
+        print('Pareto front of', len(self.front), 'policies written to', path)
@@ -0,0 +1,161 @@
+'''
+This file define the opt-in profiling mode of evolve() of g4p_solver.py.
+
+A sample of the evaluations is run under cProfile (and optionally tracemalloc) inside the evaluation workers:
+the profile statistics travel back to the driver with the evaluation result, where the Profiler merges them,
+together with a cProfile of the driver itself, into per-generation files of its output directory:
+- gen-<generation>.workers.pstats / .collapsed:  merged profiles of the sampled evaluations
+- gen-<generation>.driver.pstats / .collapsed:   profile of the driver during the generation
+- gen-<generation>.memory.txt:                   top allocation sites of the sampled evaluations (memory mode only)
+
+.pstats files can be read with pstats or snakeviz, .collapsed files with flamegraph.pl or speedscope.
+cProfile only records the direct callers of each function, so collapsed stacks are caller;callee pairs.
+Programs executed by Chromosome.execute_solution appear as <string>:<line>(get_action).
+'''
+
+
+import cProfile
+import pstats
+import random
+import time
+import os
+
+
+def profiled_call(function, args, memory=False, top=25):
+    '''
+    Run function(*args) under cProfile (and tracemalloc if memory) and attach the statistics to its result dict.
+
+    Returns:
+        result (dict): the result of function, with 'profile' (pstats dict) and 'memory' ([(site, bytes, count)]) keys
+    '''
+    if memory:
+        import tracemalloc
+        tracemalloc.start()
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        result = function(*args)
+    finally:
+        profiler.disable()
+        if memory:
+            snapshot = tracemalloc.take_snapshot()
+            tracemalloc.stop()
+    if result == None:
+        return result
+    profiler.create_stats()
+    result['profile'] = profiler.stats
+    if memory:
+        result['memory'] = [(str(s.traceback), s.size, s.count) for s in snapshot.statistics('lineno')[:top]]
+    return result
+
+
+class StatsHolder():
+    ''' Raw pstats dict in the form accepted by pstats.Stats (a profiler whose stats have already been created). '''
+    def __init__(self, stats):
+        self.stats = stats
+
+    def create_stats(self):
+        pass
+
+
+def function_label(function):
+    filename, line, name = function
+    if filename == '~':
+        return name
+    return '{}:{}({})'.format(os.path.basename(filename), line, name)
+
+
+def write_collapsed(stats, path):
+    '''
+    Write caller;callee collapsed stacks of pstats.Stats stats, weighted by own time (microseconds).
+    '''
+    with open(path, 'w') as f:
+        for function, (cc, nc, tt, ct, callers) in stats.stats.items():
+            label = function_label(function)
+            if not callers:
+                if tt > 0:
+                    f.write('{} {}\n'.format(label, int(tt*1e6)))
+                continue
+            for caller, caller_stats in callers.items():
+                caller_tt = caller_stats[2] if isinstance(caller_stats, tuple) else tt/len(callers)
+                if caller_tt > 0:
+                    f.write('{};{} {}\n'.format(function_label(caller), label, int(caller_tt*1e6)))
+
+
+
+class Profiler():
+    '''
+    Args:
+        sample (float): fraction of the evaluations that are profiled
+        memory (bool): also take tracemalloc snapshots of the profiled evaluations
+        output_dir (str): directory of the profile files
+        driver (bool): also profile the driver
+        seed (int): seed of the sampling (independent from the evolution random streams)
+    '''
+    def __init__(self, sample=0.05, memory=False, output_dir='./outputs/profiles', driver=True, seed=0):
+        self.sample = sample
+        self.memory = memory
+        self.output_dir = output_dir
+        self.driver = driver
+        self.rng = random.Random(seed)
+        os.makedirs(output_dir, exist_ok=True)
+        self.reset()
+
+    def reset(self):
+        self.workers = None
+        self.allocations = {}
+        self.n_profiled = 0
+        self.driver_profile = None
+
+    def evaluation_mode(self):
+        '''
+        Returns:
+            profile (str): profiling mode of the next evaluation (None, 'cpu' or 'memory', see Environment.evaluate_chromosome)
+        '''
+        if self.rng.random() >= self.sample:
+            return None
+        return 'memory' if self.memory else 'cpu'
+
+    def add(self, result):
+        '''
+        Merge (and remove) the profile statistics carried by an evaluation result.
+        '''
+        if result == None or 'profile' not in result:
+            return
+        holder = StatsHolder(result.pop('profile'))
+        if self.workers == None:
+            self.workers = pstats.Stats(holder)
+        else:
+            self.workers.add(holder)
+        self.n_profiled += 1
+        for site, size, count in result.pop('memory', []):
+            total = self.allocations.setdefault(site, [0, 0])
+            total[0] += size
+            total[1] += count
+
+    def begin(self):
+        ''' Start the driver profile of a generation. '''
+        if self.driver:
+            self.driver_profile = cProfile.Profile()
+            self.driver_profile.enable()
+
+    def dump(self, generation):
+        '''
+        Write the profile files of the generation and start collecting the next one.
+        '''
+        prefix = os.path.join(self.output_dir, 'gen-{}'.format(generation))
+        if self.driver_profile != None:
+            self.driver_profile.disable()
+            driver = pstats.Stats(self.driver_profile)
+            driver.dump_stats(prefix+'.driver.pstats')
+            write_collapsed(driver, prefix+'.driver.collapsed')
+        if self.workers != None:
+            self.workers.dump_stats(prefix+'.workers.pstats')
+            write_collapsed(self.workers, prefix+'.workers.collapsed')
+        if self.allocations:
+            with open(prefix+'.memory.txt', 'w') as f:
+                f.write('# {} profiled evaluations, {}\n'.format(self.n_profiled, time.strftime('%Y-%m-%d %H:%M:%S')))
+                for site, (size, count) in sorted(self.allocations.items(), key=lambda a: -a[1][0]):
+                    f.write('{:>12} B {:>8} blocks  {}\n'.format(size, count, site))
+        print('Profiled', self.n_profiled, 'evaluations of generation', generation, 'in', prefix+'.*')
+        self.reset()
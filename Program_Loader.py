@@ -0,0 +1,247 @@
+'''
+This file define the loader of evolved programs: it parses the get_action programs written by
+Chromosome.generate_solution (e.g. the <environment>/GEN-*/*.py files) back into chromosomes, so that a new run of
+evolve() of g4p_solver.py can start from them (see its seed_population argument).
+
+A program is parsed with the ast module and rebuilt as the phenotype tree that the Grammar (Grammatical_Evolution_mapper.py)
+derives for it: if and if/else statements, sequences of statements (split as first statement / the rest) and
+action assignments, with the same node names, labels, codes and indents. It is validated against the grammar and
+against the target environment: only grammar statements, observation[i] <= all_obs[i][j] (or >) conditions with the
+same observation index on both sides, observation indexes within the observations of the environment, split points
+within its bins and actions within its action space. The chromosome also gets the genotype whose genes select the
+rules (0-3) and terminals of its tree, in the order in which the Parser reads them (the Parser derives the same
+tree from it, unless an action is the direct child of a sequence, that grow and full derivations never choose).
+
+usage (validate the programs of a directory for an environment):
+    python Program_Loader.py CartPole-v0 --env CartPole-v0 --bins 7 4 7 6
+'''
+
+
+import argparse
+import glob
+import ast
+import os
+
+from anytree import Node
+
+from Chromosome import Chromosome
+
+
+class ProgramError(ValueError):
+    ''' The program is not a get_action program of the grammar, or it does not fit the environment. '''
+
+
+def _literal(node):
+    if type(node).__name__ == 'Index':     # python < 3.9 wraps subscripts in ast.Index
+        node = node.value
+    value = ast.literal_eval(node)
+    if not isinstance(value, int):
+        raise ProgramError('non integer index: '+ast.dump(node))
+    return value
+
+
+
+class ProgramParser():
+    '''
+    Build the phenotype tree of a program, mirroring the node construction of Grammatical_Evolution_mapper.Parser.
+
+    Args:
+        environment (Genetic_Gym.Environment): target environment (its all_obs, bins and actions)
+    '''
+    def __init__(self, environment):
+        self.n_obs = len(environment.all_obs)
+        self.bins = environment.bins
+        self.actions = [int(a) for a in environment.actions]
+
+    def parse(self, solution):
+        '''
+        Returns:
+            phenotype (AnyTree.Node): root of the derivation tree of the program
+            genotype (list(int)): genes read by the Parser to derive it
+        '''
+        try:
+            module = ast.parse(solution)
+        except SyntaxError as e:
+            raise ProgramError('syntax error: '+str(e)) from e
+        if len(module.body)!=1 or not isinstance(module.body[0], ast.FunctionDef) or module.body[0].name!='get_action':
+            raise ProgramError('the program does not define only get_action')
+        body = list(module.body[0].body)
+        if not (body and isinstance(body[-1], ast.Return) and getattr(body[-1].value, 'id', None)=='action'):
+            raise ProgramError('get_action does not end with return action')
+        body = body[:-1]
+        if not body:
+            raise ProgramError('get_action has no statements')
+        self.i_gene = -1
+        self.genotype = []
+        root = Node('('+str(0)+')expr-start', label='expr', code='')
+        self.expr(body, root, 1)
+        return root, self.genotype
+
+    def gene(self, value):
+        self.i_gene += 1
+        self.genotype.append(value)
+        return self.i_gene
+
+    #-----------RULES-----------------#
+    def expr(self, statements, node, indent):
+        if len(statements) > 1:                                                                     # <expr> <expr>
+            i_gene = self.gene(2)
+            child1 = Node('('+str(i_gene)+')expr_a'+'_id_'+str(id(node)), parent=node, label='expr', code="", indent=indent)
+            self.expr(statements[:1], child1, indent)
+            child2 = Node('('+str(i_gene)+')expr_b'+'_id_'+str(id(node)), parent=node, label='expr', code="\n{tab1}".format(tab1='\t'*(indent)), indent=indent)
+            self.expr(statements[1:], child2, indent)
+            return
+        statement = statements[0]
+        if isinstance(statement, ast.If):
+            i_gene = self.gene(1 if statement.orelse else 0)
+            child1 = Node('('+str(i_gene)+')cond'+'_id_'+str(id(node)), parent=node, label='cond', code="if ")
+            self.cond(statement.test, child1)
+            child2 = Node('('+str(i_gene)+')expr_i'+'_id_'+str(id(node)), parent=node, label='expr', code=":\n{tab1}".format(tab1='\t'*(indent+1)), indent=indent+1)
+            self.expr(statement.body, child2, indent+1)
+            if statement.orelse:
+                child3 = Node('('+str(i_gene)+')expr_e'+'_id_'+str(id(node)), parent=node, label='expr', code="\n{tab2}else:\n{tab3}".format(tab2='\t'*(indent), tab3='\t'*(indent+1)), indent=indent+1)
+                self.expr(statement.orelse, child3, indent+1)
+        elif isinstance(statement, ast.Assign) and len(statement.targets)==1 and getattr(statement.targets[0], 'id', None)=='action':
+            i_gene = self.gene(3)
+            child = Node('('+str(i_gene)+')ACTION'+'_id_'+str(id(node)), parent=node, label='ACT', code="action = ")
+            self.ACTION(statement.value, child)
+        else:
+            raise ProgramError('statement not generated by the grammar: '+ast.dump(statement))
+
+    def cond(self, test, node):
+        if not (isinstance(test, ast.Compare) and len(test.ops)==1 and isinstance(test.ops[0], (ast.LtE, ast.Gt))):
+            raise ProgramError('condition not generated by the grammar: '+ast.dump(test))
+        try:
+            left, right = test.left, test.comparators[0]
+            if left.value.id != 'observation' or right.value.value.id != 'all_obs':
+                raise ProgramError('condition not generated by the grammar: '+ast.dump(test))
+            n_obs, state_obs, split_point = _literal(left.slice), _literal(right.value.slice), _literal(right.slice)
+        except (AttributeError, ValueError) as e:
+            raise ProgramError('condition not generated by the grammar: '+ast.dump(test)) from e
+        if n_obs != state_obs:
+            raise ProgramError('condition compares observation[{}] with the split points of observation {}'.format(n_obs, state_obs))
+        if not 0 <= n_obs < self.n_obs:
+            raise ProgramError('observation {} out of the {} observations of the environment'.format(n_obs, self.n_obs))
+        if not 0 <= split_point < self.bins[n_obs]:
+            raise ProgramError('split point {} out of the {} bins of observation {}'.format(split_point, self.bins[n_obs], n_obs))
+        i_gene = self.i_gene
+        child1 = Node('('+str(i_gene)+')N_OBS_obser'+'_id_'+str(id(node)), parent=node, label='N_OBS', code="observation[")
+        self.gene(n_obs)
+        Node('('+str(self.i_gene)+')idx'+'_id_'+str(id(child1)), parent=child1, label=str(n_obs), code=str(n_obs))
+        child2 = Node('('+str(i_gene)+')COMP'+'_id_'+str(id(node)), parent=node, label='COMP', code='] ')
+        if isinstance(test.ops[0], ast.LtE):
+            self.gene(0)
+            Node('('+str(self.i_gene)+')less'+'_id_'+str(id(child2)), parent=child2, label='<= ', code="<=")
+        else:
+            self.gene(1)
+            Node('('+str(self.i_gene)+')great'+'_id_'+str(id(child2)), parent=child2, label='> ', code=">")
+        child3 = Node('('+str(i_gene)+')N_OBS_state'+'_id_'+str(id(node)), parent=node, label='N_OBS', code=' all_obs[')
+        Node('('+str(self.i_gene)+')idx'+'_id_'+str(id(child3)), parent=child3, label=str(n_obs), code=str(n_obs))
+        child4 = Node('('+str(i_gene)+')SPT_PT'+'_id_'+str(id(node)), parent=node, label='SPLT_PT', code='][')
+        self.gene(split_point)
+        Node('('+str(self.i_gene)+')splt'+'_id_'+str(id(child4)), parent=child4, label=str(split_point), code=str(split_point)+"]")
+
+    def ACTION(self, value, node):
+        try:
+            action = _literal(value)
+        except ValueError as e:
+            raise ProgramError('action is not an integer: '+ast.dump(value)) from e
+        if action not in self.actions:
+            raise ProgramError('action {} out of the actions {} of the environment'.format(action, self.actions))
+        self.gene(action)
+        Node('('+str(self.i_gene)+')act'+'_id_'+str(id(node)), parent=node, label=str(action), code=str(action)+"\n")
+
+
+
+def load_program(solution, environment, i=0):
+    '''
+    Args:
+        solution (str): get_action program
+        environment (Genetic_Gym.Environment): target environment
+        i (int): chromosome index
+    Returns:
+        chromosome (Chromosome): chromosome with the genotype, phenotype and (regenerated) solution of the program
+    Raises:
+        ProgramError: if the program is not valid for the grammar and the environment
+    '''
+    phenotype, genotype = ProgramParser(environment).parse(solution)
+    chromosome = Chromosome.from_solution(None, i)
+    chromosome.genotype = genotype
+    chromosome.phenotype = phenotype
+    chromosome.generate_solution()
+    if ast.dump(ast.parse(chromosome.solution)) != ast.dump(ast.parse(solution)):
+        raise ProgramError('the rebuilt tree does not generate the same program')
+    return chromosome
+
+
+def load_directory(directory, environment, limit=None):
+    '''
+    Load the valid programs of a directory (and of its GEN-* subdirectories); invalid ones are reported and skipped.
+
+    Args:
+        directory (str)
+        environment (Genetic_Gym.Environment): target environment
+        limit (int): maximum number of programs (the ones of the latest generations first)
+    Returns:
+        chromosomes (list(Chromosome))
+    '''
+    def generation(path):
+        parent = os.path.basename(os.path.dirname(path))
+        return int(parent.split('GEN-')[1]) if parent.startswith('GEN-') and parent[4:].lstrip('-').isdigit() else -1
+    paths = sorted(glob.glob(os.path.join(directory, '*.py')) + glob.glob(os.path.join(directory, 'GEN-*', '*.py')),
+                   key=lambda p: (-generation(p), p))
+    chromosomes, solutions = [], set()
+    for path in paths:
+        if limit!=None and len(chromosomes) >= limit:
+            break
+        with open(path) as f:
+            source = f.read()
+        try:
+            chromosome = load_program(source, environment, len(chromosomes))
+        except ProgramError as e:
+            print('Skipping', path, ':', e)
+            continue
+        if chromosome.solution not in solutions:
+            solutions.add(chromosome.solution)
+            chromosomes.append(chromosome)
+    return chromosomes
+
+
+def load_history(history_dir, environment, limit=None):
+    '''
+    Load the best individuals of a previous run from its History (see Generation_History.py), best fitness first.
+
+    Args:
+        history_dir (str): directory of the run History
+        environment (Genetic_Gym.Environment): target environment (the programs are validated again)
+        limit (int): maximum number of programs
+    Returns:
+        chromosomes (list(Chromosome))
+    '''
+    from Generation_History import History
+    records = sorted(History.load(history_dir), key=lambda record: -record.max_fitness)
+    chromosomes, solutions = [], set()
+    for record in records:
+        if limit!=None and len(chromosomes) >= limit:
+            break
+        solution = record.best_individual.solution
+        if solution==None or solution in solutions:
+            continue
+        try:
+            chromosomes.append(load_program(solution, environment, len(chromosomes)))
+            solutions.add(solution)
+        except ProgramError as e:
+            print('Skipping the best individual of generation', record.generation, ':', e)
+    return chromosomes
+
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Validate the get_action programs of a directory for an environment')
+    parser.add_argument('directory', help='directory of the programs (and of GEN-* subdirectories)')
+    parser.add_argument('--env', required=True, help='gym environment id')
+    parser.add_argument('--bins', type=int, nargs='+', required=True, help='bins of each observation')
+    args = parser.parse_args()
+    from Genetic_Gym import Environment
+    chromosomes = load_directory(args.directory, Environment(args.env, n_episodes=1, bins=tuple(args.bins)))
+    print(len(chromosomes), 'valid programs')
@@ -0,0 +1,191 @@
+'''
+This file define the lineage tracking of the chromosomes: provenance records, the Genealogy of a run and the
+reconstruction of the phenotype tree colors used by Chromosome.tree_to_png and Artifact_Writer.py.
+
+When Population.provenance is True, the variation operators attach to each offspring a compact provenance record
+    chromosome.provenance = (uid, parents, events)
+- uid (int): identifier of the chromosome in the Genealogy (None until the chromosome is registered)
+- parents (tuple(int)): uids of its parents (the first one is the parent whose tree is the base of the offspring)
+- events (tuple((str, str))): (operator, name of the root node of the affected subtree) of each variation applied to
+  the offspring, in order: 'crossover' (subtree received from the second parent), 'mutation' (re-derived subtree)
+  and 'leaf' (terminal changed by leaves only mutation)
+With Population.provenance False (the default) the operators do no lineage work at all.
+
+The Genealogy keeps the record (generation, parents, events, fitness) of every registered chromosome, and can be
+queried after the run (ancestors, children, lineage) or saved to a JSON file.
+Tree colors are reconstructed only when a tree is exported, replaying the events of the lineage of a chromosome
+(following the first parents) on its tree: nodes never touched are grey, subtrees received by crossover are blue
+and mutated subtrees are orange, darker each time they are changed again.
+'''
+
+
+import json
+
+from anytree import PreOrderIter
+
+
+GREY, BLUE, ORANGE = '/greys9/', '/blues9/', '/oranges9/'
+
+
+#-----------VARIATION OPERATORS-----------#
+def uid(chromosome):
+    record = getattr(chromosome, 'provenance', None)
+    return record[0] if record!=None else None
+
+
+def offspring(chromosome, parents):
+    '''
+    Start a new provenance record for an offspring of parents (list(Chromosome), the base parent first).
+    '''
+    chromosome.provenance = (None, tuple(uid(p) for p in parents if uid(p)!=None), ())
+
+
+def add_event(chromosome, operator, node):
+    '''
+    Add a variation event to the provenance record of a chromosome. A registered chromosome changed in place
+    (e.g. a mutated elite) becomes a new offspring of its previous version.
+    '''
+    record = getattr(chromosome, 'provenance', None)
+    if record==None or record[0]!=None:
+        offspring(chromosome, [chromosome])
+        record = chromosome.provenance
+    chromosome.provenance = (None, record[1], record[2]+((operator, node.name),))
+
+
+#-----------EXPORT-----------#
+def node_colors(phenotype, events):
+    '''
+    Args:
+        phenotype (AnyTree.Node): root of the tree
+        events (list((str, str))): variation events of the lineage of the chromosome, oldest first (see Genealogy.lineage)
+    Returns:
+        colors (dict): id(node): (fill color, border color) of each node of the tree
+    '''
+    colors = dict((id(node), (GREY+'1', GREY+'9')) for node in PreOrderIter(phenotype))
+    nodes = {}
+    for node in PreOrderIter(phenotype):
+        nodes.setdefault(node.name, node)
+    for operator, name in events:
+        node = nodes.get(name)
+        if node==None:          # the subtree has been replaced afterwards
+            continue
+        if operator == 'crossover':
+            root_color = colors[id(node)][0]
+            for child in PreOrderIter(node):
+                color = colors[id(child)][0]
+                if root_color.startswith(ORANGE) or color.startswith(ORANGE):
+                    colors[id(child)] = (BLUE+'2', ORANGE+'9')
+                else:
+                    colors[id(child)] = (BLUE+str(shade(color)), BLUE+'9')
+        else:
+            color = colors[id(node)][0]
+            mutated = (ORANGE+'2', BLUE+'9') if color.startswith(BLUE) else (ORANGE+str(shade(color)), ORANGE+'9')
+            for child in (PreOrderIter(node) if operator=='mutation' else [node]):
+                colors[id(child)] = mutated
+    return colors
+
+
+def shade(color):
+    ''' Returns: next (darker) shade of a color of the same scheme, from 2 to 9 and back to 2 '''
+    n = int(color.rsplit('/', 1)[1])
+    return n+1 if n<9 else 2
+
+
+def dot_attributes(phenotype, events=()):
+    '''
+    Returns:
+        nodeattrfunc, edgeattrfunc: attribute functions of anytree.exporter.DotExporter that color the tree by provenance
+    '''
+    colors = node_colors(phenotype, events)
+    nodeattrfunc = lambda node: 'label="{}", style=filled, color="{}", fillcolor="{}"'.format(node.label, colors[id(node)][1], colors[id(node)][0])
+    edgeattrfunc = lambda node, child: 'color="{}"'.format(colors[id(node)][1])
+    return nodeattrfunc, edgeattrfunc
+
+
+
+class Genealogy():
+    '''
+    Records of all the chromosomes registered during a run.
+
+    Attributes:
+        records (dict): uid: {'generation', 'parents', 'events', 'fitness'}
+    '''
+    def __init__(self, records=None):
+        self.restore(records if records!=None else {})
+
+    def register(self, chromosomes, generation, fitness=None):
+        '''
+        Give a uid to the chromosomes that have not been registered yet, and store their records.
+
+        Args:
+            chromosomes (list(Chromosome))
+            generation (int)
+            fitness (list(float)): optional fitness of the chromosomes (also set for already registered ones without it)
+        '''
+        for i, chromosome in enumerate(chromosomes):
+            record = getattr(chromosome, 'provenance', None)
+            if record==None:
+                record = (None, (), ())
+            if record[0]==None or record[0] not in self.records:     # new, or registered by another run (e.g. an immigrant)
+                chromosome.provenance = (self.next_uid,)+tuple(record[1:])
+                self.records[self.next_uid] = {'generation': generation, 'parents': list(record[1]),
+                                               'events': [list(e) for e in record[2]], 'fitness': None}
+                self.next_uid += 1
+            if fitness is not None and self.records[chromosome.provenance[0]]['fitness']==None:
+                self.records[chromosome.provenance[0]]['fitness'] = float(fitness[i])
+
+    def restore(self, records):
+        ''' Restore the records saved in a checkpoint (see evolve() of g4p_solver.py). '''
+        self.records = dict(records)
+        self.next_uid = max(self.records)+1 if self.records else 0
+
+    def __len__(self):
+        return len(self.records)
+
+    def parents(self, uid):
+        return self.records[uid]['parents']
+
+    def children(self, uid):
+        ''' Returns: uids of the chromosomes that have uid as a parent '''
+        return [u for u, record in self.records.items() if uid in record['parents']]
+
+    def ancestors(self, uid):
+        '''
+        Returns:
+            ancestors (list(int)): uids of all the ancestors of uid (breadth first)
+        '''
+        ancestors, frontier, seen = [], list(self.parents(uid)), set()
+        while frontier:
+            u = frontier.pop(0)
+            if u in seen or u not in self.records:
+                continue
+            seen.add(u)
+            ancestors.append(u)
+            frontier += self.parents(u)
+        return ancestors
+
+    def lineage(self, uid):
+        '''
+        Returns:
+            events (list((str, str))): variation events of uid and of its first parents, oldest first
+        '''
+        events, seen = [], set()
+        while uid!=None and uid in self.records and uid not in seen:
+            seen.add(uid)
+            events = [tuple(e) for e in self.records[uid]['events']] + events
+            parents = self.parents(uid)
+            uid = parents[0] if parents else None
+        return events
+
+    def events_of(self, chromosome):
+        ''' Returns: lineage events of a registered chromosome ([] if it is not registered) '''
+        return self.lineage(uid(chromosome)) if uid(chromosome)!=None else []
+
+    def save(self, path):
+        with open(path, 'w') as f:
+            json.dump(dict((str(u), record) for u, record in self.records.items()), f)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            return cls(dict((int(u), record) for u, record in json.load(f).items()))
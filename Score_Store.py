@@ -0,0 +1,140 @@
+'''
+This file define the ScoreMatrix: the population-level store of the episodes scores of all chromosomes.
+
+Scores are kept in a preallocated (n_chromosomes x max_episodes) float array, indexed by chromosome slot,
+together with the number of episodes played by each chromosome (evaluations may stop early), a validity mask
+(False for chromosomes not evaluated yet or died during evaluation), the episodes lengths, the evaluation wall time,
+the policy execution time per step and the behavior statistics of the episodes.
+The same ScoreMatrix is shared by evaluation, selection, fitness sharing and plotting, so fitness aggregations
+are vectorized and safe with respect to a different number of episodes per chromosome.
+'''
+
+
+import numpy as np
+
+
+class ScoreMatrix():
+    '''
+    Args:
+        n_chromosomes (int): number of chromosome slots
+        max_episodes (int): maximum number of episodes of a chromosome evaluation
+
+    Attributes:
+        scores (np.array(float)): (n_chromosomes x max_episodes) episodes rewards, NaN for episodes not played
+        n_episodes (np.array(int)): number of episodes played by each chromosome
+        valid (np.array(bool)): True for chromosomes that have been evaluated
+        episode_lengths (np.array(int)): (n_chromosomes x max_episodes) number of timesteps of each episode
+        wall_time (np.array(float)): evaluation time (seconds) of each chromosome
+        step_cost (np.array(float)): policy execution time per step (seconds) of each chromosome
+        behavior (np.array(object)): behavior statistics of the episodes of each chromosome (dict, None if unknown)
+    '''
+    def __init__(self, n_chromosomes, max_episodes):
+        self.scores = np.full((n_chromosomes, max_episodes), np.nan)
+        self.n_episodes = np.zeros(n_chromosomes, dtype=int)
+        self.valid = np.zeros(n_chromosomes, dtype=bool)
+        self.episode_lengths = np.zeros((n_chromosomes, max_episodes), dtype=np.int32)
+        self.wall_time = np.zeros(n_chromosomes)
+        self.step_cost = np.zeros(n_chromosomes)
+        self.behavior = np.full(n_chromosomes, None, dtype=object)
+
+    @classmethod
+    def from_padded(cls, scores):
+        '''
+        Build a ScoreMatrix from a (n_chromosomes x max_episodes) array padded with NaN (e.g. from Generation_History).
+        '''
+        store = cls(0, 0)
+        store.scores = scores
+        store.n_episodes = np.sum(~np.isnan(scores), axis=1) if scores.size else np.zeros(len(scores), dtype=int)
+        store.valid = store.n_episodes > 0
+        store.episode_lengths = np.zeros(scores.shape, dtype=np.int32)
+        store.wall_time = np.zeros(len(scores))
+        store.step_cost = np.zeros(len(scores))
+        store.behavior = np.full(len(scores), None, dtype=object)
+        return store
+
+    def set(self, slot, result):
+        '''
+        Store the evaluation result of a chromosome (see Genetic_Gym.Environment.evaluate_chromosome).
+
+        Args:
+            slot (int): chromosome slot
+            result (dict): {'scores': list(float), 'lengths': list(int), 'wall_time': float, 'policy_time': float, 'behavior': dict},
+                None if the chromosome died
+        '''
+        self.scores[slot] = np.nan
+        self.episode_lengths[slot] = 0
+        if result == None:
+            self.n_episodes[slot] = 0
+            self.valid[slot] = False
+            self.wall_time[slot] = 0.
+            self.step_cost[slot] = 0.
+            self.behavior[slot] = None
+            return
+        n = len(result['scores'])
+        self.scores[slot, :n] = result['scores']
+        self.episode_lengths[slot, :n] = result['lengths']
+        self.n_episodes[slot] = n
+        self.valid[slot] = True
+        self.wall_time[slot] = result['wall_time']
+        self.step_cost[slot] = result.get('policy_time', 0.) / max(1, sum(result['lengths']))
+        self.behavior[slot] = result.get('behavior')
+
+    def fitness(self):
+        '''
+        Returns:
+            fitness (np.array(float)): mean score over the played episodes of each chromosome (NaN if not valid)
+        '''
+        total = np.nansum(self.scores, axis=1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            fitness = total / self.n_episodes
+        fitness[~self.valid] = np.nan
+        return fitness
+
+    def subset(self, idx):
+        '''
+        Returns:
+            ScoreMatrix with only the rows (chromosome slots) idx, in that order
+        '''
+        idx = np.asarray(idx, dtype=int)
+        store = ScoreMatrix(0, 0)
+        store.scores = self.scores[idx]
+        store.n_episodes = self.n_episodes[idx]
+        store.valid = self.valid[idx]
+        store.episode_lengths = self.episode_lengths[idx]
+        store.wall_time = self.wall_time[idx]
+        store.step_cost = self.step_cost[idx]
+        store.behavior = self.behavior[idx]
+        return store
+
+    def concatenate(self, other):
+        '''
+        Returns:
+            ScoreMatrix with the rows of self followed by the rows of other
+        '''
+        width = max(self.scores.shape[1], other.scores.shape[1])
+        def pad(a, value):
+            return np.pad(a, ((0,0),(0,width-a.shape[1])), constant_values=value)
+        store = ScoreMatrix(0, 0)
+        store.scores = np.concatenate([pad(self.scores, np.nan), pad(other.scores, np.nan)])
+        store.n_episodes = np.concatenate([self.n_episodes, other.n_episodes])
+        store.valid = np.concatenate([self.valid, other.valid])
+        store.episode_lengths = np.concatenate([pad(self.episode_lengths, 0), pad(other.episode_lengths, 0)])
+        store.wall_time = np.concatenate([self.wall_time, other.wall_time])
+        store.step_cost = np.concatenate([self.step_cost, other.step_cost])
+        store.behavior = np.concatenate([self.behavior, other.behavior])
+        return store
+
+    @property
+    def max_episodes(self):
+        return self.scores.shape[1]
+
+    def __len__(self):
+        return len(self.scores)
+
+    def __getitem__(self, slot):
+        ''' Returns: the scores of the episodes played by the chromosome in slot '''
+        return self.scores[slot, :self.n_episodes[slot]]
+
+    def __iter__(self):
+        for slot in range(len(self)):
+            yield self[slot]
@@ -0,0 +1,170 @@
+'''
+This file define the parent selection operators used by evolve() and evolve_steady_state() of g4p_solver.py.
+
+All the parent pairs of a generation are drawn with a single vectorized call and returned as an (n_pairs x 2)
+array of chromosome indexes (the two parents of a pair are always different chromosomes), so that selection
+costs a few milliseconds also with populations of tens of thousands of chromosomes.
+Random numbers come from a NumPy Generator: each generation uses its own substream of the run seed
+(see Selector.generator), so the selected parents do not depend on how many numbers were drawn before.
+
+Selection methods:
+- roulette:   fitness proportional, with fitnesses raised to the x-th power (see roulette_probabilities)
+- rank:       proportional to the rank of the fitness (the worst chromosome has rank 1)
+- tournament: each parent is the fittest of k chromosomes drawn uniformly
+- truncation: parents are drawn uniformly among the best fraction of the population
+With lexicographic parsimony pressure (sizes given to Selector.pairs), rank, tournament and truncation selection
+compare chromosomes by fitness and, for equal fitness, prefer the smaller one (see Bloat_Control.py);
+roulette selection is proportional to the fitness values and is not affected.
+'''
+
+
+import numpy as np
+
+from Bloat_Control import lexicographic_rank
+
+
+METHODS = ('roulette', 'rank', 'tournament', 'truncation')
+
+
+def roulette_probabilities(fitness, x=3):
+    '''
+    Fitness proportional selection probabilities, with fitnesses raised to the x-th power.
+    Negative fitnesses are shifted to be positive before being raised.
+
+    Args:
+        fitness (np.array(float))
+        x (int): selection pressure exponent
+    Returns:
+        probs (np.array(float)): one probability for each chromosome
+    '''
+    fitness = np.asarray(fitness, dtype=float)
+    if len(fitness)>0 and np.min(fitness) < 0:
+        fitness = fitness - np.min(fitness) + 1
+    weights = np.power(fitness, x)
+    total = np.sum(weights)
+    if not np.isfinite(total) or total <= 0:
+        return np.full(len(fitness), 1./len(fitness))
+    return weights / total
+
+
+def rank_probabilities(fitness):
+    '''
+    Linear ranking selection probabilities (ties are ranked in order of index).
+    '''
+    fitness = np.asarray(fitness, dtype=float)
+    ranks = np.empty(len(fitness))
+    ranks[np.argsort(fitness, kind='stable')] = np.arange(1, len(fitness)+1)
+    return ranks / np.sum(ranks)
+
+
+def draw_pairs(probs, n_pairs, rng):
+    '''
+    Draw n_pairs pairs of different indexes, with the same distribution of
+    rng.choice(len(probs), 2, replace=False, p=probs) repeated n_pairs times.
+
+    Args:
+        probs (np.array(float)): selection probability of each chromosome
+        n_pairs (int)
+        rng (np.random.Generator)
+    Returns:
+        pairs (np.array(int)): (n_pairs x 2) indexes
+    '''
+    probs = np.asarray(probs, dtype=float)
+    n = len(probs)
+    cdf = np.cumsum(probs)
+    cdf /= cdf[-1]
+    first = np.minimum(np.searchsorted(cdf, rng.random(n_pairs), side='right'), n-1)
+    # second parent: draw from the cdf without the mass of the first one, then skip over it
+    p_first = probs[first] / np.sum(probs)
+    start_first = cdf[first] - p_first
+    u = rng.random(n_pairs) * (1 - p_first)
+    u = np.where(u < start_first, u, u + p_first)
+    second = np.minimum(np.searchsorted(cdf, u, side='right'), n-1)
+    clash = second == first         # first has (almost) all the probability mass: take the second uniformly
+    if np.any(clash):
+        second[clash] = other_indexes(first[clash], n, rng)
+    return np.stack([first, second], axis=1)
+
+
+def other_indexes(idx, n, rng):
+    '''
+    Returns: for each index of idx, an index in range(n) drawn uniformly among the ones different from it
+    '''
+    other = rng.integers(0, n-1, size=len(idx))
+    return other + (other >= idx)
+
+
+def tournament_pairs(fitness, n_pairs, k, rng):
+    '''
+    Draw n_pairs pairs of tournament winners; the candidates of the second tournament never include the first parent.
+    '''
+    fitness = np.asarray(fitness, dtype=float)
+    n = len(fitness)
+    k = max(1, min(k, n-1))
+    candidates = rng.integers(0, n, size=(n_pairs, k))
+    first = candidates[np.arange(n_pairs), np.argmax(fitness[candidates], axis=1)]
+    candidates = rng.integers(0, n-1, size=(n_pairs, k))
+    candidates += candidates >= first[:, None]
+    second = candidates[np.arange(n_pairs), np.argmax(fitness[candidates], axis=1)]
+    return np.stack([first, second], axis=1)
+
+
+def truncation_pairs(fitness, n_pairs, fraction, rng):
+    '''
+    Draw n_pairs pairs uniformly among the best fraction (at least 2) of the chromosomes.
+    '''
+    fitness = np.asarray(fitness, dtype=float)
+    n_best = min(len(fitness), max(2, int(np.ceil(fraction*len(fitness)))))
+    best = np.argsort(fitness, kind='stable')[::-1][:n_best]
+    first = rng.integers(0, n_best, size=n_pairs)
+    second = other_indexes(first, n_best, rng)
+    return np.stack([best[first], best[second]], axis=1)
+
+
+
+class Selector():
+    '''
+    Args:
+        method (str): selection method (see METHODS)
+        seed (int): seed of the selection random streams
+        x (int): selection pressure exponent of the roulette
+        k (int): tournament size
+        truncation (float): fraction of the population used by truncation selection
+    '''
+    def __init__(self, method='roulette', seed=0, x=3, k=3, truncation=0.5):
+        if method not in METHODS:
+            raise ValueError('Unknown selection method '+str(method))
+        self.method = method
+        self.seed = seed
+        self.x = x
+        self.k = k
+        self.truncation = truncation
+
+    def generator(self, *key):
+        '''
+        Returns:
+            rng (np.random.Generator): independent and reproducible substream of the seed, identified by key (e.g. the generation)
+        '''
+        return np.random.default_rng(np.random.SeedSequence(self.seed, spawn_key=tuple(key)))
+
+    def pairs(self, fitness, n_pairs, rng, sizes=None):
+        '''
+        Args:
+            fitness (np.array(float)): fitness of each chromosome (at least 2 chromosomes)
+            n_pairs (int): number of parent pairs
+            rng (np.random.Generator)
+            sizes (np.array(int)): optional size of each chromosome, for lexicographic parsimony pressure
+        Returns:
+            pairs (np.array(int)): (n_pairs x 2) indexes of the parents
+        '''
+        if len(fitness) < 2:
+            raise ValueError('Selection needs at least 2 chromosomes, got '+str(len(fitness)))
+        if self.method == 'roulette':
+            return draw_pairs(roulette_probabilities(fitness, self.x), n_pairs, rng)
+        if sizes is not None:
+            fitness = lexicographic_rank(fitness, sizes)
+        if self.method == 'rank':
+            return draw_pairs(rank_probabilities(fitness), n_pairs, rng)
+        if self.method == 'tournament':
+            return tournament_pairs(fitness, n_pairs, self.k, rng)
+        return truncation_pairs(fitness, n_pairs, self.truncation, rng)
@@ -0,0 +1,146 @@
+'''
+This file define the data-driven split points of the observations (Environment.all_obs), used by the conditions
+observation[i] <= all_obs[i][j] of the programs.
+
+By default Environment.subdivide_all_obs spreads bins[i] split points uniformly over the bounds of the observation
+space, and divides infinite bounds by 7131**10: for unbounded observations (e.g. CartPole velocities) most of the
+split points fall where the agent never goes, and the conditions on them are constant.
+QuantileSplitPoints instead collects the states visited by n_rollouts episodes (of a random policy or of seed
+programs, in parallel) and places the bins[i] split points of each observation at its empirical quantiles
+(j+0.5)/bins[i], so that each condition splits the visited states. The split points are cached on disk, in a JSON
+file for each environment id, bins and rollouts configuration, and are computed only once.
+
+usage (print the split points of an environment):
+    python Split_Points.py CartPole-v0 --bins 7 4 7 6 --rollouts 100
+'''
+
+
+import numpy as np
+import multiprocessing
+from multiprocessing import Pool
+import argparse
+import hashlib
+import json
+import os
+
+import gym
+
+from Chromosome import Chromosome
+
+
+def rollout_states(task):
+    '''
+    Run one episode and return the visited states.
+
+    Args:
+        task (tuple): (env_id, solution, all_obs, seed), with solution None for the random policy
+    Returns:
+        states (np.array(float)): (steps+1 x n_obs) observations of the episode
+    '''
+    env_id, solution, all_obs, seed = task
+    process_env = gym.make(env_id)
+    process_env.seed(seed)
+    process_env.action_space.seed(seed)
+    chromosome = Chromosome.from_solution(solution) if solution!=None else None
+    obs = process_env.reset()
+    states = [obs]
+    done = False
+    while not done:
+        if chromosome!=None:
+            action = chromosome.execute_solution(obs, all_obs)
+        else:
+            action = process_env.action_space.sample()
+        obs, _, done, _ = process_env.step(action)
+        states.append(obs)
+    process_env.close()
+    return np.array(states, dtype=float)
+
+
+def quantile_split_points(states, bins):
+    '''
+    Args:
+        states (np.array(float)): (n x n_obs) visited states
+        bins (list(int)): number of split points of each observation
+    Returns:
+        all_obs (list(np.array(float))): split points of each observation, at its quantiles (j+0.5)/bins[i]
+    '''
+    return [np.quantile(states[:, i], (np.arange(bins[i])+0.5)/bins[i]) for i in range(len(bins))]
+
+
+
+class QuantileSplitPoints():
+    '''
+    Split points at the empirical quantiles of the visited states (see the module docstring).
+
+    Args:
+        n_rollouts (int): number of episodes that collect the states
+        policies (list(str or Chromosome)): optional seed programs (e.g. loaded by Program_Loader.py), played in turn
+            by the rollouts with the uniform split points (default a random policy)
+        seed (int): seed of the first rollout (rollout k uses seed+k)
+        n_workers (int): number of rollout processes (default multiprocessing.cpu_count(), 1 runs them in this process)
+        cache_dir (str): directory of the cached split points (None to disable the cache)
+    '''
+    def __init__(self, n_rollouts=100, policies=None, seed=0, n_workers=None, cache_dir='./split_points'):
+        self.n_rollouts = n_rollouts
+        self.policies = [getattr(p, 'solution', p) for p in policies] if policies!=None else None
+        self.seed = seed
+        self.n_workers = n_workers
+        self.cache_dir = cache_dir
+
+    def cache_path(self, env_id, bins):
+        policies = hashlib.md5('\n'.join(self.policies).encode()).hexdigest()[:8] if self.policies else 'random'
+        name = '{}-bins_{}-rollouts_{}-seed_{}-{}.json'.format(env_id, '_'.join(str(b) for b in bins), self.n_rollouts, self.seed, policies)
+        return os.path.join(self.cache_dir, name)
+
+    def collect(self, env_id, all_obs):
+        '''
+        Returns:
+            states (np.array(float)): (n x n_obs) states visited by the rollouts
+        '''
+        tasks = [(env_id, self.policies[k % len(self.policies)] if self.policies else None, all_obs, self.seed+k)
+                 for k in range(self.n_rollouts)]
+        n_workers = self.n_workers if self.n_workers else multiprocessing.cpu_count()
+        if n_workers == 1:
+            episodes = [rollout_states(task) for task in tasks]
+        else:
+            with Pool(n_workers) as pool:
+                episodes = pool.map(rollout_states, tasks)
+        return np.concatenate(episodes)
+
+    def split_points(self, environment):
+        '''
+        Args:
+            environment (Genetic_Gym.Environment): environment with the uniform split points (used by the seed policies)
+        Returns:
+            all_obs (list(np.array(float))): split points of each observation
+        '''
+        env_id, bins = environment.env.spec.id, tuple(environment.bins)
+        path = self.cache_path(env_id, bins) if self.cache_dir!=None else None
+        if path!=None and os.path.exists(path):
+            with open(path) as f:
+                return [np.array(split_points) for split_points in json.load(f)['all_obs']]
+        states = self.collect(env_id, environment.all_obs)
+        all_obs = quantile_split_points(states, bins)
+        print('Split points at the quantiles of', len(states), 'states of', self.n_rollouts, 'rollouts')
+        if path!=None:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with open(path+'.tmp', 'w') as f:
+                json.dump({'env_id': env_id, 'bins': list(bins), 'n_rollouts': self.n_rollouts, 'n_states': len(states),
+                           'all_obs': [split_points.tolist() for split_points in all_obs]}, f)
+            os.replace(path+'.tmp', path)      # concurrent runs (e.g. a sweep) never read a partial file
+        return all_obs
+
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compute the quantile split points of an environment')
+    parser.add_argument('env', help='gym environment id')
+    parser.add_argument('--bins', type=int, nargs='+', required=True, help='bins of each observation')
+    parser.add_argument('--rollouts', type=int, default=100, help='number of random policy episodes')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    from Genetic_Gym import Environment
+    environment = Environment(args.env, n_episodes=1, bins=tuple(args.bins),
+                              split_points=QuantileSplitPoints(args.rollouts, seed=args.seed))
+    for i, split_points in enumerate(environment.all_obs):
+        print('observation', i, ':', split_points)
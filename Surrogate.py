@@ -0,0 +1,202 @@
+'''
+This file define the surrogate fitness model used by evolve() of g4p_solver.py to pre-screen offsprings.
+
+The surrogate learns online, from all the evaluated chromosomes, a ridge regression of their fitness on:
+- program structure statistics of their solution (if/else statements, action assignments, depth, used observations, length)
+- a behavioral fingerprint: the actions chosen on a fixed set of random probe observations
+  (computed for all probes at once with Vectorized_Policy.py)
+- the mean fitness of their parents (offsprings only)
+Before each generation evaluation, the offsprings are ranked by predicted fitness: only the best `keep` fraction
+of them, plus an `explore` fraction of them drawn at random among the others, are sent to the evaluator; the others
+are discarded (both fractions are of the offsprings of a generation without oversampling).
+Screening starts once min_samples chromosomes have been evaluated. The Spearman rank correlation between
+predicted and real fitness of the evaluated offsprings is reported each generation (see Metrics.py).
+The training set, the probes, the random generator and the pending predictions are saved in the checkpoints of
+evolve() (see state), so that a resumed run screens the same offsprings as the uninterrupted one.
+'''
+
+
+import numpy as np
+
+from Vectorized_Policy import vectorize_solution, VectorizeError
+
+
+def rank(values):
+    ''' Ranks of values (0 based), ties get the mean of their ranks. '''
+    values = np.asarray(values, dtype=float)
+    order = np.argsort(values, kind='mergesort')
+    ranks = np.empty(len(values))
+    ranks[order] = np.arange(len(values))
+    _, inverse, counts = np.unique(values, return_inverse=True, return_counts=True)
+    sums = np.bincount(inverse, weights=ranks)
+    return (sums/counts)[inverse]
+
+
+def spearman(a, b):
+    '''
+    Returns:
+        rho (float): Spearman rank correlation of a and b (NaN if it is not defined)
+    '''
+    if len(a) < 3:
+        return float('nan')
+    ra, rb = rank(a), rank(b)
+    ra, rb = ra-ra.mean(), rb-rb.mean()
+    norm = np.sqrt((ra**2).sum()*(rb**2).sum())
+    return float((ra*rb).sum()/norm) if norm>0 else float('nan')
+
+
+def structure_features(solution, n_obs):
+    '''
+    Returns:
+        features (list(float)): if statements, else statements, action assignments, maximum indentation,
+            program length and one flag for each observation used in a condition
+    '''
+    lines = solution.split('\n')
+    used = [0.]*n_obs
+    for i in range(n_obs):
+        if 'observation[{}]'.format(i) in solution:
+            used[i] = 1.
+    return [solution.count('if '), solution.count('else:'), solution.count('action = '),
+            max(len(l)-len(l.lstrip('\t')) for l in lines), len(lines)] + used
+
+
+
+class Surrogate():
+    '''
+    Args:
+        environment (Genetic_Gym.Environment)
+        keep (float): fraction of the offsprings evaluated for their best predicted fitness
+        explore (float): fraction of the offsprings evaluated anyway, drawn at random among the others
+            (keep and explore are fractions of the offsprings of a generation without oversampling)
+        oversample (float): the generation produces oversample times more offsprings than usual, to be screened
+            (1: screening saves evaluations; 1/(keep+explore): same number of evaluations, better offsprings)
+        n_probes (int): number of probe observations of the behavioral fingerprint
+        min_samples (int): evaluated chromosomes needed before screening starts
+        max_samples (int): training set size (the oldest samples are dropped)
+        alpha (float): ridge regularization
+        seed (int): seed of the probes and of the exploration draws (independent from the evolution random streams)
+
+    Attributes:
+        stats (dict): statistics of the last generation (spearman, screened, evaluated, samples)
+    '''
+    def __init__(self, environment, keep=0.5, explore=0.1, oversample=1., n_probes=64, min_samples=100, max_samples=4096, alpha=1., seed=0):
+        self.keep = keep
+        self.explore = explore
+        self.oversample = oversample
+        self.min_samples = min_samples
+        self.max_samples = max_samples
+        self.alpha = alpha
+        self.rng = np.random.default_rng(seed)
+        self.all_obs = environment.all_obs
+        self.n_actions = len(environment.actions)
+        self.n_obs = len(environment.all_obs)
+        low = np.array([split_points[0] for split_points in self.all_obs], dtype=float)
+        high = np.array([split_points[-1] for split_points in self.all_obs], dtype=float)
+        margin = (high-low)/10
+        self.probes = self.rng.uniform(low-margin, high+margin, size=(n_probes, self.n_obs))
+        self.X, self.y = [], []
+        self.weights = None
+        self.predicted = {}                 # id(chromosome) -> (predicted fitness, features) of the offsprings sent to evaluation
+        self.stats = {}
+
+    def n_pairs(self, n_pairs):
+        ''' Number of parent pairs of a generation whose offsprings will be screened. '''
+        return int(np.ceil(n_pairs*self.oversample)) if self.ready() else n_pairs
+
+    def ready(self):
+        return len(self.y) >= self.min_samples
+
+    def features(self, chromosome):
+        try:
+            actions = vectorize_solution(chromosome.solution)(self.probes, self.all_obs)
+        except VectorizeError:      # probes that do not reach any assignment get action 0, as in get_actions
+            actions = [chromosome.execute_solution(probe, self.all_obs) for probe in self.probes]
+            actions = np.array([0 if action==None else action for action in actions], dtype=int)
+        fingerprint = np.zeros((len(self.probes), self.n_actions))
+        fingerprint[np.arange(len(self.probes)), np.clip(actions, 0, self.n_actions-1)] = 1.
+        parent_fitness = getattr(chromosome, 'parent_fitness', None)
+        parent = [0., 0.] if parent_fitness == None else [1., parent_fitness]
+        return np.concatenate([structure_features(chromosome.solution, self.n_obs), parent, fingerprint.ravel()])
+
+    #--------------------------------------#
+    def update(self, chromosomes, scores):
+        '''
+        Learn from an evaluated generation and measure the rank correlation of the predictions of its offsprings.
+
+        Args:
+            chromosomes (list(Chromosome)): evaluated chromosomes
+            scores (Score_Store.ScoreMatrix): their scores (rows of dead chromosomes are not valid)
+        Returns:
+            stats (dict)
+        '''
+        fitness = scores.fitness()
+        predicted, real = [], []
+        for chromosome, f, valid in zip(chromosomes, fitness, scores.valid):
+            if not valid:
+                continue
+            if id(chromosome) in self.predicted:
+                prediction, features = self.predicted[id(chromosome)]
+                predicted.append(prediction)
+                real.append(f)
+            else:
+                features = self.features(chromosome)
+            self.X.append(features)
+            self.y.append(f)
+        self.X, self.y = self.X[-self.max_samples:], self.y[-self.max_samples:]
+        self.stats = {'spearman': spearman(predicted, real), 'predicted': len(predicted), 'samples': len(self.y)}
+        self.predicted = {}
+        if self.ready():
+            self.fit()
+        return self.stats
+
+    def fit(self):
+        X, y = np.array(self.X), np.array(self.y)
+        self.mean, self.std = X.mean(axis=0), X.std(axis=0)
+        self.std[self.std==0] = 1.
+        self.y_mean = y.mean()
+        Z = (X-self.mean)/self.std
+        self.weights = np.linalg.solve(Z.T @ Z + self.alpha*np.eye(Z.shape[1]), Z.T @ (y-self.y_mean))
+
+    def predict(self, X):
+        return ((np.asarray(X)-self.mean)/self.std) @ self.weights + self.y_mean
+
+    def state(self, chromosomes):
+        '''
+        Args:
+            chromosomes (list(Chromosome)): chromosomes of the next generation, whose pending predictions are saved
+        Returns:
+            state (dict): training set (at most max_samples), probes, random generator state and pending predictions,
+                saved in the checkpoints of evolve()
+        '''
+        return {'X': np.array(self.X), 'y': list(self.y), 'probes': self.probes, 'rng': self.rng.bit_generator.state,
+                'predicted': [self.predicted.get(id(c)) for c in chromosomes]}
+
+    def restore(self, state, chromosomes):
+        ''' Restore the surrogate from a checkpoint state (see state), and refit it. '''
+        self.X, self.y = list(state['X']), list(state['y'])
+        self.probes = state['probes']
+        self.rng.bit_generator.state = state['rng']
+        self.predicted = dict((id(c), p) for c, p in zip(chromosomes, state['predicted']) if p!=None)
+        self.weights = None
+        if self.ready():
+            self.fit()
+
+    def screen(self, offsprings):
+        '''
+        Returns:
+            selected (list(Chromosome)): the offsprings to evaluate (all of them until the surrogate is ready)
+        '''
+        if self.weights is None or len(offsprings) == 0:
+            self.stats.update(screened=0, evaluated=len(offsprings))
+            return offsprings
+        X = [self.features(c) for c in offsprings]
+        predictions = self.predict(X)
+        order = np.argsort(-predictions, kind='mergesort')
+        n_keep = int(np.ceil(len(offsprings)*self.keep/self.oversample))
+        rest = order[n_keep:]
+        n_explore = min(len(rest), int(np.ceil(len(offsprings)*self.explore/self.oversample)))
+        selected = np.sort(np.concatenate([order[:n_keep], self.rng.choice(rest, n_explore, replace=False)]).astype(int))
+        for i in selected:
+            self.predicted[id(offsprings[i])] = (predictions[i], X[i])
+        self.stats.update(screened=len(offsprings)-len(selected), evaluated=len(selected))
+        return [offsprings[i] for i in selected]
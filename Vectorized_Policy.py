@@ -0,0 +1,110 @@
+'''
+This file define the batched execution of the get_action programs generated by Chromosome.generate_solution.
+
+The grammar of the programs (see Grammatical_Evolution_mapper.py) only contains if/else statements on
+observation[i] <= all_obs[i][j] (or >) conditions and action = k assignments, so a program can be translated
+into a function that computes the actions of a whole batch of observations with numpy masks:
+each branch keeps the mask of the observations that reach it, and each assignment writes the action
+of the observations of its mask, in program order. Observations that do not pass through any assignment
+get action 0, as in Chromosome.execute_solution.
+
+e.g.
+    get_actions = vectorize_solution(chromosome.solution)
+    actions = get_actions(observations, environment.all_obs)      # observations: (n_observations x n_obs)
+'''
+
+
+import numpy as np
+import ast
+
+
+class VectorizeError(ValueError):
+    ''' The program contains a statement or an expression that is not generated by the grammar. '''
+
+
+def _index(node):
+    if type(node).__name__ == 'Index':     # python < 3.9 wraps subscripts in ast.Index
+        node = node.value
+    return ast.literal_eval(node)
+
+
+def _condition(test):
+    '''
+    Returns:
+        source (str): numpy expression of an observation[i] COMP all_obs[i][j] condition
+    '''
+    if not (isinstance(test, ast.Compare) and len(test.ops)==1 and isinstance(test.ops[0], (ast.LtE, ast.Gt))):
+        raise VectorizeError('unsupported condition: '+ast.dump(test))
+    try:
+        left, right = test.left, test.comparators[0]
+        if left.value.id != 'observation' or right.value.value.id != 'all_obs':
+            raise VectorizeError('unsupported condition: '+ast.dump(test))
+        n_obs = _index(left.slice)
+        state_obs, split_point = _index(right.value.slice), _index(right.slice)
+    except (AttributeError, ValueError) as e:
+        raise VectorizeError('unsupported condition: '+ast.dump(test)) from e
+    comp = '<=' if isinstance(test.ops[0], ast.LtE) else '>'
+    return 'observations[:, {}] {} all_obs[{}][{}]'.format(n_obs, comp, state_obs, split_point)
+
+
+def _translate(statements, mask, lines, counter):
+    for statement in statements:
+        if isinstance(statement, ast.If):
+            counter[0] += 1
+            condition = 'c{}'.format(counter[0])
+            lines.append('\t{} = {}'.format(condition, _condition(statement.test)))
+            lines.append('\tm{} = {} & {}'.format(counter[0], mask, condition))
+            _translate(statement.body, 'm{}'.format(counter[0]), lines, counter)
+            if statement.orelse:
+                counter[0] += 1
+                lines.append('\tm{} = {} & ~{}'.format(counter[0], mask, condition))
+                _translate(statement.orelse, 'm{}'.format(counter[0]), lines, counter)
+        elif isinstance(statement, ast.Assign) and len(statement.targets)==1 and getattr(statement.targets[0], 'id', None)=='action':
+            lines.append('\taction[{}] = {}'.format(mask, ast.literal_eval(statement.value)))
+        elif isinstance(statement, ast.Return):
+            pass
+        else:
+            raise VectorizeError('unsupported statement: '+ast.dump(statement))
+
+
+def vectorize_source(solution):
+    '''
+    Returns:
+        source (str): python source of get_actions(observations, all_obs), the batched version of solution
+    '''
+    function = ast.parse(solution).body[0]
+    if not isinstance(function, ast.FunctionDef) or function.name != 'get_action':
+        raise VectorizeError('solution does not define get_action')
+    lines = ['def get_actions(observations, all_obs):',
+             '\tobservations = as_observations(observations, all_obs)',
+             '\taction = np.zeros(len(observations), dtype=int)',
+             '\tm0 = np.ones(len(observations), dtype=bool)']
+    _translate(function.body, 'm0', lines, [0])
+    lines.append('\treturn action')
+    return '\n'.join(lines)
+
+
+def as_observations(observations, all_obs):
+    '''
+    2D array of observations, with a dtype that holds both observations and split points: numpy compares arrays
+    with scalars in the dtype of the array, so float32 observations would otherwise be compared with float64
+    split points in float32, unlike the scalar comparisons of get_action.
+    '''
+    observations = np.asarray(observations)
+    if observations.ndim == 1:
+        observations = observations.reshape(1, -1)
+    dtype = np.result_type(observations.dtype, *[np.asarray(split_points).dtype for split_points in all_obs])
+    return observations.astype(dtype, copy=False)
+
+
+def vectorize_solution(solution):
+    '''
+    Args:
+        solution (str): get_action program (see Chromosome.generate_solution)
+
+    Returns:
+        get_actions (function): get_actions(observations, all_obs) -> np.array(int) of the actions of the observations
+    '''
+    loc = {}
+    exec(vectorize_source(solution), {'np': np, 'as_observations': as_observations}, loc)
+    return loc['get_actions']
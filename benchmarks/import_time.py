@@ -0,0 +1,67 @@
+'''
+Import-time benchmark of the evaluation path.
+
+Each module is imported in a fresh interpreter (as a spawned pool worker would do) and the import time is measured;
+the benchmark fails if the import is slower than --max-seconds, or if it loads any of the visualization modules
+(matplotlib, graphviz tree export) that must be imported only by Chromosome.tree_to_png and by the tree and plot
+writers of Artifact_Writer.py (write_tree_png and plot_generation).
+
+usage:
+    python benchmarks/import_time.py --repeat 5 --max-seconds 1.5
+'''
+
+
+import argparse
+import subprocess
+import json
+import sys
+import os
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODULES = ['Chromosome', 'Genetic_Gym', 'Evaluation_Executor', 'g4p_solver']
+FORBIDDEN = ['matplotlib', 'mpl_toolkits', 'anytree.exporter', 'anytree.dotexport']
+
+PROBE = '''
+import sys, time, json
+preloaded = set(sys.modules)      # e.g. namespace packages loaded by site .pth files
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{'seconds': elapsed, 'forbidden': [m for m in {forbidden} if m in sys.modules and m not in preloaded]}}))
+'''
+
+
+def measure(module, repeat):
+    '''
+    Returns:
+        seconds (float): best import time of module over repeat fresh interpreters
+        forbidden (list(str)): visualization modules loaded by the import
+    '''
+    best, forbidden = None, []
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, '-W', 'ignore', '-c', PROBE.format(module=module, forbidden=FORBIDDEN)],
+                             cwd=ROOT, check=True, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, universal_newlines=True).stdout
+        result = json.loads(out.strip().splitlines()[-1])
+        best = result['seconds'] if best is None else min(best, result['seconds'])
+        forbidden = result['forbidden']
+    return best, forbidden
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='G4P import-time benchmark')
+    parser.add_argument('--repeat', type=int, default=5, help='fresh interpreters per module (the best time is kept)')
+    parser.add_argument('--max-seconds', type=float, default=None, help='fail if a module import is slower')
+    parser.add_argument('modules', nargs='*', default=MODULES)
+    args = parser.parse_args()
+
+    failed = False
+    for module in args.modules:
+        seconds, forbidden = measure(module, args.repeat)
+        status = 'ok'
+        if forbidden:
+            status, failed = 'FAIL imports '+', '.join(forbidden), True
+        elif args.max_seconds!=None and seconds > args.max_seconds:
+            status, failed = 'FAIL slower than {}s'.format(args.max_seconds), True
+        print('{:<22} {:8.1f} ms   {}'.format(module, seconds*1000, status))
+    sys.exit(1 if failed else 0)
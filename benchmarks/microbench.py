@@ -0,0 +1,245 @@
+'''
+Microbenchmarks of the hot paths of G4P, on synthetic populations generated with fixed seeds.
+
+Each benchmark prepares its inputs (not timed), then times its operation `ops` times; this is repeated --repeat times
+and the best time per operation is kept. Results are saved as JSON and can be compared with a saved baseline:
+the suite fails (exit code 1) if a benchmark is slower than the baseline by more than --threshold.
+Only classic-control gym environments are used, so it runs offline.
+
+usage:
+    python benchmarks/microbench.py --save benchmarks/baseline.json              # record a baseline
+    python benchmarks/microbench.py --baseline benchmarks/baseline.json          # compare with it
+    python benchmarks/microbench.py --filter mutate --repeat 10
+'''
+
+
+import argparse
+import contextlib
+import platform
+import copy
+import json
+import time
+import sys
+import io
+import os
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from anytree import Node
+from Grammatical_Evolution_mapper import Parser
+from Genetic_Gym import Population, Environment
+from Score_Store import ScoreMatrix
+
+
+SEED = 1234
+ENV_ID = 'CartPole-v0'
+BINS = (7, 4, 7, 6)
+
+
+@contextlib.contextmanager
+def quiet():
+    ''' Hide the progress prints of the benchmarked functions. '''
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+_environment = []
+
+def environment():
+    if not _environment:
+        with quiet():
+            _environment.append(Environment(ENV_ID, n_episodes=1, bins=BINS))
+    return _environment[0]
+
+
+def synthetic_population(n_chromosomes, genotype_len=22, MAX_DEPTH=5, MAX_WRAP=3, n_distinct=64):
+    '''
+    Population of n_chromosomes with solutions and synthetic scores (10 episodes each).
+    At most n_distinct chromosomes are generated, larger populations repeat them.
+    '''
+    np.random.seed(SEED)
+    population = Population(0.9, 0.9, max(2, n_chromosomes//4), environment())
+    with quiet():
+        population.initialize_chromosomes(min(n_chromosomes, n_distinct), genotype_len, MAX_DEPTH, MAX_WRAP)
+    for chromosome in population.chromosomes:
+        chromosome.generate_solution()
+    population.chromosomes = [population.chromosomes[i % len(population.chromosomes)] for i in range(n_chromosomes)]
+    rng = np.random.default_rng(SEED)
+    scores = ScoreMatrix(n_chromosomes, 10)
+    for slot in range(n_chromosomes):
+        scores.set(slot, {'scores': list(rng.integers(8, 200, size=10).astype(float)), 'lengths': [0]*10, 'wall_time': 0.})
+    population.chromosomes_scores = scores
+    population.chromosomes_fitness = scores.fitness()
+    population.survival_threashold = np.mean(population.chromosomes_fitness)
+    return population
+
+
+#-----------BENCHMARKS-----------#
+# each benchmark returns (prepare, run, ops): run(prepare()) is timed and performs ops operations
+
+def bench_parser(MAX_DEPTH, genotype_len):
+    def prepare():
+        np.random.seed(SEED)
+        return [[np.random.randint(1,3)]+list(np.random.randint(0,1000,size=genotype_len-1)) for _ in range(50)]
+    def run(genotypes):
+        for genotype in genotypes:
+            root = Node('(0)expr-start', label='expr', code='')
+            Parser(genotype, root, environment(), 'full', MAX_DEPTH, 3).start_derivating('expr')
+    return prepare, run, 50
+
+def bench_generate_solution():
+    population = synthetic_population(50)
+    def run(chromosomes):
+        for chromosome in chromosomes:
+            chromosome.generate_solution()
+    return lambda: population.chromosomes, run, 50
+
+def bench_execute_solution():
+    chromosome = synthetic_population(1).chromosomes[0]
+    env = environment()
+    observation = env.env.observation_space.sample()*0
+    def run(_):
+        for _ in range(1000):
+            chromosome.execute_solution(observation, env.all_obs)
+    return lambda: None, run, 1000
+
+def bench_compile_solution():
+    chromosomes = synthetic_population(50).chromosomes
+    def run(_):
+        for chromosome in chromosomes:
+            chromosome.compile_solution()
+    return lambda: None, run, 50
+
+def bench_run_one_episode():
+    import gym
+    chromosome = synthetic_population(1).chromosomes[0]
+    env = environment()
+    process_env = gym.make(ENV_ID)
+    def prepare():
+        process_env.seed(SEED)
+    def run(_):
+        for episode in range(5):
+            env.run_one_episode(process_env, chromosome, episode)
+    return prepare, run, 5
+
+def bench_crossover():
+    population = synthetic_population(50)
+    population.crossover_prob = 1.
+    pairs = [(population.chromosomes[i], population.chromosomes[(i+1) % 50], SEED+i) for i in range(50)]
+    def run(_):
+        for parent_A, parent_B, seed in pairs:
+            population.crossover(parent_A, parent_B, seed)
+    return lambda: None, run, 50
+
+def bench_mutate(leaves_only):
+    population = synthetic_population(50)
+    population.mutation_prob = 1.
+    def prepare():
+        np.random.seed(SEED)
+        return copy.deepcopy(population.chromosomes)
+    def run(chromosomes):
+        for chromosome in chromosomes:
+            population.mutate(chromosome, 1, leaves_only=leaves_only)
+    return prepare, run, 50
+
+def bench_fitness_share(n_chromosomes):
+    population = synthetic_population(n_chromosomes)
+    fitness = population.chromosomes_fitness.copy()
+    def prepare():
+        population.chromosomes_fitness = fitness.copy()
+    def run(_):
+        population.fitness_share()
+    return prepare, run, 1
+
+def bench_natural_selection(n_chromosomes, fittest):
+    population = synthetic_population(n_chromosomes)
+    state = (list(population.chromosomes), population.chromosomes_scores, population.chromosomes_fitness)
+    def prepare():
+        population.chromosomes, population.chromosomes_scores, population.chromosomes_fitness = list(state[0]), state[1], state[2].copy()
+    def run(_):
+        with quiet():
+            population.do_natural_selection(fittest)
+    return prepare, run, 1
+
+
+BENCHMARKS = {}
+for depth, genotype_len in [(4, 22), (6, 22), (6, 100), (8, 100)]:
+    BENCHMARKS['parser/depth{}_genotype{}'.format(depth, genotype_len)] = (bench_parser, (depth, genotype_len))
+BENCHMARKS['chromosome/generate_solution'] = (bench_generate_solution, ())
+BENCHMARKS['chromosome/execute_solution_step'] = (bench_execute_solution, ())
+BENCHMARKS['chromosome/compile_solution'] = (bench_compile_solution, ())
+BENCHMARKS['environment/run_one_episode'] = (bench_run_one_episode, ())
+BENCHMARKS['population/crossover'] = (bench_crossover, ())
+BENCHMARKS['population/mutate_subtree'] = (bench_mutate, (False,))
+BENCHMARKS['population/mutate_leaves'] = (bench_mutate, (True,))
+for n in (16, 32, 64):
+    BENCHMARKS['population/fitness_share_{}'.format(n)] = (bench_fitness_share, (n,))
+for n in (1000, 10000, 100000):
+    BENCHMARKS['population/natural_selection_fittest_{}'.format(n)] = (bench_natural_selection, (n, True))
+for n in (16, 32, 64):
+    BENCHMARKS['population/natural_selection_diversity_{}'.format(n)] = (bench_natural_selection, (n, False))
+
+
+def run_benchmark(name, repeat):
+    factory, args = BENCHMARKS[name]
+    prepare, run, ops = factory(*args)
+    times = []
+    for _ in range(repeat):
+        state = prepare()
+        start = time.perf_counter()
+        with quiet():
+            run(state)
+        times.append((time.perf_counter()-start)/ops)
+    return {'seconds_per_op': min(times), 'median_seconds_per_op': float(np.median(times)), 'ops': ops, 'repeat': repeat}
+
+
+def compare(results, baseline, threshold):
+    '''
+    Returns:
+        regressions (list(str)): benchmarks slower than the baseline by more than threshold (fraction)
+    '''
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            print('{:<50} {:>12.3f} us   (new)'.format(name, result['seconds_per_op']*1e6))
+            continue
+        ratio = result['seconds_per_op'] / baseline[name]['seconds_per_op']
+        status = 'REGRESSION' if ratio > 1+threshold else ''
+        if status:
+            regressions.append(name)
+        print('{:<50} {:>12.3f} us   x{:.2f} {}'.format(name, result['seconds_per_op']*1e6, ratio, status))
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='G4P microbenchmarks')
+    parser.add_argument('--repeat', type=int, default=5, help='repetitions of each benchmark (the best one is kept)')
+    parser.add_argument('--filter', default='', help='run only the benchmarks whose name contains this string')
+    parser.add_argument('--save', default=None, help='save the results to this JSON file')
+    parser.add_argument('--baseline', default=None, help='compare the results with this JSON file')
+    parser.add_argument('--threshold', type=float, default=0.25, help='allowed slowdown with respect to the baseline (fraction)')
+    args = parser.parse_args()
+
+    results = {}
+    for name in BENCHMARKS:
+        if args.filter in name:
+            results[name] = run_benchmark(name, args.repeat)
+            if args.baseline == None:
+                print('{:<50} {:>12.3f} us'.format(name, results[name]['seconds_per_op']*1e6))
+
+    regressions = []
+    if args.baseline != None:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f)['results'], args.threshold)
+    if args.save != None:
+        report = {
+            'meta': {'seed': SEED, 'python': platform.python_version(), 'numpy': np.__version__,
+                     'machine': platform.machine(), 'node': platform.node(), 'date': time.strftime('%Y-%m-%d %H:%M:%S')},
+            'results': results,
+        }
+        with open(args.save, 'w') as f:
+            json.dump(report, f, indent=2)
+    if regressions:
+        print('Regressions over {:.0%}: {}'.format(args.threshold, ', '.join(regressions)))
+    sys.exit(1 if regressions else 0)
@@ -0,0 +1,182 @@
+'''
+Policy execution benchmark on the corpus of evolved programs shipped with the repository
+(<environment>/GEN-*/*.py, written by Chromosome.generate_solution).
+
+For each program, a few episodes are played with fixed seeds and their observations are recorded; then the
+recorded observations are replayed through each execution path of the program:
+- exec:       the program is exec'd at each step (how Chromosome.execute_solution used to run it)
+- cached:     Chromosome.execute_solution, which compiles the program once and caches get_action
+- vectorized: the batched numpy translation of the program (see Vectorized_Policy.py), one call per episode
+Per-step latency, per-episode latency and steps/sec (policy only, without environment steps) are reported,
+and the actions of all paths are checked to be identical on every recorded observation (exit code 1 otherwise).
+Results can be saved and compared with a baseline, as in microbench.py.
+
+usage:
+    python benchmarks/policy_corpus.py
+    python benchmarks/policy_corpus.py --filter AcroBot --episodes 5 --save benchmarks/corpus.json
+    python benchmarks/policy_corpus.py --baseline benchmarks/corpus.json
+'''
+
+
+import argparse
+import platform
+import glob
+import json
+import time
+import sys
+import os
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+import gym
+from Chromosome import Chromosome
+from Genetic_Gym import Environment
+from Vectorized_Policy import vectorize_solution
+from microbench import quiet, compare
+
+
+SEED = 1234
+CORPUS = {      # directory: (env_id, bins) used to evolve its programs
+    'CartPole-v0'   : ('CartPole-v0', (7, 4, 7, 6)),
+    'MountainCar-v0': ('MountainCar-v0', (18, 14)),
+    'AcroBot-v2'    : ('Acrobot-v1', (13, 13, 13, 13, 13, 13)),
+}
+PATHS = ('exec', 'cached', 'vectorized')
+
+
+def load_corpus(name_filter=''):
+    '''
+    Returns:
+        programs (list((str, str, tuple, str))): (name, env_id, bins, solution) of the corpus programs
+    '''
+    programs = []
+    for directory, (env_id, bins) in CORPUS.items():
+        for path in sorted(glob.glob(os.path.join(ROOT, directory, 'GEN-*', '*.py')), key=lambda p: int(p.split('GEN-')[1].split(os.sep)[0])):
+            name = os.path.relpath(path, ROOT)
+            if name_filter in name:
+                with open(path) as f:
+                    programs.append((name, env_id, bins, f.read()))
+    return programs
+
+
+_environments = {}
+
+def environment(env_id, bins):
+    if (env_id, bins) not in _environments:
+        with quiet():
+            _environments[(env_id, bins)] = Environment(env_id, n_episodes=1, bins=bins)
+    return _environments[(env_id, bins)]
+
+
+def record_episodes(env_id, solution, all_obs, n_episodes):
+    '''
+    Play n_episodes with the program and record the observations it receives.
+
+    Returns:
+        episodes (list(np.array)): (steps x n_obs) observations of each episode
+    '''
+    chromosome = Chromosome.from_solution(solution)
+    process_env = gym.make(env_id)
+    episodes = []
+    for episode in range(n_episodes):
+        process_env.seed(SEED+episode)
+        observations = []
+        obs, done = process_env.reset(), False
+        while not done:
+            observations.append(obs)
+            obs, _, done, _ = process_env.step(chromosome.execute_solution(obs, all_obs))
+        episodes.append(np.array(observations))
+    process_env.close()
+    return episodes
+
+
+#-----------EXECUTION PATHS-----------#
+# each path returns the actions of the observations of an episode
+
+def run_exec(solution, episode, all_obs):
+    actions = []
+    for obs in episode:
+        loc = {}
+        exec(solution, {}, loc)
+        try:
+            actions.append(loc['get_action'](obs, all_obs))
+        except UnboundLocalError:
+            actions.append(0)
+    return actions
+
+def run_cached(chromosome, episode, all_obs):
+    return [chromosome.execute_solution(obs, all_obs) for obs in episode]
+
+def run_vectorized(get_actions, episode, all_obs):
+    return get_actions(episode, all_obs)
+
+
+def benchmark_program(solution, episodes, all_obs, repeat):
+    '''
+    Returns:
+        results (dict): path: timings of the replay of the recorded episodes
+        mismatches (list(str)): paths whose actions differ from the exec path
+    '''
+    policies = {'exec': (run_exec, solution), 'cached': (run_cached, Chromosome.from_solution(solution)),
+                'vectorized': (run_vectorized, vectorize_solution(solution))}
+    steps = sum(len(episode) for episode in episodes)
+    results, actions = {}, {}
+    for path in PATHS:
+        run, policy = policies[path]
+        actions[path] = np.concatenate([np.asarray(run(policy, episode, all_obs), dtype=int) for episode in episodes])
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for episode in episodes:
+                run(policy, episode, all_obs)
+            times.append(time.perf_counter()-start)
+        best = min(times)
+        results[path] = {'seconds_per_op': best/steps, 'seconds_per_episode': best/len(episodes),
+                         'steps_per_sec': steps/best, 'steps': steps, 'episodes': len(episodes), 'repeat': repeat}
+    mismatches = [path for path in PATHS if not np.array_equal(actions[path], actions['exec'])]
+    return results, mismatches
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='G4P policy execution benchmark on the shipped programs')
+    parser.add_argument('--episodes', type=int, default=3, help='recorded episodes of each program')
+    parser.add_argument('--repeat', type=int, default=5, help='repetitions of each replay (the best one is kept)')
+    parser.add_argument('--filter', default='', help='run only the programs whose path contains this string')
+    parser.add_argument('--save', default=None, help='save the results to this JSON file')
+    parser.add_argument('--baseline', default=None, help='compare the results with this JSON file')
+    parser.add_argument('--threshold', type=float, default=0.25, help='allowed slowdown with respect to the baseline (fraction)')
+    args = parser.parse_args()
+
+    results, failures = {}, []
+    print('{:<42} {:>6} {:>7} {:>12} {:>14} {:>14}'.format('program', 'lines', 'steps', 'path', 'us/step', 'steps/sec'))
+    for name, env_id, bins, solution in load_corpus(args.filter):
+        all_obs = environment(env_id, bins).all_obs
+        episodes = record_episodes(env_id, solution, all_obs, args.episodes)
+        program_results, mismatches = benchmark_program(solution, episodes, all_obs, args.repeat)
+        for path in PATHS:
+            r = program_results[path]
+            results[name+'/'+path] = r
+            print('{:<42} {:>6} {:>7} {:>12} {:>14.3f} {:>14.0f}'.format(name, len(solution.splitlines()), r['steps'], path, r['seconds_per_op']*1e6, r['steps_per_sec']))
+        for path in mismatches:
+            failures.append(name+'/'+path)
+            print('MISMATCH: actions of', path, 'differ from exec on', name)
+
+    regressions = []
+    if args.baseline != None:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f)['results'], args.threshold)
+    if args.save != None:
+        report = {
+            'meta': {'seed': SEED, 'episodes': args.episodes, 'python': platform.python_version(), 'numpy': np.__version__,
+                     'machine': platform.machine(), 'node': platform.node(), 'date': time.strftime('%Y-%m-%d %H:%M:%S')},
+            'results': results,
+        }
+        with open(args.save, 'w') as f:
+            json.dump(report, f, indent=2)
+    if regressions:
+        print('Regressions over {:.0%}: {}'.format(args.threshold, ', '.join(regressions)))
+    if failures:
+        print('Execution paths disagree on:', ', '.join(failures))
+    sys.exit(1 if regressions or failures else 0)
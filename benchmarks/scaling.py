@@ -0,0 +1,195 @@
+'''
+End-to-end scaling benchmark of evolve() of g4p_solver.py.
+
+Fixed-seed runs of a few generations are repeated for each combination of environment, number of workers,
+population size and number of episodes, each one in a fresh interpreter. For each run it reports:
+- evals/sec:       evaluations per second of wall time
+- efficiency:      evals/sec divided by (workers x evals/sec of the same configuration with 1 worker)
+- driver CPU:      share of the total CPU time (driver + workers) spent by the driver
+- IPC bytes/job:   mean pickled size of the arguments and of the result of the jobs sent to the pool,
+                   for evaluation jobs and for crossover jobs (sampled, see --ipc-sample)
+- peak RSS:        peak resident memory of the driver and of the largest worker
+Serial driver work and pickling show up as a growing driver CPU share and a falling efficiency as workers are added.
+
+usage:
+    python benchmarks/scaling.py                                    # all environments, 1..all cores
+    python benchmarks/scaling.py --envs CartPole-v0 --workers 1 2 4 --populations 100 400 --episodes 10 --csv scaling.csv
+'''
+
+
+import multiprocessing
+import subprocess
+import argparse
+import pickle
+import json
+import time
+import sys
+import os
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SEED = 1234
+ENVIRONMENTS = {        # env_id: (bins, genotype_len, MAX_DEPTH, MAX_WRAP), as in the examples of g4p_solver.py
+    'CartPole-v0'   : ((7, 4, 7, 6), 22, 5, 3),
+    'MountainCar-v0': ((18, 14), 25, 5, 3),
+    'Acrobot-v1'    : ((13, 13, 13, 13, 13, 13), 150, 6, 7),
+}
+COLUMNS = ['env', 'workers', 'population', 'episodes', 'generations', 'evaluations', 'wall_time', 'evals_per_sec', 'efficiency',
+           'driver_cpu_share', 'eval_ipc_bytes', 'crossover_ipc_bytes', 'driver_peak_rss_mb', 'worker_peak_rss_mb']
+
+
+#-----------CHILD RUN-----------#
+class IPCSampler():
+    '''
+    Record the pickled size of the arguments and results of a sample of the jobs sent to multiprocessing pools.
+    '''
+    def __init__(self, every):
+        self.every = every
+        self.n = 0
+        self.sizes = {}
+
+    def record(self, kind, obj):
+        total = self.sizes.setdefault(kind, [0, 0])
+        total[0] += len(pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL))
+        total[1] += 1
+
+    def install(self):
+        from multiprocessing.pool import Pool
+        apply_async = Pool.apply_async
+        sampler = self
+        def sampled_apply_async(pool, func, args=(), kwds={}, callback=None, error_callback=None):
+            sampler.n += 1
+            if sampler.n % sampler.every == 0:
+                kind = getattr(func, '__name__', str(func))
+                sampler.record(kind+'_args', (func, args, kwds))
+                user_callback = callback
+                def callback(result, kind=kind):
+                    sampler.record(kind+'_result', result)
+                    if user_callback!=None:
+                        user_callback(result)
+            return apply_async(pool, func, args, kwds, callback, error_callback)
+        Pool.apply_async = sampled_apply_async
+
+    def mean(self, kind):
+        args, results = self.sizes.get(kind+'_args', [0, 0]), self.sizes.get(kind+'_result', [0, 0])
+        mean_args = args[0]/args[1] if args[1] else 0.
+        mean_results = results[0]/results[1] if results[1] else 0.
+        return mean_args + mean_results
+
+
+def child_run(config):
+    '''
+    Run evolve() with config (dict) and print the measures as a JSON line prefixed by SCALING_RESULT.
+    '''
+    import resource
+    import contextlib
+    import io
+    sys.path.insert(0, ROOT)
+    from Genetic_Gym import Population, Environment
+    from Metrics import Metrics
+    import g4p_solver
+
+    sampler = IPCSampler(config['ipc_sample'])
+    sampler.install()
+    bins, genotype_len, MAX_DEPTH, MAX_WRAP = ENVIRONMENTS[config['env']]
+    metrics = Metrics()
+    with contextlib.redirect_stdout(io.StringIO()):
+        environment = Environment(config['env'], n_episodes=config['episodes'], bins=bins)
+        population = Population(mutation_prob=0.9, crossover_prob=0.9, max_elite=max(2, config['population']//10), environment=environment)
+        start_wall, start_cpu = time.perf_counter(), time.process_time()
+        all_populations = g4p_solver.evolve(population, environment, initial_n_chr=config['population'], n_generations=config['generations'],
+                                            genotype_len=genotype_len, seed=SEED, MAX_DEPTH=MAX_DEPTH, MAX_WRAP=MAX_WRAP,
+                                            n_workers=config['workers'], metrics=metrics)
+        wall_time, driver_cpu = time.perf_counter()-start_wall, time.process_time()-start_cpu
+        all_populations.close()     # delete the spilled generations
+    for child in multiprocessing.active_children():     # reap the pool workers, so that their usage is accounted
+        child.join()
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    workers_cpu = children.ru_utime + children.ru_stime
+    evaluations = metrics.totals['evaluations']
+    result = dict(config)
+    result.update({
+        'generations'        : len(metrics.records),
+        'evaluations'        : evaluations,
+        'wall_time'          : wall_time,
+        'evals_per_sec'      : evaluations/wall_time if wall_time>0 else 0.,
+        'driver_cpu_share'   : driver_cpu/(driver_cpu+workers_cpu) if driver_cpu+workers_cpu>0 else 0.,
+        'eval_ipc_bytes'     : sampler.mean('evaluate_chromosome'),
+        'crossover_ipc_bytes': sampler.mean('crossover'),
+        'driver_peak_rss_mb' : resource.getrusage(resource.RUSAGE_SELF).ru_maxrss/1024,
+        'worker_peak_rss_mb' : children.ru_maxrss/1024,
+    })
+    print('SCALING_RESULT '+json.dumps(result))
+
+
+#-----------SWEEP-----------#
+def run_config(config):
+    out = subprocess.run([sys.executable, '-W', 'ignore', os.path.abspath(__file__), '--child', json.dumps(config)],
+                         cwd=ROOT, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, universal_newlines=True).stdout
+    for line in out.splitlines():
+        if line.startswith('SCALING_RESULT '):
+            return json.loads(line[len('SCALING_RESULT '):])
+    print('Run failed:', config)
+    return None
+
+
+def add_efficiency(results):
+    ''' Parallel efficiency of each run, with respect to the 1 worker run of the same configuration. '''
+    serial = dict(((r['env'], r['population'], r['episodes']), r['evals_per_sec']) for r in results if r['workers']==1)
+    for r in results:
+        base = serial.get((r['env'], r['population'], r['episodes']))
+        r['efficiency'] = r['evals_per_sec']/(r['workers']*base) if base else None
+
+
+def print_table(results):
+    header = ['env', 'workers', 'pop', 'episodes', 'evals', 'evals/sec', 'efficiency', 'driver CPU', 'eval IPC B', 'xover IPC B', 'driver MB', 'worker MB']
+    print(('{:<16}'+'{:>12}'*(len(header)-1)).format(*header))
+    for r in results:
+        print(('{:<16}'+'{:>12}'*(len(header)-1)).format(
+            r['env'], r['workers'], r['population'], r['episodes'], r['evaluations'], '{:.1f}'.format(r['evals_per_sec']),
+            '-' if r['efficiency']==None else '{:.0%}'.format(r['efficiency']), '{:.0%}'.format(r['driver_cpu_share']),
+            '{:.0f}'.format(r['eval_ipc_bytes']), '{:.0f}'.format(r['crossover_ipc_bytes']),
+            '{:.0f}'.format(r['driver_peak_rss_mb']), '{:.0f}'.format(r['worker_peak_rss_mb'])))
+
+
+def write_csv(results, path):
+    import csv
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=COLUMNS, extrasaction='ignore')
+        writer.writeheader()
+        for r in results:
+            writer.writerow(r)
+
+
+if __name__ == '__main__':
+    cores = multiprocessing.cpu_count()
+    parser = argparse.ArgumentParser(description='G4P end-to-end scaling benchmark')
+    parser.add_argument('--envs', nargs='+', default=list(ENVIRONMENTS), choices=list(ENVIRONMENTS))
+    parser.add_argument('--workers', nargs='+', type=int, default=sorted(set([1]+[2**i for i in range(1, 16) if 2**i < cores]+[cores])))
+    parser.add_argument('--populations', nargs='+', type=int, default=[100])
+    parser.add_argument('--episodes', nargs='+', type=int, default=[10])
+    parser.add_argument('--generations', type=int, default=3)
+    parser.add_argument('--ipc-sample', type=int, default=10, help='measure the pickled size of one pool job every N')
+    parser.add_argument('--csv', default=None, help='also write the results to this CSV file')
+    parser.add_argument('--child', default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child != None:
+        child_run(json.loads(args.child))
+        sys.exit(0)
+
+    results = []
+    for env in args.envs:
+        for population in args.populations:
+            for episodes in args.episodes:
+                for workers in args.workers:
+                    config = {'env': env, 'workers': workers, 'population': population, 'episodes': episodes,
+                              'generations': args.generations, 'ipc_sample': args.ipc_sample}
+                    print('Running', config, flush=True)
+                    result = run_config(config)
+                    if result != None:
+                        results.append(result)
+    add_efficiency(results)
+    print_table(results)
+    if args.csv != None:
+        write_csv(results, args.csv)
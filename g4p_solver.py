@@ -3,6 +3,7 @@ This is the main execution files that use class utilities from Genetic_Gym.py
 
 In particular it defines:
 - evolve() function that describe the population flow (init, evaluate, select, crossingover, mutate, ...)
+- evolve_steady_state() function, an asynchronous alternative to evolve() without generational barrier
 - main() function execute evolve() using parametrized Genetic_Gym.Population and Genetic_Gym.Environment,
 plotting all single generation chromosomes and their population informations in multiple graphs
 and finally (and eventually) showing the evolved chromosome in action
@@ -15,42 +16,163 @@ import gym
 import gym.wrappers as wrappers
 import gym.spaces as spaces
 from collections import deque
-import matplotlib.pyplot as plt         
-from mpl_toolkits.mplot3d import Axes3D
 from multiprocessing import Pool
 import multiprocessing
+import queue
+import copy
 
-from anytree.exporter import DotExporter
 import os, shutil
 
 from Genetic_Gym import Population, Environment
-
-
-
-def evolve(population, environment, initial_n_chr, n_generations, genotype_len, seed, MAX_DEPTH, MAX_WRAP=2):
-    np.random.seed(seed)
-    environment.seed = seed
-
-    all_populations=[]
-
-    ##-------INIT POPULATION--------##
-    # get initial chromosomes generated by the set of genotype 
-    population.initialize_chromosomes(initial_n_chr, genotype_len, MAX_DEPTH, MAX_WRAP)
-    pool = Pool(multiprocessing.cpu_count())
-    #------------------------------#
+from Evaluation_Executor import PoolExecutor, TCPExecutor
+from Checkpoint import Checkpointer, load_checkpoint
+from Generation_History import History
+from Chromosome import Chromosome
+from Selection import Selector
+from Artifact_Writer import ArtifactWriter
+from Metrics import Metrics
+from Metrics_Server import MetricsServer
+from Profiling import Profiler
+from Surrogate import Surrogate
+from Bloat_Control import BloatControl
+from Pareto_Selection import NSGA2
+from Provenance import Genealogy
+from Program_Loader import load_directory, load_history
+from Split_Points import QuantileSplitPoints
+from Local_Search import LocalSearch
+from MAP_Elites import MAPElites
+
+
+
+def evolve(population, environment, initial_n_chr, n_generations, genotype_len, seed, MAX_DEPTH, MAX_WRAP=2, n_workers=None, migration=None,
+           executor=None, checkpoint=None, resume=False, history_dir=None, selection='roulette', tournament_k=3, artifacts=None,
+           metrics=None, profiler=None, surrogate=None, bloat=None, multi_objective=None,
+           genealogy=None, seed_population=None, local_search=None, quality_diversity=None):
+    '''
+    Generational evolution of the population.
+
+    Args:
+        n_workers (int): number of evaluation processes (default multiprocessing.cpu_count())
+        migration (callable): optional migration(generation, population) function called after natural selection,
+            that returns a list of (chromosome, fitness) immigrants to add to the elites (see Genetic_Islands.py)
+        executor (Evaluation_Executor.PoolExecutor or TCPExecutor): executor that evaluates chromosomes
+            (default a PoolExecutor on a local pool of n_workers processes, that is also used for crossovers);
+            with another executor no local pool is created: crossovers run on the pool of a supplied PoolExecutor,
+            or in this process for the other executors (e.g. the shared pool of g4p_sweep.py)
+        checkpoint (str): file where a checkpoint of the run is written after each generation (see Checkpoint.py)
+        resume (bool): continue the run from checkpoint, if it exists
+        history_dir (str): directory where the data of all generations is spilled (default <checkpoint>.history with a
+            checkpoint, so that the run can be resumed, otherwise a temporary directory deleted by all_populations.close())
+        selection (str): parent selection method ('roulette', 'rank', 'tournament' or 'truncation', see Selection.py)
+        tournament_k (int): tournament size of the 'tournament' selection
+        artifacts (Artifact_Writer.ArtifactWriter): writer that receives each evaluated generation (programs and trees are
+            rendered in background, according to its artifact level)
+        metrics (Metrics.Metrics): run metrics, that receive the phase timings and evaluation counters of each generation
+            (see Metrics.py; default metrics are only kept in memory)
+        profiler (Profiling.Profiler): opt-in profiler of a sample of the evaluations and of the driver (see Profiling.py)
+        surrogate (Surrogate.Surrogate): optional surrogate fitness model, that learns from each evaluated generation
+            and pre-screens the offsprings before their evaluation (see Surrogate.py)
+        bloat (Bloat_Control.BloatControl): optional bloat control (size/depth limits of crossover and mutation,
+            lexicographic parsimony pressure and execution cost penalty); its tree size and cost statistics are
+            added to the metrics of each generation
+        multi_objective (Pareto_Selection.NSGA2): optional NSGA-II selection over mean reward, reward variance and
+            policy execution cost, in place of the fitness based natural and parent selection (see Pareto_Selection.py);
+            its Pareto front archive collects the non-dominated policies of the whole run
+        genealogy (Provenance.Genealogy): optional lineage tracking: the variation operators attach a provenance record
+            to each offspring, every evaluated chromosome is registered in the genealogy and the trees written by
+            artifacts are colored by their lineage (see Provenance.py)
+        seed_population (list(Chromosome)): optional chromosomes that take the place of part of the random initial
+            population, e.g. the programs of a directory or the best individuals of a previous run loaded by
+            Program_Loader.py (at most initial_n_chr of them are used)
+        local_search (Local_Search.LocalSearch): optional memetic local search, that hill-climbs the terminals (split
+            points, comparators and actions) of the top elites after natural selection, within a budget of evaluations
+            per generation; improved elites are carried over to the next generation (not used with multi_objective)
+        quality_diversity (MAP_Elites.MAPElites): optional quality diversity mode: every evaluated chromosome is offered
+            to the MAP-Elites archive, and parents are sampled from its occupied cells in place of natural selection,
+            stagnation steps and parent selection (see MAP_Elites.py)
+    Returns:
+        all_populations (Generation_History.History): summary of the evaluated population of each generation
+    '''
+    checkpointer = Checkpointer(checkpoint) if checkpoint!=None else None
+    start_generation=0
     last_max_fitness=None
     ctr=0
     x=3
-    for generation in range(n_generations):
+    eval_jobs=None
+    selection_seed=seed
+    if metrics == None:
+        metrics = Metrics()
+    if history_dir==None and checkpoint!=None:
+        history_dir = checkpoint+'.history'
+
+    if resume and checkpoint!=None and os.path.exists(checkpoint):
+        ##-------RESUME POPULATION--------##
+        state = load_checkpoint(checkpoint)
+        np.random.set_state(state['np_random_state'])
+        environment.seed = state['environment_seed']
+        population.mutation_prob  = state['mutation_prob']
+        population.crossover_prob = state['crossover_prob']
+        population.max_elite      = state['max_elite']
+        population.chromosomes = [Chromosome.from_compact(c) for c in state['chromosomes']]
+        last_max_fitness, ctr, x = state['last_max_fitness'], state['ctr'], state['x']
+        start_generation = state['generation']
+        selection_seed = state['selection_seed']
+        if genealogy!=None and state.get('genealogy')!=None:
+            genealogy.restore(state['genealogy'])
+        if quality_diversity!=None and state.get('quality_diversity')!=None:
+            quality_diversity.restore(state['quality_diversity'])
+        if multi_objective!=None and state.get('multi_objective')!=None:
+            multi_objective.restore(state['multi_objective'])
+        if surrogate!=None and state.get('surrogate')!=None:
+            surrogate.restore(state['surrogate'], population.chromosomes)
+        all_populations = History.restore(state['history'])
+        print('Resuming from generation', start_generation+1)
+    else:
+        np.random.seed(seed)
+        environment.seed = seed
+        all_populations = History(history_dir)
+        ##-------INIT POPULATION--------##
+        # get initial chromosomes generated by the set of genotype 
+        with metrics.phase('initialization'):
+            seeds = list(seed_population[:initial_n_chr]) if seed_population!=None else []
+            population.initialize_chromosomes(initial_n_chr-len(seeds), genotype_len, MAX_DEPTH, MAX_WRAP)
+            for i, chromosome in enumerate(seeds):
+                chromosome.cid = initial_n_chr-len(seeds)+i
+            population.chromosomes += seeds
+            if seeds:
+                print('Seeded', len(seeds), 'of the', initial_n_chr, 'initial chromosomes')
+    own_pool = executor is None
+    if own_pool:
+        pool = Pool(n_workers if n_workers else multiprocessing.cpu_count())
+        executor = PoolExecutor(pool)
+    else:
+        pool = executor.pool if isinstance(executor, PoolExecutor) else None
+    #------------------------------#
+    for generation in range(start_generation, n_generations):
+        if profiler!=None:
+            profiler.begin()
         #--------------EVALUATE MODELS--------------#
         if population.mutation_prob<0:
             population.mutation_prob=0.
+        population.bloat = bloat
+        population.provenance = genealogy!=None
         n = len(population.chromosomes)
 
-        population.chromosomes_scores   = environment.parallel_evaluate_population(population, pool, to_file=False, prnt=False)
-        population.chromosomes = [population.chromosomes[i] for i,score in enumerate(population.chromosomes_scores) if score!=None]
-        population.chromosomes_scores = [score for score in population.chromosomes_scores if score!=None]
-        population.chromosomes_fitness  = np.mean(population.chromosomes_scores, axis=1)
+        if eval_jobs is None:
+            population.chromosomes_scores = environment.parallel_evaluate_population(population, executor, to_file=False, prnt=False, metrics=metrics, profiler=profiler)
+        else:   # offsprings evaluations have already been submitted during the previous generation
+            population.chromosomes_scores = environment.collect_evaluations(eval_jobs, executor, metrics, profiler)
+        if surrogate!=None:
+            with metrics.phase('surrogate'):
+                surrogate.update(population.chromosomes, population.chromosomes_scores)
+        with metrics.phase('selection'):
+            population.remove_dead()
+            if multi_objective!=None:
+                n_front = multi_objective.evaluate(population, generation)
+            if quality_diversity!=None:
+                quality_diversity.insert(population.chromosomes, population.chromosomes_fitness)
+        if genealogy!=None:
+            genealogy.register(population.chromosomes, generation, population.chromosomes_fitness)
         #------------------------------#
         
         
@@ -61,7 +183,26 @@ def evolve(population, environment, initial_n_chr, n_generations, genotype_len,
         print(population.chromosomes_fitness)
 
         population.best_individual = population.chromosomes[np.argmax(population.chromosomes_fitness)]
-        all_populations.append(population)
+        with metrics.phase('artifacts'):
+            all_populations.append(population, n_died=n - len(population.chromosomes))
+            if artifacts!=None:
+                artifacts.generation(generation, population, genealogy)
+        generation_stats = dict(max_fitness=float(np.max(population.chromosomes_fitness)), mean_fitness=float(np.mean(population.chromosomes_fitness)),
+                                n_chromosomes=len(population.chromosomes), n_died=n - len(population.chromosomes))
+        if surrogate!=None:
+            generation_stats['surrogate_spearman'] = surrogate.stats['spearman']
+            print('Surrogate: spearman =', surrogate.stats['spearman'], 'on', surrogate.stats['predicted'], 'screened offsprings')
+        if multi_objective!=None:
+            generation_stats.update(pareto_front=n_front, pareto_archive=len(multi_objective.front))
+            print('Pareto front:', n_front, 'chromosomes,', len(multi_objective.front), 'policies in the archive')
+        if bloat!=None:
+            generation_stats.update(bloat.stats(population.chromosomes))
+            print('Tree size: mean =', round(generation_stats['tree_size_mean'], 1), 'max =', generation_stats['tree_size_max'],
+                  ' policy cost: mean =', round(generation_stats['step_cost_us_mean'], 2), 'us/step')
+        if quality_diversity!=None:
+            generation_stats.update(quality_diversity.stats())
+            print('MAP-Elites: ', generation_stats['archive_size'], 'elites (coverage', round(generation_stats['archive_coverage'], 3),
+                  '), max score =', generation_stats['archive_max_fitness'], ',', generation_stats['archive_inserted'], 'inserted')
 
 
         # population.best_individual.generate_solution(-1,True)
@@ -69,6 +210,9 @@ def evolve(population, environment, initial_n_chr, n_generations, genotype_len,
 
 
         if environment.converged or generation==n_generations-1:
+            metrics.emit(generation, **generation_stats)
+            if profiler!=None:
+                profiler.dump(generation)
             break
         #------------------------------#
         # print(population.chromosomes_fitness)
@@ -78,24 +222,49 @@ def evolve(population, environment, initial_n_chr, n_generations, genotype_len,
         #-------------NATURAL SELECTION-------------#
         population.survival_threashold  = np.mean(population.chromosomes_fitness)
 
-        population.do_natural_selection(True)
-        if len(population.chromosomes)<population.max_elite and generation<=2:
+        with metrics.phase('selection'):
+            if multi_objective!=None:
+                multi_objective.select(population)
+            elif quality_diversity==None:   # with MAP-Elites the parents are sampled from the archive
+                population.do_natural_selection(True)
+        if len(population.chromosomes)<population.max_elite and generation<=2 and quality_diversity==None:
             print('fixing....')
             n_new_chr = population.max_elite - len(population.chromosomes)
             new_pop= Population(population.mutation_prob, population.crossover_prob, population.max_elite, environment)
-            new_pop.initialize_chromosomes(n_new_chr, genotype_len, MAX_DEPTH, MAX_WRAP)
-            new_pop.chromosomes_scores = environment.parallel_evaluate_population(new_pop, pool, to_file=False, prnt=False)
-            new_pop.chromosomes_fitness = np.mean(new_pop.chromosomes_scores, axis=1)
+            with metrics.phase('initialization'):
+                new_pop.initialize_chromosomes(n_new_chr, genotype_len, MAX_DEPTH, MAX_WRAP)
+            new_pop.chromosomes_scores = environment.parallel_evaluate_population(new_pop, executor, to_file=False, prnt=False, metrics=metrics, profiler=profiler)
+            new_pop.remove_dead()
+            if multi_objective!=None:
+                multi_objective.evaluate(new_pop, generation)
             population.chromosomes = list(population.chromosomes) + list(new_pop.chromosomes)
+            population.chromosomes_scores = population.chromosomes_scores.concatenate(new_pop.chromosomes_scores)
             population.chromosomes_fitness = np.array(list(population.chromosomes_fitness) + list(new_pop.chromosomes_fitness))
-        elif len(population.chromosomes)>population.max_elite:
-            population.do_natural_selection(False)
+        elif len(population.chromosomes)>population.max_elite and quality_diversity==None:
+            with metrics.phase('selection'):
+                population.do_natural_selection(False)
         print("Survived:\n",len(population.chromosomes))
         #------------------------------#
 
 
+        #--------------LOCAL SEARCH--------------#
+        carried = []
+        if local_search!=None and multi_objective==None and quality_diversity==None and (not local_search.only_stagnating or np.max(population.chromosomes_fitness)==last_max_fitness):
+            elites_fitness = np.array(population.chromosomes_fitness, dtype=float)
+            with metrics.phase('local_search'):
+                improved = local_search.improve(population, environment, executor, np.random.RandomState(np.random.randint(2**32 - 1)),
+                                                metrics=metrics, profiler=profiler)
+            for i in improved:      # copies: the stagnation mutations below change the elites in place
+                carried.append(copy.deepcopy(population.chromosomes[i]))
+                carried[-1].parent_fitness = float(elites_fitness[i])
+            generation_stats.update(('local_search_'+k, v) for k, v in local_search.stats.items())
+            print('Local search: improved', len(improved), 'elites with', local_search.stats['evaluations'], 'evaluations (',
+                  round(local_search.stats['cpu_time'], 1), 's ), max score =', max(population.chromosomes_fitness))
+        #------------------------------#
+
+
         #--------------CROSSING OVER--------------# 
-        if np.max(population.chromosomes_fitness) == last_max_fitness:  
+        if np.max(population.chromosomes_fitness) == last_max_fitness and quality_diversity==None:
             ctr+=1
             last_max_fitness = np.max(population.chromosomes_fitness)
             #population.mutation_prob=population.mutation_prob*np.exp(0.001*generation)
@@ -103,15 +272,18 @@ def evolve(population, environment, initial_n_chr, n_generations, genotype_len,
             if ctr>=1:
                 print('hardly mutating......', ctr)
                 if ctr==1 or ctr==2:
-                    for _ in range(ctr):
-                        population.chromosomes = [population.mutate(c, np.random.randint(10), inverse_prob=True)
-                    if population.chromosomes_fitness[i]==last_max_fitness else c for i,c in enumerate(population.chromosomes)]
-                if ctr >=2:
-                    population.fitness_share()
+                    with metrics.phase('mutation'):
+                        for _ in range(ctr):
+                            population.chromosomes = [population.mutate(c, np.random.randint(10), inverse_prob=True)
+                        if population.chromosomes_fitness[i]==last_max_fitness else c for i,c in enumerate(population.chromosomes)]
+                if ctr >=2 and multi_objective==None:
+                    with metrics.phase('fitness_sharing'):
+                        population.fitness_share()
                     print("Shared:\n",population.chromosomes_fitness)
                 if ctr >=3:
-                    population.chromosomes = [c for i,c in enumerate(population.chromosomes) if population.chromosomes_fitness[i]!=last_max_fitness]
-                    population.chromosomes_fitness = [c for i,c in enumerate(population.chromosomes_fitness) if population.chromosomes_fitness[i]!=last_max_fitness]
+                    if multi_objective==None:   # with NSGA-II, crowding distance keeps the diversity
+                        population.chromosomes = [c for i,c in enumerate(population.chromosomes) if population.chromosomes_fitness[i]!=last_max_fitness]
+                        population.chromosomes_fitness = [c for i,c in enumerate(population.chromosomes_fitness) if population.chromosomes_fitness[i]!=last_max_fitness]
                     
                     # x+=1
                     # x = 2*x-1
@@ -122,7 +294,8 @@ def evolve(population, environment, initial_n_chr, n_generations, genotype_len,
 
                     # population.chromosomes = [c for i,c in enumerate(population.chromosomes) if population.chromosomes_fitness[i]!=last_max_fitness]
                     # population.chromosomes_fitness = [f for f in population.chromosomes_fitness if f!=last_max_fitness]
-                    population.chromosomes = [population.mutate(c, np.random.randint(10), leaves_only=True) for i,c in enumerate(population.chromosomes)]
+                    with metrics.phase('mutation'):
+                        population.chromosomes = [population.mutate(c, np.random.randint(10), leaves_only=True) for i,c in enumerate(population.chromosomes)]
                     
                     
                     
@@ -138,55 +311,249 @@ def evolve(population, environment, initial_n_chr, n_generations, genotype_len,
             last_max_fitness = np.max(population.chromosomes_fitness)
             ctr=0
             x=3
+
+        #-----------------MIGRATION-----------------#
+        if migration!=None:
+            immigrants = migration(generation, population)
+            if immigrants:
+                population.chromosomes = list(population.chromosomes) + [c for c,_ in immigrants]
+                population.chromosomes_fitness = np.array(list(population.chromosomes_fitness) + [f for _,f in immigrants])
+                if quality_diversity!=None:
+                    quality_diversity.insert([c for c,_ in immigrants], [f for _,f in immigrants])
+                print('Immigrants:', len(immigrants))
+        #------------------------------#
         
         
        
 
-        elites_len = len(population.chromosomes)
-        select_probs = np.power(population.chromosomes_fitness,x) / np.sum(np.power(population.chromosomes_fitness,x))
-        if np.sum(population.chromosomes_fitness) <0:
-            offset = min(population.chromosomes_fitness)
-            positive_fit = [fit - offset + 1 for fit in population.chromosomes_fitness]
-            select_probs =  np.power(positive_fit,x) / np.sum(np.power(positive_fit,x))
-            
+        selector = Selector(selection, selection_seed, x=x, k=tournament_k)
+
         print('crossing-over... p=', population.crossover_prob)
         offsprings = []
         jobs=[]
         dk = int(initial_n_chr/2)
+        if surrogate!=None:
+            dk = surrogate.n_pairs(dk)
         random_seeds=[np.random.randint(2**32 - 1) for i in range(dk)]
+        if genealogy!=None:     # elites changed in place by the stagnation mutations and new chromosomes become parents
+            genealogy.register(population.chromosomes, generation)
         population.chromosomes= np.array(population.chromosomes)
-        # if ctr>=1: # do tournament for granting population diversity
-        # parents = [population.tournament_selection(2, select_probs) for _ in range(dk)]
-        # else: # normally don't
-        parents = [population.chromosomes[np.random.choice(range(elites_len), 2, replace=False, p=select_probs)] 
-                    for _ in range(dk)]
-        for i,parent in enumerate(parents):
-            jobs.append(pool.apply_async(population.crossover, [parent[0], parent[1], random_seeds[i]]))
-        for j in jobs:
-            child1,child2, child3, child4=j.get()
-            offsprings.append(child1)
-            offsprings.append(child2)
-            if child3!=None:
-                offsprings.append(child3)
-                offsprings.append(child4)
+        # all parent pairs of the generation are drawn at once, from the generation's own random substream
+        with metrics.phase('selection'):
+            if quality_diversity!=None:
+                population.chromosomes, population.chromosomes_fitness, pairs = quality_diversity.sample(dk, selector.generator(generation))
+            elif multi_objective!=None:
+                pairs = multi_objective.pairs(population.chromosomes, dk, selector.generator(generation))
+            elif bloat==None:
+                pairs = selector.pairs(population.chromosomes_fitness, dk, selector.generator(generation))
+            else:
+                pairs = selector.pairs(bloat.penalize(population.chromosomes_fitness, population.chromosomes), dk,
+                                       selector.generator(generation), sizes=bloat.sizes(population.chromosomes))
+            parents = population.chromosomes[pairs]
+            parents_fitness = np.asarray(population.chromosomes_fitness)[pairs].mean(axis=1)
+        with metrics.phase('crossover'):
+            for i,parent in enumerate(parents):
+                if pool!=None:
+                    jobs.append(pool.apply_async(population.crossover, [parent[0], parent[1], random_seeds[i]]))
+                else:   # in this process, on copies of the parents as a pool worker would get
+                    jobs.append(population.crossover(copy.deepcopy(parent[0]), copy.deepcopy(parent[1]), random_seeds[i]))
         #------------------------------#
 
         #----------------MUTATION----------------#
+        # streaming pipeline: each offspring is mutated as soon as its crossover job is done and
+        # its evaluation is submitted straightaway, so that crossover, mutation and evaluation overlap
+        # (with a surrogate, offsprings are submitted once all of them have been screened)
         print('mutating... p=', population.mutation_prob)    
-        mutated_offsprings = [population.mutate(child, generation//2) for child in offsprings]    
-           
-
+        eval_jobs=[]
+        for k,j in enumerate(jobs):
+            with metrics.phase('crossover'):
+                children = j.get() if pool!=None else j
+                if bloat!=None:
+                    children = bloat.limit(children, parents[k])
+            for child in children:
+                if child!=None:
+                    with metrics.phase('mutation'):
+                        offsprings.append(population.mutate(child, generation//2))
+                    offsprings[-1].parent_fitness = float(parents_fitness[k])
+                    if surrogate==None:
+                        eval_jobs.append(environment.submit_evaluation(offsprings[-1], len(offsprings)-1, executor, metrics=metrics, profiler=profiler))
+        if surrogate!=None:
+            with metrics.phase('code_generation'):     # the surrogate features are computed on the solutions of the offsprings
+                for offspring in offsprings:
+                    offspring.generate_solution()
+            with metrics.phase('surrogate'):
+                offsprings = surrogate.screen(offsprings)
+            generation_stats['surrogate_screened'] = surrogate.stats['screened']
+            print('Surrogate: screened out', surrogate.stats['screened'], 'offsprings, evaluating', len(offsprings))
+            eval_jobs = [environment.submit_evaluation(c, i, executor, metrics=metrics, profiler=profiler, generate=False) for i,c in enumerate(offsprings)]
+        for chromosome in carried:      # elites improved by the local search
+            offsprings.append(chromosome)
+            eval_jobs.append(environment.submit_evaluation(chromosome, len(offsprings)-1, executor, metrics=metrics, profiler=profiler))
         #------------------------------#
 
         #-----------NEXT GENERATION-----------# 
         # population = elite
         # mutated_offsprings += [population.best_individual,]  *np.exp(-0.001*generation),
         population = Population(mutation_prob=population.mutation_prob, crossover_prob=population.crossover_prob, max_elite=population.max_elite, environment=environment)
-        population.chromosomes = mutated_offsprings ############# mut_p /17 ok (toglie di meno), /13 toglie di più
+        population.chromosomes = offsprings ############# mut_p /17 ok (toglie di meno), /13 toglie di più
         print('( childs=', len(offsprings), ' tot_pop=', len(population.chromosomes),' )\n\n')
         #------------------------------#
+
+        #-----------CHECKPOINT-----------#
+        if checkpointer!=None:
+            with metrics.phase('checkpoint'):
+                checkpointer.save({
+                    'generation'        : generation+1,
+                    'chromosomes'       : [c.to_compact() for c in population.chromosomes],
+                    'history'           : all_populations.state(),
+                    'np_random_state'   : np.random.get_state(),
+                    'environment_seed'  : environment.seed,
+                    'mutation_prob'     : population.mutation_prob,
+                    'crossover_prob'    : population.crossover_prob,
+                    'max_elite'         : population.max_elite,
+                    'last_max_fitness'  : last_max_fitness,
+                    'ctr'               : ctr,
+                    'x'                 : x,
+                    'selection_seed'    : selection_seed,
+                    'genealogy'         : genealogy.records if genealogy!=None else None,
+                    'quality_diversity' : quality_diversity.state() if quality_diversity!=None else None,
+                    'multi_objective'   : multi_objective.state() if multi_objective!=None else None,
+                    'surrogate'         : surrogate.state(population.chromosomes) if surrogate!=None else None,
+                })
+        #------------------------------#
+
+        #-----------METRICS-----------#
+        metrics.emit(generation, **generation_stats)
+        if profiler!=None:
+            profiler.dump(generation)
         
-    pool.close()
+    if own_pool:
+        pool.close()
+    if checkpointer!=None:
+        checkpointer.wait()
+    return all_populations
+
+
+
+def evolve_steady_state(population, environment, initial_n_chr, n_evaluations, genotype_len, seed, MAX_DEPTH, MAX_WRAP=2,
+                        report_every=None, replacement='worst', tournament_k=3, n_workers=None, timeout=120, executor=None,
+                        history_dir=None, selection='roulette', artifacts=None):
+    '''
+    Asynchronous steady-state evolution (no generational barrier).
+    Workers continuously receive new offsprings: each completed evaluation is inserted into a bounded population
+    of initial_n_chr chromosomes (see Population.steady_state_insert) and parents are selected, using the same
+    crossover and mutate operators of evolve(), from the chromosomes that are evaluated at that moment.
+    This way all workers are kept busy for the whole run, instead of waiting for the slowest chromosome of each generation.
+
+    Args:
+        n_evaluations (int): total number of chromosomes evaluations of the run
+        report_every (int): number of evaluations between two progress reports (default initial_n_chr)
+        replacement (str): replacement strategy of Population.steady_state_insert ('worst' or 'tournament')
+        tournament_k (int): tournament size used by the 'tournament' replacement and selection
+        selection (str): parent selection method (see Selection.py)
+        artifacts (Artifact_Writer.ArtifactWriter): writer that receives each population snapshot
+        n_workers (int): number of evaluation processes (default multiprocessing.cpu_count())
+        timeout (int): seconds after that a running evaluation is considered dead
+        executor (Evaluation_Executor.PoolExecutor or TCPExecutor): executor that evaluates chromosomes (default a local PoolExecutor)
+        history_dir (str): directory where the population snapshots are spilled (default a temporary directory deleted by
+            all_populations.close())
+    Returns:
+        all_populations (Generation_History.History): a snapshot of the population every report_every evaluations
+    '''
+    np.random.seed(seed)
+    environment.seed = seed
+    if report_every is None:
+        report_every = initial_n_chr
+    if n_workers is None:
+        n_workers = multiprocessing.cpu_count()
+    max_in_flight = 2*n_workers         # small backlog, so that workers never wait for the driver
+    x=3
+    selector = Selector(selection, seed, x=x, k=tournament_k)
+    rng = selector.generator()
+
+    all_populations = History(history_dir)
+
+    ##-------INIT POPULATION--------##
+    population.initialize_chromosomes(initial_n_chr, genotype_len, MAX_DEPTH, MAX_WRAP)
+    initial_chromosomes = population.chromosomes
+    population.chromosomes, population.chromosomes_scores, population.chromosomes_fitness = [], None, np.array([])
+    own_executor = executor is None
+    if own_executor:
+        executor = PoolExecutor(Pool(n_workers))
+    done = queue.Queue()                # (job id, result) of completed evaluations, filled by the executor callbacks
+    in_flight = {}                      # job id -> (chromosome, submission time)
+    n_submitted, n_evaluated, n_dead, last_report = 0, 0, 0, 0
+
+    def submit(chromosome):
+        nonlocal n_submitted
+        jid = n_submitted
+        chromosome.cid = jid
+        in_flight[jid] = (chromosome, time.time())
+        environment.submit_evaluation(chromosome, jid, executor,
+                                    callback=lambda result, jid=jid: done.put((jid, result)),
+                                    error_callback=lambda e, jid=jid: done.put((jid, None)))
+        n_submitted += 1
+
+    def report():
+        print('\n ****** Evaluations', n_evaluated, '/', n_evaluations, 'max score = ', max(population.chromosomes_fitness),
+              ' mean = ', np.mean(population.chromosomes_fitness), ' ******\nDied = ', n_dead, ' in flight = ', len(in_flight), '\n')
+        snapshot = Population(population.mutation_prob, population.crossover_prob, population.max_elite, environment)
+        snapshot.chromosomes         = list(population.chromosomes)
+        snapshot.chromosomes_scores  = population.chromosomes_scores.subset(np.arange(len(population.chromosomes)))
+        snapshot.chromosomes_fitness = np.array(population.chromosomes_fitness)
+        snapshot.best_individual     = snapshot.chromosomes[np.argmax(snapshot.chromosomes_fitness)]
+        all_populations.append(snapshot, n_died=n_dead)
+        if artifacts!=None:
+            artifacts.generation(len(all_populations)-1, snapshot)
+
+    for chromosome in initial_chromosomes:
+        submit(chromosome)
+    #------------------------------#
+
+    while n_evaluated < n_evaluations and not environment.converged:
+        #--------------COLLECT EVALUATION--------------#
+        try:
+            jid, result = done.get(timeout=1)
+        except queue.Empty:
+            jid, now = None, time.time()
+            for expired in [j for j,(_,t) in in_flight.items() if now-t > timeout]:
+                print(expired,' not survived')
+                in_flight.pop(expired)
+                n_evaluated += 1
+                n_dead += 1
+        if jid in in_flight:            # results of already expired jobs are ignored
+            chromosome,_ = in_flight.pop(jid)
+            n_evaluated += 1
+            if result == None:
+                n_dead += 1
+            else:
+                population.steady_state_insert(chromosome, result, initial_n_chr, replacement, tournament_k)
+                if np.mean(result['scores'])>=environment.env.spec.reward_threshold:
+                    environment.converged = True
+        if len(population.chromosomes)>0 and (n_evaluated-last_report >= report_every or environment.converged):
+            last_report = n_evaluated
+            report()
+        #------------------------------#
+
+        #-----------CROSSING OVER AND MUTATION-----------#
+        while (len(population.chromosomes)>=2 and len(in_flight)<max_in_flight
+                and n_submitted<n_evaluations and not environment.converged):
+            parents = selector.pairs(population.chromosomes_fitness, 1, rng)[0]
+            parent_A, parent_B = population.chromosomes[parents[0]], population.chromosomes[parents[1]]
+            child_A, child_B, _, _ = population.crossover(parent_A, parent_B, np.random.randint(2**32 - 1))
+            for child, parent in ((child_A, parent_A), (child_B, parent_B)):
+                if child is parent:     # no crossover happened: never mutate an evaluated chromosome in place
+                    child = copy.deepcopy(parent)
+                if n_submitted<n_evaluations:
+                    submit(population.mutate(child, (n_evaluated//report_every)//2))
+        #------------------------------#
+
+    if n_evaluated != last_report and len(population.chromosomes)>0:
+        report()
+    if environment.converged:
+        executor.terminate()
+    elif own_executor:
+        executor.close()
     return all_populations
 
 
@@ -207,12 +574,17 @@ if __name__ == '__main__':
     else:
         sid=int(sid)
 
+    artifacts = ArtifactWriter(level='best', output_dir='./outputs')     # 'none', 'best' or 'all' programs and trees
+    metrics = Metrics('./outputs/metrics.jsonl')
+    # MetricsServer(metrics, port=9100).start()     # live metrics on http://localhost:9100/metrics (and /metrics.json)
+    profiler = None     # Profiler(sample=0.05, memory=False, output_dir='./outputs/profiles') to profile 5% of the evaluations
     abs_time_start = time.time()
 
     environment = Environment(
             env_id          = 'CartPole-v0',
             n_episodes      = 100,
-            bins            = (7, 4, 7, 6) 
+            bins            = (7, 4, 7, 6),
+            split_points    = None  # QuantileSplitPoints(n_rollouts=100) to split the observations at the quantiles of the visited states
         )
     population = Population(
         mutation_prob   = 0.9,
@@ -220,6 +592,13 @@ if __name__ == '__main__':
         max_elite       = 12,
         environment     = environment
     )
+    surrogate = None    # Surrogate(environment, keep=0.5, explore=0.1) to evaluate only the most promising offsprings
+    bloat = None    # BloatControl(crossover_limits=(400, 12), mutation_limits=(400, 12), max_add=4) to limit the growth of the programs
+    multi_objective = None  # NSGA2(cost='conditions') to select on mean reward, reward variance and policy cost
+    genealogy = None    # Genealogy() to track the lineage of all chromosomes, that colors the trees of the artifacts
+    quality_diversity = None    # MAPElites([('action_frequency', 0, 0., 1., 10), ('mean_observation', 0, -0.5, 0.5, 10)]) for the quality diversity mode
+    local_search = None     # LocalSearch(top_k=3, max_evaluations=64) to hill-climb the terminals of the elites in the stagnation phases
+    seed_population = None  # load_directory('./CartPole-v0', environment, limit=20) or load_history(<previous run history>, environment, limit=20)
     all_populations = evolve(
         population, 
         environment, 
@@ -228,8 +607,62 @@ if __name__ == '__main__':
         seed          = sid,
         genotype_len  = 22,
         MAX_DEPTH     = 5,
-        MAX_WRAP=3
+        MAX_WRAP=3,
+        history_dir   = './outputs/history',
+        artifacts     = artifacts,
+        metrics       = metrics,
+        profiler      = profiler,
+        surrogate     = surrogate,
+        bloat         = bloat,
+        multi_objective = multi_objective,
+        genealogy     = genealogy,
+        seed_population = seed_population,
+        local_search  = local_search,
+        quality_diversity = quality_diversity
     )
+    if quality_diversity!=None:
+        quality_diversity.write('./outputs/map_elites.json')
+    if genealogy!=None:
+        genealogy.save('./outputs/genealogy.json')
+    if multi_objective!=None:
+        multi_objective.write('./outputs/pareto_front.json')
+        cheapest = multi_objective.cheapest(environment.env.spec.reward_threshold)
+        if cheapest!=None:
+            print('Cheapest policy reaching the reward threshold (cost', cheapest['cost'], '):\n'+cheapest['solution'])
+
+
+    # executor = TCPExecutor(('0.0.0.0', 6000), authkey=os.environ['G4P_AUTHKEY'].encode())     # evaluate on remote workers: G4P_AUTHKEY=<secret> python g4p_worker.py --host <this machine>
+    # all_populations = evolve(population, environment, initial_n_chr=185, n_generations=5, seed=sid,
+    #                          genotype_len=22, MAX_DEPTH=5, MAX_WRAP=3, executor=executor)
+    # executor.print_stats()
+    # executor.close()
+
+    # from Genetic_Islands import evolve_islands
+    # all_populations = evolve_islands(           # island model alternative to evolve()
+    #     population,
+    #     environment,
+    #     initial_n_chr   = 60,
+    #     n_generations   = 5,
+    #     seed            = sid,
+    #     genotype_len    = 22,
+    #     MAX_DEPTH       = 5,
+    #     MAX_WRAP        = 3,
+    #     n_islands       = 4,
+    #     migration_k     = 2,
+    #     migration_every = 2,
+    #     topology        = 'ring'
+    # )
+
+    # all_populations = evolve_steady_state(     # asynchronous steady-state alternative to evolve()
+    #     population,
+    #     environment,
+    #     initial_n_chr = 185,
+    #     n_evaluations = 5*185,
+    #     seed          = sid,
+    #     genotype_len  = 22,
+    #     MAX_DEPTH     = 5,
+    #     MAX_WRAP=3
+    # )
 
 
     # environment = Environment( 
@@ -303,41 +736,10 @@ if __name__ == '__main__':
     abs_time= time.time() - abs_time_start
     
     #---------------plotting-------------#
-    print('Plotting ... ')
-
-
-    for generation, population in enumerate(all_populations):
-        population.best_individual.tree_to_png(generation)
-        population.best_individual.generate_solution(generation, to_file=True)
-
-    ep_len = len(all_populations[0].chromosomes_scores[0])
-    z_axys = np.arange(ep_len)
-    plt.rc('xtick', labelsize=20)     
-    plt.rc('ytick', labelsize=20)
-    for i,population in enumerate(all_populations):
-        ax= plt.figure(figsize=(20, 19)).add_subplot(111, projection='3d')
-        best_idx = np.argmax(population.chromosomes_fitness)
-        if len(population.chromosomes_scores)>12:
-            low =  0 if best_idx-5<0 else best_idx-10 if best_idx+5>=len(population.chromosomes_scores) else best_idx-5
-            high = len(population.chromosomes_scores) if best_idx+5>=len(population.chromosomes_scores)-1 else best_idx+5
-            scores = np.array(population.chromosomes_scores)[range(low, high)] 
-        else:
-            scores = population.chromosomes_scores
-        ax.set_xticks( np.arange(len(scores)))
-        
-        for j,score in enumerate(scores):
-            ax.plot(np.full(ep_len, j, int)  , z_axys, score, zorder=j)
-
-        ax.set_zlabel("Rewards", fontsize=27, labelpad=20)
-        ax.set_ylabel("Episode", fontsize=27, labelpad=20)
-        ax.set_xlabel("Chromosome", fontsize=27, labelpad=20)
-        
-        title=  environment.env.spec.id+" solved in {} generations\n".format(len(all_populations)-1)
-        title += "time elapsed = {} min\n".format(abs_time/60)
-        title += "GENERATION [ {} / {} ]".format(i, len(all_populations)-1)
-        plt.title(title, fontsize=30)
-        save_dir = './outputs/GEN-{}/'.format(i)
-        plt.savefig(save_dir+'plot.png', bbox_inches='tight')
+    # programs and trees of the best individuals have been written in background during the run,
+    # plots are rendered from the run history by the same low-priority process
+    artifacts.history(all_populations.directory, plots=True, env_id=environment.env.spec.id, abs_time=abs_time)
+    ep_len = all_populations[0].chromosomes_scores.max_episodes
     print('used seed = ', sid)
     #--------------evaluate--------------------#
     wrap = 'y'#input('Do you want to run the evolved policy and save it?    [y/N]    ')
@@ -346,10 +748,11 @@ if __name__ == '__main__':
         save_dir = './outputs/'+environment.env.spec.id+'_results/' + str(time.time()) + '/'
         # env.seed(0)
         environment.env = wrappers.Monitor(environment.env, save_dir, force=True)
-        best_policy = all_populations.pop().best_individual
+        best_policy = all_populations[-1].best_individual
         for episode in range(ep_len):
             environment.run_one_episode(environment.env, best_policy, episode, prnt=True)
         environment.env.env.close()
     else:
         environment.env.close()
+    artifacts.close()
     
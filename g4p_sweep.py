@@ -0,0 +1,270 @@
+'''
+Headless parameter sweep of evolve() of g4p_solver.py, configured by a JSON sweep definition.
+
+All runs share a single local evaluation pool: each run has its own driver process (with its own random state,
+checkpoint, history and metrics in <output_dir>/run-<id>/), that sends its evaluations to an
+Evaluation_Executor.EvaluationBroker, which gives every run with pending evaluations the same share of the pool.
+With successive halving, all configurations are run for min_generations generations, then only the best
+1/eta configurations of each environment are resumed from their checkpoints for eta times more generations,
+and so on until n_generations (the last generation of a rung is evaluated again when the run is resumed).
+Configurations are compared by the mean, over their seeds, of the best fitness reached by each run.
+A results table (one row per run) is printed and written to <output_dir>/results.csv.
+
+Sweep definition:
+    {
+        "output_dir"    : "./sweeps/cartpole",
+        "n_workers"     : null,                     # processes of the shared pool (default all cores)
+        "max_concurrent": 4,                        # driver processes running at the same time (default n_workers)
+        "base"  : {"env_id": "CartPole-v0", "bins": [7, 4, 7, 6], "n_episodes": 10, "mutation_prob": 0.9, "crossover_prob": 0.9,
+                   "max_elite": 12, "initial_n_chr": 100, "genotype_len": 22, "MAX_DEPTH": 5, "MAX_WRAP": 3,
+                   "n_generations": 8, "selection": "roulette", "seed": 1234},
+        "grid"  : {"max_elite": [6, 12], "MAX_DEPTH": [4, 5, 6], "seed": [1, 2]},
+        "halving": {"min_generations": 2, "eta": 2}
+    }
+Each run uses a combination of the grid values on top of the base parameters; grid values that are dicts are merged
+into the configuration, e.g. "environment": [{"env_id": "CartPole-v0", "bins": [7, 4, 7, 6]}, {"env_id": "MountainCar-v0", "bins": [18, 14]}].
+An optional "split_points" parameter (e.g. {"n_rollouts": 100}) places the split points of the observations at the
+quantiles of the visited states (see Split_Points.py); they are computed once and cached for all the runs.
+The definition is plain JSON (no comments).
+
+usage:
+    python g4p_sweep.py sweep.json
+'''
+
+
+import numpy as np
+import multiprocessing
+from multiprocessing import Pool
+import contextlib
+import itertools
+import argparse
+import queue
+import shutil
+import json
+import time
+import csv
+import os
+
+from Evaluation_Executor import EvaluationBroker
+
+
+DEFAULTS = {'n_episodes': 10, 'mutation_prob': 0.9, 'crossover_prob': 0.9, 'max_elite': 12, 'initial_n_chr': 100,
+            'genotype_len': 22, 'MAX_DEPTH': 5, 'MAX_WRAP': 3, 'n_generations': 10, 'selection': 'roulette', 'seed': 1234}
+
+
+def expand_grid(base, grid):
+    '''
+    Returns:
+        configs (list(dict)): base parameters updated with each combination of the grid values
+    '''
+    keys = sorted(grid)
+    configs = []
+    for values in itertools.product(*[grid[k] for k in keys]):
+        config = dict(DEFAULTS)
+        config.update(base)
+        for key, value in zip(keys, values):
+            if isinstance(value, dict):
+                config.update(value)
+            else:
+                config[key] = value
+        configs.append(config)
+    return configs
+
+
+def halving_rungs(n_generations, halving):
+    '''
+    Returns:
+        rungs (list(int)): number of generations reached at the end of each rung
+    '''
+    if not halving:
+        return [n_generations]
+    rungs, generations = [], max(1, int(halving.get('min_generations', 1)))
+    while generations < n_generations:
+        rungs.append(generations)
+        generations *= int(halving.get('eta', 2))
+    return rungs + [n_generations]
+
+
+def config_key(config):
+    ''' Configurations that only differ by seed are the same configuration. '''
+    return json.dumps(dict((k, v) for k, v in config.items() if k!='seed'), sort_keys=True)
+
+
+#-----------DRIVER PROCESS-----------#
+def run_driver(run, config, n_generations, executor, run_dir, summaries):
+    '''
+    Process target: run (or resume) evolve() for a configuration up to n_generations, and send back its summary.
+    '''
+    from Genetic_Gym import Population, Environment
+    from Split_Points import QuantileSplitPoints
+    from Metrics import Metrics
+    from g4p_solver import evolve
+
+    checkpoint = os.path.join(run_dir, 'checkpoint.pkl')
+    summary = {'run': run, 'failed': False}
+    with open(os.path.join(run_dir, 'log.txt'), 'a') as log, contextlib.redirect_stdout(log):
+        start = time.time()
+        try:
+            split_points = QuantileSplitPoints(n_workers=1, **config['split_points']) if config.get('split_points') else None
+            environment = Environment(config['env_id'], n_episodes=config['n_episodes'], bins=tuple(config['bins']),
+                                      split_points=split_points)
+            population = Population(mutation_prob=config['mutation_prob'], crossover_prob=config['crossover_prob'],
+                                    max_elite=config['max_elite'], environment=environment)
+            metrics = Metrics(os.path.join(run_dir, 'metrics-{}.jsonl'.format(n_generations)))
+            all_populations = evolve(population, environment, initial_n_chr=config['initial_n_chr'], n_generations=n_generations,
+                                     genotype_len=config['genotype_len'], seed=config['seed'], MAX_DEPTH=config['MAX_DEPTH'],
+                                     MAX_WRAP=config['MAX_WRAP'], n_workers=1, executor=executor, checkpoint=checkpoint,
+                                     resume=True, history_dir=os.path.join(run_dir, 'history'), selection=config['selection'],
+                                     metrics=metrics)
+            summary.update({
+                'generations' : len(all_populations),
+                'best_fitness': max(float(np.max(p.chromosomes_fitness)) for p in all_populations if p.n_chromosomes>0),
+                'converged'   : environment.converged,
+                'evaluations' : metrics.totals['evaluations'],
+            })
+        except Exception as e:
+            print('Run failed:', repr(e))
+            summary['failed'] = True
+        summary['wall_time'] = time.time() - start
+    executor.close()
+    summaries.put(summary)
+
+
+#-----------SCHEDULER-----------#
+class Sweep():
+    '''
+    Args:
+        definition (dict): sweep definition (see the module docstring)
+
+    Attributes:
+        runs (list(dict)): state of each run (configuration, directory, summary of its last rung and status)
+    '''
+    def __init__(self, definition):
+        self.output_dir = definition.get('output_dir', './sweeps')
+        self.n_workers = definition.get('n_workers') or multiprocessing.cpu_count()
+        self.max_concurrent = definition.get('max_concurrent') or self.n_workers
+        self.halving = definition.get('halving')
+        self.grid_keys = []                 # result columns of the grid parameters (keys of dict values are columns)
+        for key, values in sorted(definition.get('grid', {}).items()):
+            for k in (sorted(set(k for v in values for k in v)) if all(isinstance(v, dict) for v in values) else [key]):
+                if k not in self.grid_keys and k != 'env_id':
+                    self.grid_keys.append(k)
+        configs = expand_grid(definition.get('base', {}), definition.get('grid', {}))
+        self.runs = []
+        for run, config in enumerate(configs):
+            run_dir = os.path.join(self.output_dir, 'run-{}'.format(run))
+            if os.path.exists(run_dir):         # a new sweep never resumes the checkpoints of a previous one
+                shutil.rmtree(run_dir)
+            os.makedirs(run_dir)
+            with open(os.path.join(run_dir, 'config.json'), 'w') as f:
+                json.dump(config, f, indent=2)
+            self.runs.append({'run': run, 'config': config, 'dir': run_dir, 'status': 'pending', 'generations': 0,
+                              'best_fitness': None, 'converged': False, 'evaluations': 0, 'wall_time': 0.})
+
+    def run_rung(self, runs, n_generations):
+        '''
+        Run the driver processes of runs up to n_generations, at most max_concurrent at a time.
+        '''
+        summaries = multiprocessing.Queue()
+        waiting, running = list(runs), {}
+        while waiting or running:
+            while waiting and len(running) < self.max_concurrent:
+                r = waiting.pop(0)
+                n = min(n_generations, r['config']['n_generations'])
+                process = multiprocessing.Process(target=run_driver, args=(r['run'], r['config'], n, self.executors[r['run']], r['dir'], summaries))
+                process.start()
+                running[r['run']] = process
+            try:
+                summary = summaries.get(timeout=1)
+            except queue.Empty:
+                for run, process in list(running.items()):
+                    if not process.is_alive() and process.exitcode != 0:      # crashed before sending its summary
+                        running.pop(run)
+                        self.runs[run]['status'] = 'failed'
+                continue
+            running.pop(summary['run']).join()
+            r = self.runs[summary['run']]
+            if summary['failed']:
+                r['status'] = 'failed'
+                continue
+            r['generations'], r['best_fitness'], r['converged'] = summary['generations'], summary['best_fitness'], summary['converged']
+            r['evaluations'] += summary['evaluations']
+            r['wall_time'] += summary['wall_time']
+            r['status'] = 'converged' if r['converged'] else 'finished' if r['generations'] >= r['config']['n_generations'] else 'running'
+            print('run', r['run'], ':', r['generations'], 'generations, best fitness =', r['best_fitness'], '(', r['status'], ')')
+
+    def promote(self, runs, eta):
+        '''
+        Returns:
+            promoted (list(dict)): runs of the best 1/eta configurations of each environment that can still be resumed
+        '''
+        groups = {}
+        for r in runs:
+            if r['status'] == 'running':
+                groups.setdefault(r['config']['env_id'], {}).setdefault(config_key(r['config']), []).append(r)
+        promoted = []
+        for env_id, configs in groups.items():
+            ranked = sorted(configs.values(), key=lambda rs: -np.mean([r['best_fitness'] for r in rs]))
+            keep = int(np.ceil(len(ranked)/eta))
+            for rs in ranked[:keep]:
+                promoted += rs
+            for rs in ranked[keep:]:
+                for r in rs:
+                    r['status'] = 'stopped'
+        return promoted
+
+    def run(self):
+        pool = Pool(self.n_workers)
+        broker = EvaluationBroker(pool, capacity=2*self.n_workers)
+        self.executors = dict((r['run'], broker.register(r['run'])) for r in self.runs)
+        broker.start()
+        start = time.time()
+        active = list(self.runs)
+        eta = int(self.halving.get('eta', 2)) if self.halving else 1
+        max_generations = max(r['config']['n_generations'] for r in self.runs)
+        for rung, n_generations in enumerate(halving_rungs(max_generations, self.halving)):
+            print('\n****** Rung', rung, ':', len(active), 'runs up to', n_generations, 'generations ******')
+            self.run_rung(active, n_generations)
+            active = self.promote(active, eta) if self.halving else []
+            if not active:
+                break
+        broker.close()
+        pool.close()
+        pool.join()
+        print('\nSweep completed in', round(time.time()-start, 1), 's')
+        self.write_results()
+
+    def write_results(self):
+        scores = {}
+        for r in self.runs:
+            if r['best_fitness'] != None:
+                scores.setdefault(config_key(r['config']), []).append(r['best_fitness'])
+        columns = ['run'] + [k for k in self.grid_keys] + ['env_id', 'generations', 'best_fitness', 'config_score', 'status', 'evaluations', 'wall_time']
+        rows = []
+        for r in self.runs:
+            row = {'run': r['run'], 'env_id': r['config']['env_id'], 'generations': r['generations'], 'best_fitness': r['best_fitness'],
+                   'config_score': np.mean(scores[config_key(r['config'])]) if config_key(r['config']) in scores else None,
+                   'status': r['status'], 'evaluations': r['evaluations'], 'wall_time': round(r['wall_time'], 2)}
+            for k in self.grid_keys:
+                value = r['config'].get(k)
+                row[k] = json.dumps(value) if isinstance(value, (list, dict)) else value
+            rows.append(row)
+        rows.sort(key=lambda row: (row['env_id'], -(row['config_score'] if row['config_score']!=None else -np.inf), row['run']))
+        with open(os.path.join(self.output_dir, 'results.csv'), 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=columns, extrasaction='ignore')
+            writer.writeheader()
+            for row in rows:
+                writer.writerow(row)
+        print(' '.join('{:>14}'.format(c[:14]) for c in columns))
+        for row in rows:
+            print(' '.join('{:>14}'.format(str(row[c] if not isinstance(row[c], float) else round(row[c], 3))[:14]) for c in columns))
+        print('Results written to', os.path.join(self.output_dir, 'results.csv'))
+
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='G4P parameter sweep over a shared evaluation pool')
+    parser.add_argument('definition', help='JSON sweep definition')
+    args = parser.parse_args()
+    with open(args.definition) as f:
+        Sweep(json.load(f)).run()
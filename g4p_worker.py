@@ -0,0 +1,100 @@
+'''
+This is the remote evaluation worker daemon of Evaluation_Executor.TCPExecutor.
+
+It starts --processes worker processes, each of them connects to the executor of a running evolution,
+registers itself and then evaluates the compact tasks it receives (see Evaluation_Executor.evaluate_task),
+sending back the evaluation results. While evaluating, a heartbeat is sent every --heartbeat seconds.
+If the connection is lost (e.g. the evolution run terminated) workers keep trying to reconnect,
+so that the same daemon can serve many consecutive runs.
+
+The shared secret of the executor is read from the G4P_AUTHKEY environment variable (or given with --authkey,
+that is visible to the other users of the machine): the worker executes the programs it receives, so it must only
+connect to a trusted driver.
+
+usage:
+    G4P_AUTHKEY=<secret> python g4p_worker.py --host 192.168.1.10 --port 6000 --processes 8
+'''
+
+
+import argparse
+import multiprocessing
+from multiprocessing.connection import Client
+import threading
+import socket
+import time
+import os
+
+from Evaluation_Executor import evaluate_task
+
+
+def heartbeat(conn, lock, stop, interval):
+    while not stop.wait(interval):
+        with lock:
+            try:
+                conn.send(('heartbeat',))
+            except OSError:
+                return
+
+
+def serve(conn, heartbeat_interval):
+    '''
+    Evaluate tasks received on conn until the connection is closed.
+    '''
+    lock = threading.Lock()
+    while True:
+        msg = conn.recv()
+        if msg[0] == 'stop':
+            return
+        _, tid, task = msg
+        stop = threading.Event()
+        beat = threading.Thread(target=heartbeat, args=(conn, lock, stop, heartbeat_interval), daemon=True)
+        beat.start()
+        try:
+            reply = ('result', tid, evaluate_task(task))
+        except BaseException as e:      # also SystemExit, raised by Chromosome.execute_solution on invalid programs
+            reply = ('error', tid, repr(e))
+        stop.set()
+        beat.join()
+        with lock:
+            conn.send(reply)
+
+
+def run_worker(address, authkey, heartbeat_interval, retry):
+    name = '{}-{}'.format(socket.gethostname(), os.getpid())
+    while True:
+        try:
+            conn = Client(address, authkey=authkey)
+        except OSError:
+            time.sleep(retry)
+            continue
+        conn.send(('register', name))
+        print(name, 'connected to', address)
+        try:
+            serve(conn, heartbeat_interval)
+            conn.close()
+            return
+        except (EOFError, OSError):
+            print(name, 'disconnected')
+            conn.close()
+            time.sleep(retry)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='G4P remote evaluation worker')
+    parser.add_argument('--host', default='localhost', help='address of the evolution driver (TCPExecutor)')
+    parser.add_argument('--port', type=int, default=6000)
+    parser.add_argument('--authkey', default=os.environ.get('G4P_AUTHKEY'), help='shared secret of the TCPExecutor (default $G4P_AUTHKEY)')
+    parser.add_argument('--processes', type=int, default=multiprocessing.cpu_count(), help='number of worker processes')
+    parser.add_argument('--heartbeat', type=float, default=5., help='seconds between two heartbeats')
+    parser.add_argument('--retry', type=float, default=2., help='seconds between two connection attempts')
+    args = parser.parse_args()
+    if not args.authkey:
+        parser.error('the shared secret is required: set G4P_AUTHKEY or pass --authkey')
+
+    address = (args.host, args.port)
+    workers = [multiprocessing.Process(target=run_worker, args=(address, args.authkey.encode(), args.heartbeat, args.retry))
+                for _ in range(args.processes)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
@@ -0,0 +1,43 @@
+'''
+Tests of the behavioral fingerprint of Surrogate.py.
+
+usage:
+    python -m pytest -q tests
+'''
+
+
+import types
+import sys
+import os
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Chromosome import Chromosome
+from Surrogate import Surrogate
+
+
+# not vectorizable (assignment to another variable), and get_action returns None when observation[0] > all_obs[0][1]
+PARTIAL_PROGRAM = "def get_action(observation, all_obs):\n\taction = None\n\tif observation[0] <= all_obs[0][1]:\n\t\taction = 1\n\tunused = 0\n\treturn action"
+
+
+def environment():
+    return types.SimpleNamespace(all_obs=[np.linspace(-1., 1., 3), np.linspace(-2., 2., 3)], actions=[0, 1])
+
+
+def test_features_of_a_program_without_action_for_some_probes():
+    surrogate = Surrogate(environment(), n_probes=32, min_samples=2)
+    chromosome = Chromosome.from_solution(PARTIAL_PROGRAM)
+    fingerprint = surrogate.features(chromosome)[-2*32:].reshape(32, 2)
+    below = surrogate.probes[:, 0] <= surrogate.all_obs[0][1]
+    assert below.any() and (~below).any()
+    assert np.all(fingerprint[below] == [0., 1.]) and np.all(fingerprint[~below] == [1., 0.])
+
+
+def test_screen_with_a_program_without_action_for_some_probes():
+    surrogate = Surrogate(environment(), keep=0.5, explore=0., n_probes=32, min_samples=2)
+    chromosomes = [Chromosome.from_solution(PARTIAL_PROGRAM, i) for i in range(4)]
+    scores = types.SimpleNamespace(fitness=lambda: np.arange(4.), valid=[True]*4)
+    surrogate.update(chromosomes, scores)
+    assert len(surrogate.screen(chromosomes)) == 2